@@ -3,6 +3,10 @@ ASGI config for cdex_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn cdex_project.asgi:application``) so the
+long-lived Server-Sent Event streams in ``listings.views.listing_events`` and the chat
+WebSockets in ``messaging.sockets`` are held by the event loop rather than one worker thread each.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +17,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cdex_project.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from market.orderbook import order_books  # noqa: E402 (these need the app registry loaded above)
+from messaging.sockets import websocket_application  # noqa: E402
+
+if getattr(settings, "MARKET_ORDER_BOOK_ENABLED", True):
+    order_books.start()  # Build the in-memory order books in the background, off the request path
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
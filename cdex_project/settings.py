@@ -10,6 +10,7 @@ INSTALLED_APPS = [
         'messaging',
     'encrypted_model_fields','django.contrib.humanize',
     'listings',
+    'market',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -120,6 +121,22 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Listing page views are counted in this cache and written in batches at most this often (seconds). Point it at a
+# shared cache (Redis, Memcached) in production so pending views survive worker restarts; see listings/view_counter.py.
+LISTING_VIEW_CACHE = 'default'
+LISTING_VIEW_FLUSH_INTERVAL = 10
+
+# Fan-out for live auction events (listings/live.py) and chat events (messaging/live.py). Swap for a shared broker when running
+# more than one ASGI worker process.
+LIVE_EVENTS_BROKER = 'listings.live.InProcessBroker'
+
+# In-memory order books (market/orderbook.py) are rebuilt from the database by a background thread this
+# often (seconds), to pick up writes made by other processes.
+MARKET_ORDER_BOOK_MAX_AGE = 300
+# Whether server processes build the order books at startup. Turn it off for workers that never serve
+# /api/market/order-book/ (they answer it with 503) to save the memory and the refresher thread.
+MARKET_ORDER_BOOK_ENABLED = True
+
 REST_AUTH = {
     'USE_JWT': True,
     'JWT_AUTH_COOKIE': 'cdex-auth-token',
@@ -160,3 +177,7 @@ MEDIA_ROOT = BASE_DIR / 'mediafiles' # Assumes BASE_DIR is Path object from path
 # IMPORTANT: Replace this with a securely generated key and keep it secret!
 # Generate with: from cryptography.fernet import Fernet; Fernet.generate_key().decode()
 FIELD_ENCRYPTION_KEY = 'jV2P_x7k-qB5_s2L8wN0fH7gK3jS6dVzX9cYm1aZpE0=' # Placeholder, now singular
+
+# HMAC key of the message search blind index (messaging/search.py). Must differ from FIELD_ENCRYPTION_KEY;
+# after changing it run `python manage.py rebuild_message_search_index`.
+MESSAGE_SEARCH_KEY = 'w8Qm3tV1-search-index-placeholder-kE5rN0yB' # Placeholder
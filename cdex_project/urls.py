@@ -13,6 +13,8 @@ urlpatterns = [
     path('api/auth/registration/', include('dj_rest_auth.registration.urls')),
     path('api/accounts/', include('accounts.urls')), # Profile API
     path('api/', include('listings.urls')), # Listings App API URLs (games, my-cards, listings)
+    path('api/market/', include('market.urls')), # Sales ledger and price candles
+    path('api/messaging/', include('messaging.urls')), # Conversations and messages
 
     # Web Application URLs for Listings (non-API)
     path('listings/', include('listings.urls_web', namespace='listings')), # New include for web views
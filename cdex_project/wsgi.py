@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cdex_project.settings")
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+from market.orderbook import order_books  # noqa: E402
+
+if getattr(settings, "MARKET_ORDER_BOOK_ENABLED", True):
+    order_books.start()  # Build the in-memory order books in the background, off the request path
@@ -0,0 +1,241 @@
+"""
+Bulk import of cards into a user's collection (API: POST /api/my-cards/import/, web: my-collection/import/).
+
+Rows come from a CSV (one card per line, `attributes` as a JSON string) or a JSON array / JSONL
+upload. They are validated in chunks without a form or serializer per row: game names are
+resolved for the whole chunk with one query, valid rows go in with one bulk_create per chunk and
+every invalid row is reported back with its row number. The same checks as UserCardForm apply
+(graded cards need a grader and a grade).
+"""
+import codecs
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .identity import normalize_cert
+from .models import Game, Card
+from .signals import cards_imported
+
+CHUNK_SIZE = 1000
+MAX_PURCHASE_PRICE = Decimal('99999999.99') # Card.purchase_price is max_digits=10, decimal_places=2
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'f'}
+
+_TEXT_FIELDS = {
+    'card_name': Card._meta.get_field('card_name').max_length,
+    'set_name': Card._meta.get_field('set_name').max_length,
+    'card_identifier_in_set': Card._meta.get_field('card_identifier_in_set').max_length,
+    'grade': Card._meta.get_field('grade').max_length,
+    'certification_number': Card._meta.get_field('certification_number').max_length,
+    'public_description': None,
+    'notes': None,
+}
+_CONDITIONS = {key.lower(): key for key, _ in Card.CONDITION_CHOICES} | {label.lower(): key for key, label in Card.CONDITION_CHOICES}
+_GRADERS = {key.lower(): key for key, _ in Card.GRADER_CHOICES} | {label.lower(): key for key, label in Card.GRADER_CHOICES}
+
+
+class ImportFileError(ValueError):
+    """The upload as a whole cannot be read."""
+
+
+def read_rows(upload, filename=''):
+    """
+    Iterate the rows of an uploaded file: .csv, .json (an array) or .jsonl / .ndjson. The encoding is
+    checked up front, so a non-UTF-8 file is refused before any row is imported.
+    """
+    name = (filename or getattr(upload, 'name', '') or '').lower()
+    if not name.endswith(('.csv', '.json', '.jsonl', '.ndjson')):
+        raise ImportFileError("Upload a .csv, .json or .jsonl file.")
+    _check_utf8(upload)
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='')
+    if name.endswith('.csv'):
+        return _csv_rows(text)
+    if name.endswith('.json'):
+        try:
+            rows = json.load(text)
+        except ValueError as error:
+            raise ImportFileError(f"Not valid JSON: {error}")
+        if not isinstance(rows, list):
+            raise ImportFileError("A JSON upload must be an array of cards.")
+        return rows
+    return (_json_line(line) for line in text if line.strip())
+
+
+def _check_utf8(upload, block_size=64 * 1024):
+    """One pass over the upload with an incremental decoder (uploads are seekable), then rewind."""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    upload.seek(0)
+    try:
+        for block in iter(lambda: upload.read(block_size), b''):
+            decoder.decode(block)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise ImportFileError("The file is not UTF-8 text. Save it as UTF-8 (e.g. \"CSV UTF-8\") and upload it again.")
+    upload.seek(0)
+
+
+def _csv_rows(text):
+    reader = csv.DictReader(text)
+    try:
+        yield from reader
+    except csv.Error as error: # e.g. a field over the csv module's size limit
+        raise ImportFileError(f"Not a readable CSV file (line {reader.line_num}): {error}")
+
+
+def _json_line(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None # Reported as an invalid row
+
+
+def _text(row, field, errors, required=False):
+    value = row.get(field)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        errors[field] = "This field is required."
+    elif _TEXT_FIELDS[field] and len(value) > _TEXT_FIELDS[field]:
+        errors[field] = f"Ensure this value has at most {_TEXT_FIELDS[field]} characters."
+    return value
+
+
+def _boolean(value, field, errors):
+    if isinstance(value, bool):
+        return value
+    value = '' if value is None else str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value not in FALSE_VALUES:
+        errors[field] = "Must be true or false."
+    return False
+
+
+def _card_fields(row):
+    """Validate one row. Returns (field values, errors dict)."""
+    errors = {}
+    if not isinstance(row, dict):
+        return {}, {'non_field_errors': "Each row must be an object of card fields."}
+    values = {field: _text(row, field, errors, required=field == 'card_name') for field in _TEXT_FIELDS}
+
+    year = row.get('year')
+    values['year'] = None
+    if year not in (None, ''):
+        try:
+            values['year'] = int(year)
+            if not 1800 <= values['year'] <= 2100:
+                errors['year'] = "Enter a year between 1800 and 2100."
+        except (TypeError, ValueError):
+            errors['year'] = "Enter a whole number."
+
+    condition = str(row.get('condition') or '').strip().lower()
+    values['condition'] = _CONDITIONS.get(condition, '')
+    if condition and condition not in _CONDITIONS:
+        errors['condition'] = f"Unknown condition {row.get('condition')!r}."
+
+    values['is_graded'] = _boolean(row.get('is_graded'), 'is_graded', errors)
+    grader = str(row.get('grader') or '').strip().lower()
+    values['grader'] = _GRADERS.get(grader)
+    if grader and grader not in _GRADERS:
+        errors['grader'] = f"Unknown grader {row.get('grader')!r}."
+    if values['is_graded']:
+        if not grader:
+            errors['grader'] = "Grader is required if card is marked as graded."
+        if not values['grade']:
+            errors['grade'] = "Grade is required if card is marked as graded."
+
+    price = row.get('purchase_price')
+    values['purchase_price'] = None
+    if price not in (None, ''):
+        try:
+            values['purchase_price'] = Decimal(str(price).strip().lstrip('$').replace(',', '')).quantize(Decimal('0.01'))
+            if not 0 <= values['purchase_price'] <= MAX_PURCHASE_PRICE:
+                errors['purchase_price'] = "Purchase price is out of range."
+        except InvalidOperation:
+            errors['purchase_price'] = "Enter a number."
+
+    attributes = row.get('attributes') or {}
+    if isinstance(attributes, str): # CSV cells carry the attributes as JSON text
+        try:
+            attributes = json.loads(attributes)
+        except ValueError:
+            attributes = None
+    if not isinstance(attributes, dict):
+        errors['attributes'] = "Attributes must be a JSON object."
+    values['attributes'] = attributes if isinstance(attributes, dict) else {}
+    return values, errors
+
+
+class GameResolver:
+    """Maps game names (or slugs) to Game rows, one query per batch of names not seen before."""
+
+    def __init__(self):
+        self._by_slug = {}
+
+    def resolve(self, names):
+        slugs = {slugify(name) for name in names if name} - self._by_slug.keys()
+        if slugs:
+            found = {game.slug: game for game in Game.objects.filter(slug__in=slugs)}
+            self._by_slug.update({slug: found.get(slug) for slug in slugs})
+
+    def get(self, name):
+        return self._by_slug.get(slugify(name)) if name else None
+
+
+def import_cards(owner, rows, chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Validate and insert `rows` for `owner`, a chunk per transaction. Yields ('error', row number,
+    errors) for each rejected row as it goes and finally ('done', created, rejected).
+    """
+    rows = iter(rows)
+    games, certs = GameResolver(), set() # certs: (grader, cert_key) accepted so far in this upload
+    created, rejected, row_number = 0, 0, 0
+    while chunk := list(islice(rows, chunk_size)):
+        games.resolve(str(row.get('game') or '').strip() for row in chunk if isinstance(row, dict))
+        checked = []
+        for row in chunk:
+            row_number += 1
+            values, errors = _card_fields(row)
+            game_name = str(row.get('game') or '').strip() if isinstance(row, dict) else ''
+            game = games.get(game_name)
+            if game_name and game is None:
+                errors['game'] = f"Unknown game {game_name!r}."
+            checked.append((row_number, values, game, errors))
+        taken = _registered_certs(values for _, values, _, errors in checked if not errors)
+
+        cards = []
+        for number, values, game, errors in checked:
+            cert = (values.get('grader'), normalize_cert(values.get('certification_number'))) if values.get('is_graded') else (None, None)
+            if cert[1] and (cert in taken or cert in certs):
+                errors['certification_number'] = f"This {cert[0]} certification number is already registered."
+            if errors:
+                rejected += 1
+                yield 'error', number, errors
+                continue
+            if cert[1]:
+                certs.add(cert)
+            card = Card(owner=owner, game=game, **values)
+            card.refresh_identity() # bulk_create skips save()
+            cards.append(card)
+        if cards and not dry_run:
+            with transaction.atomic():
+                Card.objects.bulk_create(cards, batch_size=500)
+                cards_imported.send(sender=Card, owner_id=owner.pk, card_ids=[card.pk for card in cards])
+        created += len(cards)
+    yield 'done', created, rejected
+
+
+def _registered_certs(values_list):
+    """(grader, cert_key) pairs among these rows that are already in the database, in one query."""
+    wanted = {
+        (values['grader'], normalize_cert(values['certification_number']))
+        for values in values_list if values['is_graded'] and values['certification_number']
+    }
+    if not wanted:
+        return set()
+    existing = Card.objects.filter(cert_key__in={cert_key for _, cert_key in wanted}).values_list('grader', 'cert_key')
+    return set(existing) & wanted
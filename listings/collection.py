@@ -0,0 +1,98 @@
+"""
+Bulk edits of a user's collection (PATCH / DELETE /api/my-cards/bulk/), and save_card() for single ones.
+
+Each call is one transaction of set-based queries, whatever the number of cards: one query checks
+that every card belongs to the user (and, for deletes, which ones are in an active listing), one
+UPDATE or DELETE does the work, and identity keys are refreshed with one bulk_update. Receivers
+that would otherwise run per card (portfolio, order book) hear about the batch through the
+cards_updated signal; deletes are handled by the market receivers per owner.
+"""
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Card, Listing
+from .signals import cards_updated
+
+MAX_BULK_CARDS = 1000
+BULK_EDITABLE_FIELDS = [
+    'game', 'set_name', 'year', 'condition', 'is_graded', 'grader', 'grade',
+    'purchase_price', 'public_description', 'notes',
+]
+# Changing any of these means Card.DERIVED_FIELDS have to be recomputed
+_IDENTITY_FIELDS = {'game', 'set_name', 'year', 'is_graded', 'grader', 'grade'}
+
+
+def _ids_text(card_ids):
+    return ', '.join(str(pk) for pk in sorted(card_ids))
+
+
+def _owned_cards(owner, card_ids, *fields, annotations=None):
+    """{pk: (fields...)} for `card_ids`, all of which must belong to `owner`."""
+    cards = Card.objects.filter(owner=owner, pk__in=card_ids).annotate(**(annotations or {}))
+    rows = {pk: values for pk, *values in cards.values_list('pk', *fields, *(annotations or {}))}
+    missing = set(card_ids) - rows.keys()
+    if missing:
+        raise ValidationError({'ids': [f"Not in your collection: {_ids_text(missing)}."]})
+    return rows
+
+
+def save_card(save, is_graded, grader, certification_number, pk=None):
+    """
+    Run save() for one card (a form or serializer save) with the grading it is being saved with.
+    The cert checks in UserCardForm / CardSerializer run before the write, so a slab registered
+    at the same moment still hits card_unique_cert: that becomes the same field error.
+    """
+    try:
+        with transaction.atomic():
+            return save()
+    except IntegrityError:
+        if not (is_graded and Card.cert_in_use(grader, certification_number, exclude_pk=pk)):
+            raise
+        raise ValidationError({'certification_number': [f"This {grader} certification number is already registered."]})
+
+
+def bulk_update_cards(owner, card_ids, changes):
+    """Apply the same `changes` (validated field values) to every card in `card_ids`. Returns the number updated."""
+    try:
+        return _bulk_update_cards(owner, card_ids, changes)
+    except IntegrityError: # e.g. a new grader that already has one of these slabs' cert numbers registered
+        raise ValidationError({'changes': ["A certification number would then be registered twice for the same grader."]})
+
+
+def _bulk_update_cards(owner, card_ids, changes):
+    with transaction.atomic():
+        current = _owned_cards(owner, card_ids, 'is_graded', 'grader', 'grade')
+        incomplete = [
+            pk for pk, (is_graded, grader, grade) in current.items()
+            if changes.get('is_graded', is_graded) and not (changes.get('grader', grader) and changes.get('grade', grade))
+        ]
+        if incomplete:
+            raise ValidationError({'changes': [f"Graded cards need a grader and a grade (cards {_ids_text(incomplete)})."]})
+
+        cards = Card.objects.filter(pk__in=current)
+        updated = cards.update(**changes, last_modified=timezone.now()) # update() skips auto_now
+        if _IDENTITY_FIELDS & changes.keys():
+            stale = [
+                card for card in cards.select_related('game').only(
+                    'game__name', 'card_name', 'set_name', 'year', 'card_identifier_in_set',
+                    'is_graded', 'grader', 'grade', 'certification_number', *Card.DERIVED_FIELDS,
+                )
+                if card.refresh_identity()
+            ]
+            Card.objects.bulk_update(stale, Card.DERIVED_FIELDS, batch_size=500)
+        cards_updated.send(sender=Card, owner_id=owner.pk, card_ids=list(current))
+    return updated
+
+
+def bulk_delete_cards(owner, card_ids):
+    """Delete every card in `card_ids`, or none of them if any is part of an active listing. Returns the number deleted."""
+    with transaction.atomic():
+        listed = Exists(Listing.objects.filter(card_for_listing=OuterRef('pk'), status='ACTIVE'))
+        current = _owned_cards(owner, card_ids, annotations={'listed': listed})
+        listed_ids = [pk for pk, (is_listed,) in current.items() if is_listed]
+        if listed_ids:
+            raise ValidationError({'ids': [f"Cards in active listings can't be deleted; cancel those listings first (cards {_ids_text(listed_ids)})."]})
+        _, deleted = Card.objects.filter(pk__in=current).delete()
+    return deleted.get(Card._meta.label, 0)
@@ -0,0 +1,56 @@
+"""
+Filters for the card and listing APIs. Grades filter on the parsed Card.grade_value (indexed
+together with grader), so ?grader=PSA&grade__gte=9 never parses the free-text grade, and
+?attr.<key>=<value> reads the CardAttribute index instead of scanning the attributes JSON.
+"""
+from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
+
+from .identity import attribute_text
+from .models import Card, CardAttribute, Listing
+
+
+class CardFilter(filters.FilterSet):
+    grade__gte = filters.NumberFilter(field_name='grade_value', lookup_expr='gte')
+    grade__lte = filters.NumberFilter(field_name='grade_value', lookup_expr='lte')
+
+    class Meta:
+        model = Card
+        fields = ['game', 'condition', 'is_graded', 'grader', 'grade_qualifier']
+
+
+class ListingFilter(filters.FilterSet):
+    grader = filters.ChoiceFilter(field_name='card_for_listing__grader', choices=Card.GRADER_CHOICES)
+    grade__gte = filters.NumberFilter(field_name='card_for_listing__grade_value', lookup_expr='gte')
+    grade__lte = filters.NumberFilter(field_name='card_for_listing__grade_value', lookup_expr='lte')
+
+    class Meta:
+        model = Listing
+        fields = {
+            'listing_type': ['exact'],
+            'status': ['exact'],
+            'card_for_listing__game__slug': ['exact'], # e.g. ?card_for_listing__game__slug=pokemon-tcg
+            'seller_location_country': ['exact'],
+            'seller_location_city': ['iexact'], # case-insensitive exact match
+            'allows_local_pickup': ['exact'],
+            'price': ['gte', 'lte'], # greater/less than or equal to
+        }
+
+
+class AttributeFilterBackend(BaseFilterBackend):
+    """
+    ?attr.Edition=1st&attr.Holo=true: exact, case-insensitive attribute matches. Different keys must
+    all match; repeating a key (?attr.Edition=1st&attr.Edition=Shadowless) matches any of its values.
+    The view's `attribute_card_field` says which field holds the card ('pk' for cards).
+    """
+    prefix = 'attr.'
+
+    def filter_queryset(self, request, queryset, view):
+        card_field = getattr(view, 'attribute_card_field', 'pk')
+        for param in request.query_params:
+            if not param.startswith(self.prefix):
+                continue
+            values = {attribute_text(value) for value in request.query_params.getlist(param)}
+            cards = CardAttribute.objects.filter(key=attribute_text(param[len(self.prefix):]), value__in=values)
+            queryset = queryset.filter(**{f'{card_field}__in': cards.values('card_id')})
+        return queryset
@@ -51,18 +51,39 @@ class ListingCreateEditForm(forms.ModelForm):
 class BidForm(forms.ModelForm):
     class Meta:
         model = Bid
-        fields = ['amount']
+        fields = ['amount', 'max_amount']
+        labels = {'max_amount': 'Maximum bid (optional, kept private)'}
+        help_texts = {'max_amount': "We'll bid for you, one increment at a time, up to this amount."}
         widgets = {
             'amount': forms.NumberInput(attrs={'step': '0.01'}),
+            'max_amount': forms.NumberInput(attrs={'step': '0.01'}),
         }
 
     def __init__(self, *args, **kwargs):
         self.listing = kwargs.pop('listing', None) # Pass listing from view
         self.user = kwargs.pop('user', None) # Pass user from view
         super().__init__(*args, **kwargs)
+        self.fields['amount'].required = False # Not needed when a maximum (proxy) bid is given
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('amount') is None and cleaned_data.get('max_amount') is None and not self.errors:
+            self.add_error('amount', 'Enter a bid amount or a maximum bid.')
+        return cleaned_data
+
+    def clean_max_amount(self):
+        max_amount = self.cleaned_data.get('max_amount')
+        if max_amount is not None:
+            self._check_offer(max_amount)
+        return max_amount
 
     def clean_amount(self):
         amount = self.cleaned_data.get('amount')
+        if amount is not None:
+            self._check_offer(amount)
+        return amount
+
+    def _check_offer(self, amount):
         if not self.listing:
             raise forms.ValidationError("Listing information is missing.") # Should not happen if form is instantiated correctly
 
@@ -79,8 +100,6 @@ class BidForm(forms.ModelForm):
         if amount < min_next_bid:
             raise forms.ValidationError(f"Bid amount must be at least {min_next_bid}.")
 
-        return amount
-
 class UserCardForm(forms.ModelForm):
     class Meta:
         model = Card
@@ -123,9 +142,18 @@ class UserCardForm(forms.ModelForm):
                 self.add_error('grader', 'Grader is required if card is marked as graded.')
             if not grade:
                 self.add_error('grade', 'Grade is required if card is marked as graded.')
+            if grader and Card.cert_in_use(grader, cleaned_data.get('certification_number'), exclude_pk=self.instance.pk):
+                self.add_error('certification_number', f'This {grader} certification number is already registered.')
         else:
             cleaned_data['grader'] = None # Use model's default blank=True, null=True
             cleaned_data['grade'] = None  # Use model's default blank=True, null=True
             cleaned_data['certification_number'] = '' # Ensure cert number is also cleared
 
         return cleaned_data
+
+
+class CardImportForm(forms.Form):
+    file = forms.FileField(help_text="A .csv, .json or .jsonl file with one card per row. Columns: game, card_name, set_name, year, "
+                                     "card_identifier_in_set, condition, is_graded, grader, grade, certification_number, "
+                                     "purchase_price, public_description, notes, attributes (JSON).")
+    dry_run = forms.BooleanField(required=False, help_text="Only check the file, don't import anything.")
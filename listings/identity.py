@@ -0,0 +1,112 @@
+"""
+Canonical identity of a card, independent of which user owns which copy.
+
+Two Card rows describe the same card when game, name, set, year and number match after
+normalisation (case, accents, punctuation and whitespace are ignored). Grading is kept out of
+the identity key; market data is keyed by identity plus grader/grade.
+"""
+import re
+import unicodedata
+from decimal import Decimal
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def canonical_text(value):
+    """'Pokémon  Base-Set ' -> 'pokemon base set'"""
+    if value is None:
+        return ''
+    text = unicodedata.normalize('NFKD', str(value))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return _NON_ALNUM.sub(' ', text).strip()
+
+
+def identity_key(game_name, card_name, set_name='', year=None, card_identifier_in_set=''):
+    # Leading zeros in card numbers are noise ("004/102" == "4/102")
+    number = ' '.join(part.lstrip('0') or '0' for part in canonical_text(card_identifier_in_set).split())
+    parts = [canonical_text(game_name), canonical_text(card_name), canonical_text(set_name), str(year or ''), number]
+    return '|'.join(parts)
+
+
+def card_identity_key(card):
+    return identity_key(
+        card.game.name if card.game_id else '', card.card_name, card.set_name,
+        card.year, card.card_identifier_in_set,
+    )
+
+
+def market_series(identity_key, is_graded, grader, grade_value):
+    """(identity_key, grader, grade) that market data for a card is filed under; raw cards have ('', None)."""
+    if is_graded and grader:
+        return identity_key, grader, grade_value
+    return identity_key, '', None
+
+
+_GRADE_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+
+
+def numeric_grade(grade):
+    """'10 Gem Mint' -> Decimal('10'), '8.5' -> Decimal('8.5'), 'Authentic' -> None"""
+    match = _GRADE_NUMBER.search(grade or '')
+    return Decimal(match.group()) if match else None
+
+
+# Grader-specific qualifiers written next to the number, e.g. PSA "8 OC" (off-center) or "9 (MK)"
+GRADE_QUALIFIERS = {
+    'PSA': {'OC', 'ST', 'PD', 'OF', 'MK', 'MC'},
+}
+_GRADER_WORDS = {'psa', 'bgs', 'beckett', 'sgc', 'cgc', 'cgs'}
+_GRADE_STEP = Decimal('0.1')
+MAX_GRADE_VALUE = Decimal('99.9') # Card.grade_value is max_digits=4, decimal_places=1; real scales stop at 10 (or 100 for a few)
+
+
+def parse_grade(grade, grader=None):
+    """
+    Split a free-text grade into (numeric value, label, qualifier):
+    '10 Gem Mint' -> (Decimal('10'), 'Gem Mint', ''), PSA '8 (OC)' -> (Decimal('8'), '', 'OC'),
+    'Authentic' -> (None, 'Authentic', ''). Numbers outside 0-MAX_GRADE_VALUE ('1234') give no value.
+    """
+    qualifiers = GRADE_QUALIFIERS.get(grader, ())
+    words = [word for word in canonical_text(_GRADE_NUMBER.sub(' ', grade or '')).split() if word not in _GRADER_WORDS]
+    qualifier = next((word.upper() for word in words if word.upper() in qualifiers), '')
+    label = ' '.join(word for word in words if word.upper() != qualifier).title()
+    value = numeric_grade(grade)
+    if value is not None:
+        value = value.quantize(_GRADE_STEP) if value <= MAX_GRADE_VALUE else None # Rounded as the column stores it
+    return value, label[:50], qualifier
+
+
+_NON_CERT = re.compile(r'[^A-Z0-9]+')
+
+
+def normalize_cert(certification_number):
+    """' psa-0012 3456 ' -> 'PSA00123456'; None for blank. Leading zeros are kept (some graders use them)."""
+    return _NON_CERT.sub('', str(certification_number or '').upper()) or None
+
+
+def attribute_text(value):
+    """Normalised form of an attribute key or value: ' 1st  Edition' -> '1st edition', True -> 'true', 1.0 -> '1'."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return ' '.join(str(value).split()).casefold()
+
+
+def attribute_pairs(attributes):
+    """
+    (key, value) pairs to index for a card's attributes: one per list item; nested objects, nulls
+    and values too long for the index (CardAttribute) are skipped.
+    """
+    pairs = set()
+    if not isinstance(attributes, dict):
+        return pairs
+    for key, value in attributes.items():
+        key = attribute_text(key)
+        for item in value if isinstance(value, list) else [value]:
+            if item is None or isinstance(item, (dict, list)):
+                continue
+            item = attribute_text(item)
+            if key and len(key) <= 100 and len(item) <= 255:
+                pairs.add((key, item))
+    return pairs
@@ -0,0 +1,98 @@
+"""
+Live events (new high bids, auction closes) pushed to browsers over Server-Sent Events.
+
+Publishers call publish_listing_event() from ordinary sync code; the event is handed to the broker
+once the surrounding transaction commits. The default InProcessBroker fans events out to asyncio
+queues of the SSE streams held by this process, so an idle watcher costs one small queue and a
+suspended coroutine. Deployments with several ASGI workers can point LIVE_EVENTS_BROKER at a
+shared implementation (e.g. Redis pub/sub) with the same subscribe/unsubscribe/publish interface.
+
+SSE streams need an ASGI server (uvicorn/daphne with cdex_project.asgi:application); under WSGI
+each open stream would tie up a worker thread.
+"""
+import asyncio
+import functools
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100 # Slow consumers lose their oldest events rather than growing without bound
+
+
+class Subscription:
+    def __init__(self, channel):
+        self.channel = channel
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.loop = asyncio.get_running_loop()
+
+    def deliver(self, event):
+        """Runs on the subscriber's event loop."""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InProcessBroker:
+    """Fan-out to subscribers in this process. publish() is thread-safe and never blocks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError: # Loop already closed; the stream is gone
+                self.unsubscribe(subscription)
+
+
+@functools.lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'LIVE_EVENTS_BROKER', 'listings.live.InProcessBroker'))()
+
+
+def listing_channel(listing_id):
+    return f'listing:{listing_id}'
+
+
+def publish_listing_event(listing_id, event):
+    """Broadcast `event` (a JSON-serialisable dict) to the listing's watchers after commit."""
+    event = {'listing': listing_id, **event}
+
+    def send():
+        try:
+            get_broker().publish(listing_channel(listing_id), event)
+        except Exception: # Never let a broker outage break bidding
+            logger.exception("Could not publish live event for listing %s", listing_id)
+
+    transaction.on_commit(send)
@@ -0,0 +1,42 @@
+"""
+Fill Card.identity_key and the parsed grade fields for rows saved before they existed (or after
+a normalisation change / Game rename). Walks the table in primary-key chunks so memory and lock
+time stay flat, and only writes rows whose values actually change, so re-running is cheap.
+
+    python manage.py backfill_card_identity --chunk-size 2000
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from listings.models import Card
+
+
+class Command(BaseCommand):
+    help = "Recompute canonical identity keys and parsed grades for existing cards in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        fields = ['card_name', 'set_name', 'year', 'card_identifier_in_set', 'game__name',
+                  'is_graded', 'grader', 'grade', 'certification_number', *Card.DERIVED_FIELDS]
+        # cert_key is left alone: legacy duplicate certs would break the unique constraint (see find_duplicate_certs)
+        fields_to_write = [field for field in Card.DERIVED_FIELDS if field != 'cert_key']
+        last_pk, scanned, updated = 0, 0, 0
+        while True:
+            chunk = list(
+                Card.objects.filter(pk__gt=last_pk).order_by('pk').select_related('game').only(*fields)[:chunk_size]
+            )
+            if not chunk:
+                break
+            changed = [card for card in chunk if card.refresh_identity()]
+            with transaction.atomic():
+                Card.objects.bulk_update(changed, fields_to_write)
+            last_pk = chunk[-1].pk
+            scanned += len(chunk)
+            updated += len(changed)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  ...{scanned} cards scanned")
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(f"Scanned {scanned} cards, updated {updated}."))
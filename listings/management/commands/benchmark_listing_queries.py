@@ -0,0 +1,124 @@
+"""
+Benchmark the hot listing query shapes with and without the Listing.Meta indexes.
+
+Runs against a throwaway test database (never the dev database): seeds it, times each query
+shape with the indexes in place, drops them, and times the same queries again.
+
+    python manage.py benchmark_listing_queries --listings 200000 --repeat 20
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from listings.models import Game, Card, Listing
+
+User = get_user_model()
+
+COUNTRIES = ['USA', 'Canada', 'UK', 'Germany', 'Japan', 'Australia', 'France', 'Brazil']
+GAMES = ['Pokémon TCG', 'Magic: The Gathering', 'NBA Basketball Cards', 'MLB Baseball Cards', 'Yu-Gi-Oh!']
+
+
+def query_shapes():
+    now = timezone.now()
+    active = Listing.objects.filter(status='ACTIVE')
+    return [
+        ('active, newest first', active.order_by('-date_created', '-id')[:20]),
+        ('active auctions, newest first', active.filter(listing_type='AUCTION').order_by('-date_created')[:20]),
+        ('active by game slug', active.filter(card_for_listing__game__slug='pokemon-tcg').order_by('-date_created')[:20]),
+        ('active by country', active.filter(seller_location_country='Japan').order_by('-date_created')[:20]),
+        ('active price range', active.filter(price__gte=100, price__lte=120).order_by('price', 'id')[:20]),
+        ('auctions ending soonest', active.filter(listing_type='AUCTION', auction_end_datetime__gt=now).order_by('auction_end_datetime', 'id')[:20]),
+        ('most viewed', active.order_by('-views_count', '-id')[:20]),
+        ('card has active listing', Listing.objects.filter(card_for_listing_id=1, status='ACTIVE')[:1]),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway database and compare listing query plans/timings with and without indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--listings', type=int, default=100_000, help="Number of listings to seed.")
+        parser.add_argument('--repeat', type=int, default=10, help="Timed runs per query (best is reported).")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        creation = connection.creation
+        old_name = connection.settings_dict['NAME']
+        creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            self.seed(options['listings'], random.Random(options['seed']))
+            with_indexes = self.run_shapes(options['repeat'])
+            self.drop_listing_indexes()
+            without_indexes = self.run_shapes(options['repeat'])
+        finally:
+            creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"\n{'query':<32} {'no index (ms)':>14} {'indexed (ms)':>14} {'speedup':>9}")
+        for label, (indexed_ms, indexed_plan) in with_indexes.items():
+            plain_ms, plain_plan = without_indexes[label]
+            speedup = plain_ms / indexed_ms if indexed_ms else float('inf')
+            self.stdout.write(f"{label:<32} {plain_ms:>14.3f} {indexed_ms:>14.3f} {speedup:>8.1f}x")
+            self.stdout.write(f"    before: {plain_plan}")
+            self.stdout.write(f"    after:  {indexed_plan}")
+
+    def seed(self, total, rng):
+        self.stdout.write(f"Seeding {total} listings...")
+        users = [User(username=f'bench_{i}', email=f'bench_{i}@example.com') for i in range(200)]
+        User.objects.bulk_create(users, batch_size=500)
+        users = list(User.objects.filter(username__startswith='bench_'))
+        games = [Game.objects.create(name=name) for name in GAMES]
+        now = timezone.now()
+
+        batch = 5000
+        for start in range(0, total, batch):
+            size = min(batch, total - start)
+            cards = Card.objects.bulk_create([
+                Card(owner=rng.choice(users), game=rng.choice(games), card_name=f'Card {start + i}', set_name='Bench Set')
+                for i in range(size)
+            ], batch_size=batch)
+            listings = []
+            for card in cards:
+                listing_type = rng.choice(['SALE', 'SALE', 'TRADE', 'AUCTION'])
+                listings.append(Listing(
+                    lister=card.owner, card_for_listing=card, listing_type=listing_type,
+                    # Most of a mature catalog is closed; the partial indexes only cover the ACTIVE slice
+                    status='ACTIVE' if rng.random() < 0.2 else rng.choice(['SOLD', 'EXPIRED', 'CANCELLED']),
+                    price=Decimal(rng.randint(1, 5000)) if listing_type == 'SALE' else None,
+                    auction_start_price=Decimal(rng.randint(1, 500)) if listing_type == 'AUCTION' else None,
+                    auction_end_datetime=now + timedelta(minutes=rng.randint(-20000, 20000)) if listing_type == 'AUCTION' else None,
+                    seller_location_country=rng.choice(COUNTRIES),
+                    views_count=rng.randint(0, 10000),
+                ))
+            # bulk_create skips post_save, so no search documents are built for the bench rows
+            created = Listing.objects.bulk_create(listings, batch_size=batch)
+            # auto_now_add stamps every row with "now"; spread them out so date ordering is realistic
+            for listing in created:
+                listing.date_created = now - timedelta(seconds=rng.randint(0, 86400 * 365))
+            Listing.objects.bulk_update(created, ['date_created'], batch_size=batch)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def drop_listing_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for index in Listing._meta.indexes:
+                schema_editor.remove_index(Listing, index)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def run_shapes(self, repeat):
+        results = {}
+        for label, queryset in query_shapes():
+            plan = queryset.explain()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all()) # .all() clones, so each run really hits the database
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = (min(timings), ' | '.join(line.strip() for line in plan.splitlines()))
+        return results
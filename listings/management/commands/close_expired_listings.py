@@ -0,0 +1,31 @@
+"""
+Close auctions and listings whose time is up (see listings.services.close_due_listings).
+
+Run it from cron, or keep it running as a worker with --loop. Safe to run from several processes.
+
+    python manage.py close_expired_listings
+    python manage.py close_expired_listings --loop --interval 15
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from listings.services import close_due_listings
+
+
+class Command(BaseCommand):
+    help = "Transition due auctions to SOLD/EXPIRED and expired listings to EXPIRED in batched UPDATEs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help="Keep running, closing listings every --interval seconds.")
+        parser.add_argument('--interval', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        while True:
+            closed = close_due_listings(batch_size=options['batch_size'])
+            if options['verbosity'] > 1 or (options['verbosity'] and (closed['sold'] or closed['expired'])):
+                self.stdout.write(f"Closed listings: {closed['sold']} sold, {closed['expired']} expired.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
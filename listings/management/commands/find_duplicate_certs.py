@@ -0,0 +1,44 @@
+"""
+List graded cards that share a certification number with the same grader (after normalisation).
+
+Only the oldest card of each such group holds the unique cert_key; the others were left without one
+when the constraint was introduced, and saving them through the forms or API asks their owner to fix
+the number. Streams the table once in pk order, so memory is one entry per distinct cert.
+
+    python manage.py find_duplicate_certs [--grader PSA]
+"""
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from listings.identity import normalize_cert
+from listings.models import Card
+
+
+class Command(BaseCommand):
+    help = "Report graded cards registered more than once under the same grader and certification number."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grader', help="Only check this grader's certs, e.g. PSA.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        cards = (
+            Card.objects.filter(is_graded=True, grader__isnull=False, certification_number__gt='')
+            .order_by('pk').values_list('pk', 'grader', 'certification_number', 'owner__username')
+        )
+        if options['grader']:
+            cards = cards.filter(grader=options['grader'].upper())
+        groups = defaultdict(list)
+        for pk, grader, certification_number, owner in cards.iterator(chunk_size=options['chunk_size']):
+            cert_key = normalize_cert(certification_number)
+            if cert_key:
+                groups[grader, cert_key].append((pk, owner))
+
+        duplicates = {cert: cards for cert, cards in groups.items() if len(cards) > 1}
+        for (grader, cert_key), cards in sorted(duplicates.items()):
+            listed = ', '.join(f"#{pk} ({owner})" for pk, owner in cards)
+            self.stdout.write(f"{grader} {cert_key}: {listed}")
+        if options['verbosity']:
+            style = self.style.WARNING if duplicates else self.style.SUCCESS
+            self.stdout.write(style(f"{len(duplicates)} duplicated certification numbers across {sum(map(len, duplicates.values()))} cards."))
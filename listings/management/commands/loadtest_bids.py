@@ -0,0 +1,122 @@
+"""
+Concurrent load test for listings.services.place_bid on a single hot auction.
+
+Spins up one thread per bidder against a throwaway database (a temporary file on SQLite so the
+threads really share it), every bidder racing to outbid the current price during the auction's
+final minute. Afterwards it checks that the accepted bids form a strictly increasing sequence
+that respects the increment and that the listing agrees with the last accepted bid.
+
+    python manage.py loadtest_bids --bidders 32 --attempts 200
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, OperationalError
+from django.utils import timezone
+
+from listings.models import Card, Listing, Bid
+from listings.services import min_next_bid, place_bid
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Race concurrent bidders on one auction and report ordering correctness and bids/sec."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bidders', type=int, default=16, help="Concurrent bidder threads.")
+        parser.add_argument('--attempts', type=int, default=100, help="Bid attempts per bidder.")
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        tmp_path = None
+        if connection.vendor == 'sqlite':
+            # In-memory test databases are per-connection; the threads need a shared file
+            fd, tmp_path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = tmp_path
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            report = self.run_load_test(options['bidders'], options['attempts'], options['seed'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        for line in report:
+            self.stdout.write(line)
+
+    def run_load_test(self, bidder_count, attempts, seed):
+        lister = User.objects.create_user(username='loadtest_lister', email='lister@example.com')
+        bidders = [User.objects.create_user(username=f'loadtest_bidder_{i}', email=f'bidder_{i}@example.com') for i in range(bidder_count)]
+        card = Card.objects.create(owner=lister, card_name="Hot Auction Card")
+        auction = Listing.objects.create(
+            lister=lister, card_for_listing=card, listing_type='AUCTION',
+            auction_start_price=Decimal('1.00'), auction_bid_increment=Decimal('1.00'),
+            auction_end_datetime=timezone.now() + timedelta(minutes=1), # Final minute: peak contention
+        )
+
+        accepted, rejected, errors = [], [], []
+        lock = threading.Lock()
+        start_gate = threading.Barrier(bidder_count)
+
+        def bidder_loop(bidder, rng):
+            mine_ok, mine_lost, mine_err = 0, 0, 0
+            try:
+                start_gate.wait()
+                for _ in range(attempts):
+                    current = Listing.objects.only('current_highest_bid', 'auction_bid_increment', 'auction_start_price', 'lister').get(pk=auction.pk)
+                    amount = min_next_bid(current) + rng.choice([Decimal('0'), Decimal('0'), Decimal('1.00'), Decimal('2.50')])
+                    try:
+                        place_bid(current, bidder, amount)
+                        mine_ok += 1
+                    except ValidationError:
+                        mine_lost += 1
+                    except OperationalError:
+                        mine_err += 1 # e.g. SQLite busy timeout
+            finally:
+                connections.close_all()
+            with lock:
+                accepted.append(mine_ok)
+                rejected.append(mine_lost)
+                errors.append(mine_err)
+
+        threads = [
+            threading.Thread(target=bidder_loop, args=(bidder, random.Random(seed + i)))
+            for i, bidder in enumerate(bidders)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        auction.refresh_from_db()
+        bids = list(Bid.objects.filter(listing=auction).order_by('pk').values_list('amount', 'bidder_id'))
+        ordering_ok = all(later[0] >= earlier[0] + auction.auction_bid_increment for earlier, later in zip(bids, bids[1:]))
+        listing_ok = bool(bids) and auction.current_highest_bid == bids[-1][0] and auction.current_high_bidder_id == bids[-1][1]
+        total_attempts = bidder_count * attempts
+
+        if not (ordering_ok and listing_ok and len(bids) == sum(accepted)):
+            raise CommandError(
+                f"Inconsistent auction state: ordering_ok={ordering_ok} listing_ok={listing_ok} "
+                f"bids={len(bids)} accepted={sum(accepted)}"
+            )
+        return [
+            f"backend:            {connection.vendor}",
+            f"bidders x attempts: {bidder_count} x {attempts} = {total_attempts}",
+            f"accepted / lost:    {sum(accepted)} / {sum(rejected)} (db errors: {sum(errors)})",
+            f"elapsed:            {elapsed:.2f}s",
+            f"attempts/sec:       {total_attempts / elapsed:,.0f}",
+            f"accepted bids/sec:  {sum(accepted) / elapsed:,.0f}",
+            f"final price:        {auction.current_highest_bid} (strictly increasing, increment respected)",
+        ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Full-text index over listings_listingsearchdocument.
+# SQLite: an external-content FTS5 table kept in sync by triggers (rowid == listing_id).
+# PostgreSQL: a GIN index on the weighted tsvector expression used in listings/search.py.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE listings_listingsearch_fts USING fts5(
+        title, body,
+        content='listings_listingsearchdocument', content_rowid='listing_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER listings_listingsearch_ai AFTER INSERT ON listings_listingsearchdocument BEGIN
+        INSERT INTO listings_listingsearch_fts(rowid, title, body) VALUES (new.listing_id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER listings_listingsearch_ad AFTER DELETE ON listings_listingsearchdocument BEGIN
+        INSERT INTO listings_listingsearch_fts(listings_listingsearch_fts, rowid, title, body)
+        VALUES ('delete', old.listing_id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER listings_listingsearch_au AFTER UPDATE ON listings_listingsearchdocument BEGIN
+        INSERT INTO listings_listingsearch_fts(listings_listingsearch_fts, rowid, title, body)
+        VALUES ('delete', old.listing_id, old.title, old.body);
+        INSERT INTO listings_listingsearch_fts(rowid, title, body) VALUES (new.listing_id, new.title, new.body);
+    END
+    """,
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS listings_listingsearch_au",
+    "DROP TRIGGER IF EXISTS listings_listingsearch_ad",
+    "DROP TRIGGER IF EXISTS listings_listingsearch_ai",
+    "DROP TABLE IF EXISTS listings_listingsearch_fts",
+]
+POSTGRESQL_FORWARD = [
+    """
+    CREATE INDEX listings_listingsearch_tsv_idx ON listings_listingsearchdocument USING GIN ((
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+    ))
+    """,
+]
+POSTGRESQL_REVERSE = ["DROP INDEX IF EXISTS listings_listingsearch_tsv_idx"]
+
+
+def _run(schema_editor, statements_by_vendor):
+    for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_fulltext_index(apps, schema_editor):
+    _run(schema_editor, {"sqlite": SQLITE_FORWARD, "postgresql": POSTGRESQL_FORWARD})
+
+
+def drop_fulltext_index(apps, schema_editor):
+    _run(schema_editor, {"sqlite": SQLITE_REVERSE, "postgresql": POSTGRESQL_REVERSE})
+
+
+def backfill_documents(apps, schema_editor):
+    # Mirrors ListingSearchDocument.text_for_listing; historical models have no custom methods.
+    Listing = apps.get_model("listings", "Listing")
+    ListingSearchDocument = apps.get_model("listings", "ListingSearchDocument")
+    documents = []
+    for listing in Listing.objects.select_related("card_for_listing__game").iterator(
+        chunk_size=500
+    ):
+        card = listing.card_for_listing
+        attributes = card.attributes if isinstance(card.attributes, dict) else {}
+        body_parts = [
+            card.set_name,
+            card.game.name if card.game else "",
+            listing.listing_description,
+            " ".join(f"{key} {value}" for key, value in attributes.items()),
+        ]
+        documents.append(
+            ListingSearchDocument(
+                listing_id=listing.pk,
+                title=card.card_name,
+                body=" ".join(part for part in body_parts if part),
+            )
+        )
+    ListingSearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0002_card_public_description"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ListingSearchDocument",
+            fields=[
+                (
+                    "listing",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="listings.listing",
+                    ),
+                ),
+                ("title", models.TextField(blank=True)),
+                ("body", models.TextField(blank=True)),
+            ],
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0003_listing_search_document"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "ACTIVE")),
+                fields=["-date_created", "-id"],
+                name="listing_active_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "ACTIVE")),
+                fields=["listing_type", "-date_created"],
+                name="listing_active_type_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "ACTIVE")),
+                fields=["seller_location_country", "-date_created"],
+                name="listing_active_country_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "ACTIVE")),
+                fields=["price", "id"],
+                name="listing_active_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "ACTIVE")),
+                fields=["-views_count", "-id"],
+                name="listing_active_views_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "ACTIVE")),
+                fields=["auction_end_datetime", "id"],
+                name="listing_active_ending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                fields=["card_for_listing", "status"], name="listing_card_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                fields=["status", "-date_created"], name="listing_status_recent_idx"
+            ),
+        ),
+    ]
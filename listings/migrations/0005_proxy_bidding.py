@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0004_listing_browse_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="bid",
+            options={"ordering": ["-timestamp", "-id"]},
+        ),
+        migrations.AddField(
+            model_name="bid",
+            name="is_automatic",
+            field=models.BooleanField(
+                default=False,
+                help_text="Placed by the proxy engine on behalf of the bidder.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="bid",
+            name="max_amount",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                help_text="Proxy bids only: the hidden maximum the bidder is willing to pay.",
+                max_digits=12,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="listing",
+            name="current_high_bidder_max",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                help_text="Hidden proxy maximum of the current high bidder. Never exposed publicly.",
+                max_digits=12,
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0005_proxy_bidding"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="listing",
+            index=models.Index(
+                condition=models.Q(("status", "ACTIVE")),
+                fields=["expires_on", "id"],
+                name="listing_active_expiry_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0006_listing_expiry_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="grade_value",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=1,
+                editable=False,
+                help_text="Numeric part of grade, graded cards only.",
+                max_digits=4,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="identity_key",
+            field=models.CharField(blank=True, editable=False, max_length=640),
+        ),
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(
+                fields=["identity_key", "grader", "grade_value"],
+                name="card_identity_idx",
+            ),
+        ),
+    ]
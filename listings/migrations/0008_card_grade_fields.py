@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+from listings.identity import parse_grade
+
+
+def backfill_grades(apps, schema_editor):
+    # Graded cards saved before the label/qualifier existed (also re-parses grade_value)
+    Card = apps.get_model("listings", "Card")
+    fields = ["grade_value", "grade_label", "grade_qualifier"]
+    batch = []
+    for card in (
+        Card.objects.filter(is_graded=True)
+        .only("grader", "grade", *fields)
+        .iterator(chunk_size=2000)
+    ):
+        card.grade_value, card.grade_label, card.grade_qualifier = parse_grade(
+            card.grade, card.grader
+        )
+        batch.append(card)
+        if len(batch) >= 2000:
+            Card.objects.bulk_update(batch, fields)
+            batch = []
+    Card.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0007_card_identity"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="grade_label",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Words of the grade, e.g. Gem Mint, Black Label.",
+                max_length=50,
+            ),
+        ),
+        migrations.AddField(
+            model_name="card",
+            name="grade_qualifier",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Grader-specific qualifier, e.g. PSA OC (off-center).",
+                max_length=3,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="card",
+            index=models.Index(fields=["grader", "grade_value"], name="card_grade_idx"),
+        ),
+        migrations.RunPython(backfill_grades, migrations.RunPython.noop),
+    ]
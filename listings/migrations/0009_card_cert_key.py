@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+from listings.identity import normalize_cert
+
+
+def backfill_cert_keys(apps, schema_editor):
+    # The oldest card of each (grader, cert) gets the key; later duplicates stay NULL so the unique
+    # constraint can be added. `manage.py find_duplicate_certs` lists them.
+    Card = apps.get_model("listings", "Card")
+    seen, batch = set(), []
+    cards = (
+        Card.objects.filter(is_graded=True, grader__isnull=False)
+        .exclude(certification_number__isnull=True)
+        .exclude(certification_number="")
+        .order_by("pk")
+        .only("grader", "certification_number")
+    )
+    for card in cards.iterator(chunk_size=2000):
+        cert_key = normalize_cert(card.certification_number)
+        if cert_key is None or (card.grader, cert_key) in seen:
+            continue
+        seen.add((card.grader, cert_key))
+        card.cert_key = cert_key
+        batch.append(card)
+        if len(batch) >= 2000:
+            Card.objects.bulk_update(batch, ["cert_key"])
+            batch = []
+    Card.objects.bulk_update(batch, ["cert_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0008_card_grade_fields"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="card",
+            name="cert_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=100, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_cert_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="card",
+            constraint=models.UniqueConstraint(
+                fields=("cert_key", "grader"), name="card_unique_cert"
+            ),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from listings.identity import attribute_pairs
+
+
+def index_existing_attributes(apps, schema_editor):
+    Card = apps.get_model("listings", "Card")
+    CardAttribute = apps.get_model("listings", "CardAttribute")
+    rows = []
+    cards = (
+        Card.objects.exclude(attributes={})
+        .order_by("pk")
+        .values_list("pk", "attributes")
+    )
+    for card_id, attributes in cards.iterator(chunk_size=2000):
+        rows.extend(
+            CardAttribute(card_id=card_id, key=key, value=value)
+            for key, value in attribute_pairs(attributes)
+        )
+        if len(rows) >= 2000:
+            CardAttribute.objects.bulk_create(rows, batch_size=500)
+            rows = []
+    CardAttribute.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0009_card_cert_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CardAttribute",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=100)),
+                ("value", models.CharField(max_length=255)),
+                (
+                    "card",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attribute_index",
+                        to="listings.card",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["key", "value", "card"], name="card_attribute_idx"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(index_existing_attributes, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings # To get AUTH_USER_MODEL
 from django.utils.text import slugify
+from .identity import attribute_pairs, card_identity_key, market_series, normalize_cert, parse_grade
 # Consider using django-imagekit for image processing if needed, e.g., thumbnails
 # from imagekit.models import ImageSpecField
 # from imagekit.processors import ResizeToFill
@@ -58,11 +59,109 @@ class Card(models.Model):
     date_added_to_collection = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True)
 
-    # master_card_template = models.ForeignKey('CardMaster', on_delete=models.SET_NULL, null=True, blank=True) # Future hook
+    # Canonical identity (see listings.identity) instead of a CardMaster table: copies of the same card share
+    # identity_key, so "all sales of this card" is one index lookup. Filled on save / by backfill_card_identity.
+    identity_key = models.CharField(max_length=640, blank=True, editable=False)
+    grade_value = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True, editable=False, help_text="Numeric part of grade, graded cards only.")
+    grade_label = models.CharField(max_length=50, blank=True, editable=False, help_text="Words of the grade, e.g. Gem Mint, Black Label.")
+    grade_qualifier = models.CharField(max_length=3, blank=True, editable=False, help_text="Grader-specific qualifier, e.g. PSA OC (off-center).")
+    # Normalised certification_number of a graded card; a slab can only be registered once per grader
+    cert_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
+
+    # Everything refresh_identity() derives; written along with any save
+    DERIVED_FIELDS = ('identity_key', 'grade_value', 'grade_label', 'grade_qualifier', 'cert_key')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['identity_key', 'grader', 'grade_value'], name='card_identity_idx'),
+            models.Index(fields=['grader', 'grade_value'], name='card_grade_idx'), # ?grader=PSA&grade__gte=9
+        ]
+        constraints = [
+            # Also the index for cert lookups; NULL (ungraded / no cert) never collides
+            models.UniqueConstraint(fields=['cert_key', 'grader'], name='card_unique_cert'),
+        ]
+
+    def refresh_identity(self):
+        """Recompute the DERIVED_FIELDS from the descriptive fields. Returns True if any changed."""
+        grading = (*parse_grade(self.grade, self.grader), normalize_cert(self.certification_number)) if self.is_graded else (None, '', '', None)
+        derived = (card_identity_key(self), *grading)
+        changed = derived != tuple(getattr(self, field) for field in self.DERIVED_FIELDS)
+        for field, value in zip(self.DERIVED_FIELDS, derived):
+            setattr(self, field, value)
+        return changed
+
+    @classmethod
+    def cert_in_use(cls, grader, certification_number, exclude_pk=None):
+        """Is this grader's slab already registered (by anyone)?"""
+        cert_key = normalize_cert(certification_number)
+        if not grader or not cert_key:
+            return False
+        return cls.objects.filter(grader=grader, cert_key=cert_key).exclude(pk=exclude_pk).exists()
+
+    @property
+    def market_series(self):
+        """(identity_key, grader, grade) the market app files this card's sales and prices under."""
+        return market_series(self.identity_key, self.is_graded, self.grader, self.grade_value)
+
+    VALUATION_FIELDS = ('owner_id', 'identity_key', 'is_graded', 'grader', 'grade_value', 'purchase_price')
+
+    def valuation_state(self):
+        """(owner_id, market_series, purchase_price) as seen by market.portfolio; None if not all loaded."""
+        if any(field not in self.__dict__ for field in self.VALUATION_FIELDS):
+            return None
+        # to_python: purchase_price may still be the string it was assigned as
+        return self.owner_id, self.market_series, self._meta.get_field('purchase_price').to_python(self.purchase_price)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the card added to its owner's portfolio so a save can apply just the difference
+        instance._loaded_valuation = instance.valuation_state()
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.refresh_identity()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *self.DERIVED_FIELDS}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.card_name} ({self.owner.username if self.owner else 'No owner'})"
 
+class CardAttribute(models.Model):
+    """
+    Inverted index over Card.attributes: one row per (card, key, value) so ?attr.Edition=1st is an
+    index lookup instead of a LIKE over the JSON text. Keys and values are normalised by
+    identity.attribute_pairs(). Kept in sync by the receivers below.
+    """
+    card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name='attribute_index')
+    key = models.CharField(max_length=100)
+    value = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'value', 'card'], name='card_attribute_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key}={self.value} (card {self.card_id})"
+
+    @classmethod
+    def reindex(cls, cards):
+        """Bring the rows for `cards` (a chunk of instances with attributes loaded) in line, writing only what changed."""
+        cards = list(cards)
+        wanted = {(card.pk, key, value) for card in cards for key, value in attribute_pairs(card.attributes)}
+        existing = {
+            (card_id, key, value): pk
+            for pk, card_id, key, value in cls.objects.filter(card__in=cards).values_list('pk', 'card_id', 'key', 'value')
+        }
+        stale = [pk for row, pk in existing.items() if row not in wanted]
+        if stale:
+            cls.objects.filter(pk__in=stale).delete()
+        cls.objects.bulk_create([cls(card_id=card_id, key=key, value=value) for card_id, key, value in wanted - existing.keys()], batch_size=500)
+
+
 class Listing(models.Model):
     LISTING_TYPE_CHOICES = [('SALE', 'For Sale'), ('TRADE', 'For Trade'), ('AUCTION', 'Auction')]
     STATUS_CHOICES = [
@@ -84,6 +183,7 @@ class Listing(models.Model):
     auction_end_datetime = models.DateTimeField(null=True, blank=True, help_text="Date and time when the auction ends.")
     current_highest_bid = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     current_high_bidder = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='current_bids_as_high_bidder')
+    current_high_bidder_max = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, help_text="Hidden proxy maximum of the current high bidder. Never exposed publicly.")
 
     listing_description = models.TextField(blank=True, help_text="Additional details about this specific listing.")
 
@@ -98,6 +198,31 @@ class Listing(models.Model):
     expires_on = models.DateTimeField(null=True, blank=True, help_text="Optional: Date when the listing should automatically expire.")
     last_modified = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Shaped after the browse queries in ListingsView/ListingViewSet. The partial (ACTIVE-only)
+        # indexes stay small because sold/expired listings never enter them.
+        # Benchmark: python manage.py benchmark_listing_queries
+        indexes = [
+            models.Index(fields=['-date_created', '-id'], condition=models.Q(status='ACTIVE'), name='listing_active_recent_idx'),
+            models.Index(fields=['listing_type', '-date_created'], condition=models.Q(status='ACTIVE'), name='listing_active_type_idx'),
+            models.Index(fields=['seller_location_country', '-date_created'], condition=models.Q(status='ACTIVE'), name='listing_active_country_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(status='ACTIVE'), name='listing_active_price_idx'),
+            models.Index(fields=['-views_count', '-id'], condition=models.Q(status='ACTIVE'), name='listing_active_views_idx'),
+            models.Index(fields=['auction_end_datetime', 'id'], condition=models.Q(status='ACTIVE'), name='listing_active_ending_idx'),
+            models.Index(fields=['expires_on', 'id'], condition=models.Q(status='ACTIVE'), name='listing_active_expiry_idx'),
+            models.Index(fields=['card_for_listing', 'status'], name='listing_card_status_idx'),
+            models.Index(fields=['status', '-date_created'], name='listing_status_recent_idx'),
+        ]
+
+    SOLD_STATUSES = ('SOLD', 'TRADED')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded status so post_save can tell when a listing has just been sold
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def __str__(self):
         return f"{self.get_listing_type_display()} of {self.card_for_listing.card_name} by {self.lister.username}"
 
@@ -109,10 +234,97 @@ class Bid(models.Model):
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='bids')
     bidder = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='bids_made')
     amount = models.DecimalField(max_digits=12, decimal_places=2)
+    max_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, help_text="Proxy bids only: the hidden maximum the bidder is willing to pay.")
+    is_automatic = models.BooleanField(default=False, help_text="Placed by the proxy engine on behalf of the bidder.")
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['-timestamp'] # Show newest bids first
+        ordering = ['-timestamp', '-id'] # Show newest bids first; proxy resolution can insert several per transaction
 
     def __str__(self):
         return f"Bid of {self.amount} by {self.bidder.username} on {self.listing.card_for_listing.card_name}"
+
+
+class ListingSearchDocument(models.Model):
+    """
+    Denormalised search text for a listing. The full-text index itself lives in the database:
+    an FTS5 table kept in sync by triggers on SQLite, a GIN tsvector index on PostgreSQL
+    (see migration 0003 and listings/search.py).
+    """
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title = models.TextField(blank=True) # Card name, weighted highest when ranking
+    body = models.TextField(blank=True) # Set, game, listing description and card attributes
+
+    def __str__(self):
+        return f"Search document for listing {self.listing_id}"
+
+    @staticmethod
+    def text_for_listing(listing):
+        card = listing.card_for_listing
+        attributes = card.attributes if isinstance(card.attributes, dict) else {}
+        body_parts = [
+            card.set_name,
+            card.game.name if card.game else '',
+            listing.listing_description,
+            ' '.join(f"{key} {value}" for key, value in attributes.items()),
+        ]
+        return card.card_name, ' '.join(part for part in body_parts if part)
+
+    @classmethod
+    def refresh_for(cls, listings):
+        """(Re)build documents for the given Listing queryset with a single upsert."""
+        documents = []
+        for listing in listings.select_related('card_for_listing__game'):
+            title, body = cls.text_for_listing(listing)
+            documents.append(cls(listing=listing, title=title, body=body))
+        if documents:
+            cls.objects.bulk_create(
+                documents, update_conflicts=True,
+                unique_fields=['listing'], update_fields=['title', 'body'],
+            )
+
+
+# Signals keeping the search documents in sync. Deletes cascade through the ORM,
+# and the database triggers/indexes take care of the full-text side.
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .signals import listing_sold, cards_imported, cards_updated
+
+@receiver(post_save, sender=Listing)
+def refresh_listing_search_document(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ListingSearchDocument.refresh_for(Listing.objects.filter(pk=instance.pk))
+
+@receiver(post_save, sender=Listing)
+def announce_listing_sold(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_loaded_status', None)
+    if not raw and instance.status in Listing.SOLD_STATUSES and previous != instance.status:
+        listing_sold.send(sender=Listing, listing_ids=[instance.pk])
+    instance._loaded_status = instance.status
+
+@receiver(post_save, sender=Card)
+def refresh_card_listings_search_documents(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created: # A brand new card cannot have listings yet
+        ListingSearchDocument.refresh_for(Listing.objects.filter(card_for_listing=instance))
+
+@receiver(post_save, sender=Game)
+def refresh_game_listings_search_documents(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created: # The game name is part of every document of its cards' listings
+        ListingSearchDocument.refresh_for(Listing.objects.filter(card_for_listing__game=instance))
+
+@receiver(cards_updated)
+def refresh_bulk_updated_cards_search_documents(sender, card_ids, **kwargs):
+    # Bulk edits go through QuerySet.update(), which sends no post_save
+    ListingSearchDocument.refresh_for(Listing.objects.filter(card_for_listing_id__in=card_ids))
+
+@receiver(post_save, sender=Card)
+def index_card_attributes(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'attributes' not in update_fields):
+        return
+    if created and not instance.attributes:
+        return # Nothing to index and nothing indexed yet
+    CardAttribute.reindex([instance])
+
+@receiver(cards_imported)
+def index_imported_card_attributes(sender, card_ids, **kwargs):
+    CardAttribute.reindex(Card.objects.filter(pk__in=card_ids).only('attributes'))
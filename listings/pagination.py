@@ -0,0 +1,246 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are addressed by the position of the last row seen, `(ordering value, id)`, instead of an
+OFFSET, so page 1,000 costs the same as page 1 and no COUNT(*) is needed. The ordering value comes
+from the first `order_by()` term of the queryset, so it follows `?ordering=` from OrderingFilter.
+Querysets ordered by something that is not a plain model field (e.g. the `search_rank` of a
+full-text search) fall back to an offset encoded in the same opaque cursor.
+
+Totals are opt-in via `?count=approx` (planner estimate / capped count) or `?count=exact`.
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+APPROX_COUNT_CAP = 1000 # Non-PostgreSQL backends count at most this many rows for ?count=approx
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(position, dict):
+        raise InvalidCursor("Invalid cursor")
+    return position
+
+
+def estimate_count(queryset):
+    """
+    Cheap row count for a filtered queryset. Returns (count, is_exact).
+    PostgreSQL reads the planner estimate; other backends count up to APPROX_COUNT_CAP rows.
+    """
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), False
+    count = queryset.order_by()[:APPROX_COUNT_CAP + 1].count()
+    return min(count, APPROX_COUNT_CAP), count <= APPROX_COUNT_CAP
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Framework-agnostic keyset paginator, shared by the HTML views and the DRF pagination class."""
+
+    def __init__(self, queryset, page_size):
+        self.queryset = queryset
+        self.page_size = page_size
+        self.key_field = self._key_field(queryset)
+
+    @staticmethod
+    def _key_field(queryset):
+        """Return (field, descending) for the leading order_by() term, or None if it cannot be a key."""
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        if not ordering or not isinstance(ordering[0], str):
+            return None
+        name = ordering[0]
+        descending = name.startswith('-')
+        name = name.lstrip('-')
+        if name == 'pk':
+            name = queryset.model._meta.pk.name
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None # Extra/annotated ordering, e.g. search_rank
+        if not field.concrete or field.is_relation:
+            return None
+        return field, descending
+
+    def page(self, cursor=None):
+        position = decode_cursor(cursor) if cursor else {}
+        if self.key_field is None:
+            return self._offset_page(position)
+        return self._keyset_page(position)
+
+    def _offset_page(self, position):
+        offset = position.get('o', 0)
+        if not isinstance(offset, int) or offset < 0:
+            raise InvalidCursor("Invalid cursor")
+        rows = list(self.queryset[offset:offset + self.page_size + 1])
+        next_cursor = encode_cursor({'o': offset + self.page_size}) if len(rows) > self.page_size else None
+        previous_cursor = encode_cursor({'o': max(offset - self.page_size, 0)}) if offset > 0 else None
+        return KeysetPage(rows[:self.page_size], next_cursor, previous_cursor)
+
+    def _keyset_page(self, position):
+        field, descending = self.key_field
+        pk_name = self.queryset.model._meta.pk.attname
+        reverse = bool(position.get('r'))
+        # Walking backwards flips every comparison; NULLs sort last going forwards, so first going back.
+        walk_descending = descending != reverse
+        nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        direction = 'desc' if walk_descending else 'asc'
+        queryset = self.queryset.order_by(
+            getattr(F(field.name), direction)(**nulls), getattr(F(pk_name), direction)()
+        )
+
+        if 'id' in position:
+            lookup = 'lt' if walk_descending else 'gt'
+            try:
+                value = field.to_python(position.get('v'))
+                pk_value = self.queryset.model._meta.pk.to_python(position['id'])
+            except Exception:
+                raise InvalidCursor("Invalid cursor")
+            if value is None:
+                after = Q(**{f'{field.name}__isnull': True, f'{pk_name}__{lookup}': pk_value})
+                if reverse:
+                    after |= Q(**{f'{field.name}__isnull': False})
+                queryset = queryset.filter(after)
+            else:
+                after = Q(**{f'{field.name}__{lookup}': value}) | Q(**{field.name: value, f'{pk_name}__{lookup}': pk_value})
+                if field.null and not reverse:
+                    after |= Q(**{f'{field.name}__isnull': True})
+                queryset = queryset.filter(after)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else 'id' in position
+
+        def cursor_for(row, backwards):
+            value = getattr(row, field.attname)
+            return encode_cursor({
+                'v': None if value is None else force_str(field.value_to_string(row)),
+                'id': force_str(getattr(row, pk_name)),
+                'r': backwards,
+            })
+
+        next_cursor = cursor_for(rows[-1], False) if has_next and rows else None
+        previous_cursor = cursor_for(rows[0], True) if has_previous and rows else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF pagination class built on KeysetPaginator.
+    Response: {"next": url, "previous": url, "results": [...]} plus "count"/"count_is_estimate"
+    when the client asks for ?count=approx or ?count=exact.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.count = None
+        count_mode = request.query_params.get(self.count_query_param)
+        if count_mode == 'exact':
+            self.count, self.count_is_estimate = queryset.count(), False
+        elif count_mode == 'approx':
+            self.count, exact = estimate_count(queryset)
+            self.count_is_estimate = not exact
+        try:
+            self.page = KeysetPaginator(queryset, self.get_page_size(request)).page(
+                request.query_params.get(self.cursor_query_param)
+            )
+        except InvalidCursor as exc:
+            raise NotFound(str(exc))
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        payload = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.count is not None:
+            payload['count'] = self.count
+            payload['count_is_estimate'] = self.count_is_estimate
+        payload['results'] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'count': {'type': 'integer'},
+                'count_is_estimate': {'type': 'boolean'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,76 @@
+"""
+Full-text search over listings.
+
+Queries go through ListingSearchDocument (see models.py) and the full-text index built for it in
+migration 0003: FTS5 on SQLite (ranked with bm25) and a GIN tsvector index on PostgreSQL (ranked
+with ts_rank). Other backends fall back to a plain icontains scan of the document table.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from rest_framework.filters import SearchFilter
+
+FTS_TABLE = 'listings_listingsearch_fts'
+DOCUMENT_TABLE = 'listings_listingsearchdocument'
+LISTING_TABLE = 'listings_listing'
+
+# Must match the expression indexed in migration 0003 for PostgreSQL to use the GIN index.
+PG_VECTOR = (
+    f"(setweight(to_tsvector('simple', coalesce({DOCUMENT_TABLE}.title, '')), 'A') || "
+    f"setweight(to_tsvector('simple', coalesce({DOCUMENT_TABLE}.body, '')), 'B'))"
+)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """Split free text into plain word tokens, dropping anything that could be query syntax."""
+    return TOKEN_RE.findall(query or '')
+
+
+def search_listings(queryset, query):
+    """
+    Restrict a Listing queryset to rows matching `query` and annotate it with `search_rank`
+    (lower is better), ordered best match first. Callers can still re-order afterwards.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        # Every term must match; a trailing * makes each one a prefix query ("chari" -> Charizard).
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {LISTING_TABLE}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'bm25({FTS_TABLE}, 4.0, 1.0)'},
+        ).order_by('search_rank', '-date_created')
+
+    if vendor == 'postgresql':
+        tsquery = "to_tsquery('simple', %s)"
+        match = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.extra(
+            tables=[DOCUMENT_TABLE],
+            where=[f'{DOCUMENT_TABLE}.listing_id = {LISTING_TABLE}.id', f'{PG_VECTOR} @@ {tsquery}'],
+            params=[match],
+            # ts_rank is higher-is-better, negate it so search_rank sorts the same way on every backend
+            select={'search_rank': f'-ts_rank({PG_VECTOR}, {tsquery})'},
+            select_params=[match],
+        ).order_by('search_rank', '-date_created')
+
+    for term in terms:
+        queryset = queryset.filter(Q(search_document__title__icontains=term) | Q(search_document__body__icontains=term))
+    return queryset
+
+
+class ListingSearchFilter(SearchFilter):
+    """DRF SearchFilter replacement that answers ?search= from the full-text index."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return search_listings(queryset, query)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Game, Card, Listing, Bid
+from .collection import BULK_EDITABLE_FIELDS, MAX_BULK_CARDS
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -19,11 +20,12 @@ class CardSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'owner', 'owner_username', 'game', 'game_name', 'card_name', 'set_name', 'year',
             'card_identifier_in_set', 'attributes', 'condition', 'is_graded',
-            'grader', 'grade', 'certification_number', 'purchase_price', 'notes',
+            'grader', 'grade', 'grade_value', 'grade_label', 'grade_qualifier',
+            'certification_number', 'purchase_price', 'notes',
             'image_1', 'image_2', 'image_3',
             'date_added_to_collection', 'last_modified'
         ]
-        read_only_fields = ['owner', 'owner_username', 'game_name'] # Owner set automatically
+        read_only_fields = ['owner', 'owner_username', 'game_name', 'grade_value', 'grade_label', 'grade_qualifier'] # Owner set automatically
 
     def validate_owner(self, value):
         # This validation might not be strictly necessary if we set owner in view,
@@ -32,6 +34,30 @@ class CardSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("You cannot set the owner to another user.")
         return value
 
+    def validate(self, attrs):
+        current = lambda field: attrs[field] if field in attrs else getattr(self.instance, field, None)
+        grader, cert = current('grader'), current('certification_number')
+        if current('is_graded') and Card.cert_in_use(grader, cert, exclude_pk=getattr(self.instance, 'pk', None)):
+            raise serializers.ValidationError({'certification_number': f"This {grader} certification number is already registered."})
+        return attrs
+
+class CardBulkSerializer(serializers.Serializer):
+    """Body of PATCH / DELETE /api/my-cards/bulk/: the card ids, plus `changes` for a PATCH."""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1, max_length=MAX_BULK_CARDS)
+
+class CardBulkChangesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Card
+        fields = BULK_EDITABLE_FIELDS
+
+    def validate(self, attrs):
+        unknown = set(self.initial_data) - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({field: "This field can't be changed in bulk." for field in sorted(unknown)})
+        if not attrs:
+            raise serializers.ValidationError("Give at least one field to change.")
+        return attrs
+
 class ListingSerializer(serializers.ModelSerializer):
     lister_username = serializers.CharField(source='lister.username', read_only=True)
     # card_for_listing_details = CardSerializer(source='card_for_listing', read_only=True) # To show full card details
@@ -71,14 +97,21 @@ class BidSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Bid
-        fields = ['id', 'listing', 'bidder', 'bidder_username', 'amount', 'timestamp']
-        read_only_fields = ['bidder', 'bidder_username', 'timestamp']
+        fields = ['id', 'listing', 'bidder', 'bidder_username', 'amount', 'max_amount', 'is_automatic', 'timestamp']
+        read_only_fields = ['bidder', 'bidder_username', 'is_automatic', 'timestamp']
+        extra_kwargs = {
+            'amount': {'required': False}, # Either amount or max_amount (proxy bid) is needed
+            'max_amount': {'write_only': True}, # Proxy maximums are never shown to anyone
+        }
 
     def validate(self, data):
         listing = data.get('listing')
-        amount = data.get('amount')
+        amount = data.get('max_amount') or data.get('amount')
         request_user = self.context['request'].user
 
+        if amount is None:
+            raise serializers.ValidationError("Provide an amount or a max_amount for a proxy bid.")
+
         if listing.listing_type != 'AUCTION':
             raise serializers.ValidationError("Bids can only be placed on auction listings.")
         if listing.status != 'ACTIVE':
@@ -0,0 +1,229 @@
+"""
+Auction bidding.
+
+place_bid() is the single write path for bids (API and web views both use it).
+
+Plain bids that take the lead go through one conditional UPDATE (compare-and-swap): the row only
+changes if, at write time, the auction is still open, the amount clears
+`current_highest_bid + auction_bid_increment` and beats the leader's hidden proxy maximum. On
+PostgreSQL the UPDATE takes the row lock and re-checks the WHERE clause after any concurrent writer
+commits; on SQLite writers are serialised anyway.
+
+Proxy bids (a hidden `max_amount`) and plain bids that run into a proxy maximum are resolved by
+resolve_bid() in O(1): only the leader's maximum (`current_high_bidder_max`) and the visible price
+are needed, because the visible price is always min(top maximum, second maximum + increment).
+The result is written with an UPDATE conditioned on the state it was computed from, retried if
+another bid got there first.
+"""
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .live import publish_listing_event
+from .models import Listing, Bid
+from .signals import listing_sold, listings_closed
+
+User = get_user_model()
+
+MAX_RESOLVE_ATTEMPTS = 5
+
+# One row to insert into Bid: who, at what visible amount, their hidden max (proxy only), engine-placed?
+BidRow = namedtuple('BidRow', ['bidder_id', 'amount', 'max_amount', 'is_automatic'])
+Resolution = namedtuple('Resolution', ['price', 'leader_id', 'leader_max', 'rows'])
+
+
+def min_next_bid(listing):
+    if listing.current_highest_bid is not None:
+        return listing.current_highest_bid + listing.auction_bid_increment
+    return listing.auction_start_price
+
+
+def open_auctions(now=None):
+    now = now or timezone.now()
+    return Listing.objects.filter(listing_type='AUCTION', status='ACTIVE').filter(
+        Q(auction_end_datetime__isnull=True) | Q(auction_end_datetime__gt=now)
+    )
+
+
+def resolve_bid(price, leader_id, leader_max, start_price, increment, bidder_id, amount, max_amount=None):
+    """
+    Pure proxy-bidding step. `price`/`leader_id`/`leader_max` describe the auction now; the bidder
+    offers `amount` outright, or up to `max_amount` as a proxy bid. Ties go to the earlier bidder.
+    Assumes the offer already clears min_next_bid().
+    """
+    ceiling = max_amount if max_amount is not None else amount
+    if price is None: # First bid: a proxy opens at the start price, a plain bid at its amount
+        opening = start_price if max_amount is not None else amount
+        return Resolution(opening, bidder_id, ceiling, [BidRow(bidder_id, opening, max_amount, False)])
+
+    leader_max = price if leader_max is None else leader_max
+    if bidder_id == leader_id: # Leader raising their own bid or maximum
+        new_price = price if max_amount is not None else amount
+        return Resolution(new_price, leader_id, max(ceiling, leader_max), [BidRow(bidder_id, new_price, max_amount, False)])
+
+    if ceiling > leader_max: # Challenger takes the lead
+        new_price = min(ceiling, leader_max + increment) if max_amount is not None else amount
+        rows = []
+        if leader_max > price: # The old leader's proxy fought all the way up to its maximum
+            rows.append(BidRow(leader_id, leader_max, None, True))
+        rows.append(BidRow(bidder_id, new_price, max_amount, False))
+        return Resolution(new_price, bidder_id, ceiling, rows)
+
+    # The leader's proxy maximum covers the challenge: the challenger is outbid straight away
+    new_price = min(leader_max, ceiling + increment)
+    rows = [BidRow(bidder_id, ceiling, max_amount, False), BidRow(leader_id, new_price, None, True)]
+    return Resolution(new_price, leader_id, leader_max, rows)
+
+
+def _current_state(listing_pk):
+    return Listing.objects.only(
+        'lister', 'listing_type', 'status', 'auction_end_datetime', 'auction_start_price', 'auction_bid_increment',
+        'current_highest_bid', 'current_high_bidder', 'current_high_bidder_max',
+    ).get(pk=listing_pk)
+
+
+def _rejection(current, offer):
+    """Explain why an offer cannot be placed on the freshly read `current` row. None if it can."""
+    if current.listing_type != 'AUCTION':
+        return "Bids can only be placed on auction listings."
+    if current.status != 'ACTIVE':
+        return "Bids can only be placed on active auctions."
+    if current.auction_end_datetime and current.auction_end_datetime <= timezone.now():
+        return "This auction has ended."
+    if offer < min_next_bid(current):
+        return f"Bid amount must be at least {min_next_bid(current)}."
+    return None
+
+
+def _state_filter(field, value):
+    return Q(**{f'{field}__isnull': True}) if value is None else Q(**{field: value})
+
+
+def place_bid(listing, bidder, amount=None, max_amount=None):
+    """
+    Bid on `listing` for `bidder`: `amount` outright, or a proxy bid up to `max_amount`.
+    `listing` may be stale; only its pk and lister are used. Returns the bidder's Bid, with
+    `is_leading` set to whether they hold the high bid afterwards. Raises ValidationError.
+    """
+    if listing.lister_id == bidder.pk:
+        raise ValidationError("You cannot bid on your own auction.")
+    if amount is None and max_amount is None:
+        raise ValidationError("Provide a bid amount or a maximum bid.")
+
+    if max_amount is None:
+        # Fast path: a plain bid that clears the visible price and any hidden maximum
+        takes_lead = (
+            Q(current_highest_bid__isnull=True, auction_start_price__lte=amount) |
+            Q(current_highest_bid__isnull=False, current_highest_bid__lte=amount - F('auction_bid_increment'))
+        ) & (Q(current_high_bidder_max__isnull=True) | Q(current_high_bidder_max__lt=amount))
+        with transaction.atomic():
+            won = open_auctions().filter(takes_lead, pk=listing.pk).update(
+                current_highest_bid=amount, current_high_bidder=bidder,
+                current_high_bidder_max=amount, last_modified=timezone.now(),
+            )
+            if won:
+                bid = Bid.objects.create(listing_id=listing.pk, bidder=bidder, amount=amount)
+                bid.is_leading = True
+                _announce_bid(listing.pk, amount, bidder.username)
+                return bid
+
+    offer = max_amount if max_amount is not None else amount
+    for _ in range(MAX_RESOLVE_ATTEMPTS):
+        current = _current_state(listing.pk)
+        reason = _rejection(current, offer)
+        if reason:
+            raise ValidationError(reason)
+        result = resolve_bid(
+            current.current_highest_bid, current.current_high_bidder_id, current.current_high_bidder_max,
+            current.auction_start_price, current.auction_bid_increment, bidder.pk, amount, max_amount,
+        )
+        unchanged = (
+            _state_filter('current_highest_bid', current.current_highest_bid) &
+            _state_filter('current_high_bidder_id', current.current_high_bidder_id) &
+            _state_filter('current_high_bidder_max', current.current_high_bidder_max)
+        )
+        with transaction.atomic():
+            written = open_auctions().filter(unchanged, pk=listing.pk).update(
+                current_highest_bid=result.price, current_high_bidder_id=result.leader_id,
+                current_high_bidder_max=result.leader_max, last_modified=timezone.now(),
+            )
+            if not written:
+                continue # Someone else bid in between; recompute from the new state
+            bids = Bid.objects.bulk_create([Bid(listing_id=listing.pk, **row._asdict()) for row in result.rows])
+            bid = next(b for b in bids if b.bidder_id == bidder.pk and not b.is_automatic)
+            bid.is_leading = result.leader_id == bidder.pk
+            if bid.is_leading:
+                leader_username = bidder.username
+            else:
+                leader_username = User.objects.filter(pk=result.leader_id).values_list('username', flat=True).first()
+            _announce_bid(listing.pk, result.price, leader_username)
+        return bid
+    raise ValidationError("This auction is very busy right now, please try again.")
+
+
+def _announce_bid(listing_id, price, high_bidder_username):
+    publish_listing_event(listing_id, {
+        'type': 'bid', 'current_highest_bid': str(price), 'high_bidder': high_bidder_username,
+    })
+
+
+def _due_batch(queryset, batch_size):
+    """Lock and return up to batch_size due (id, high bidder id) pairs, skipping rows another worker is closing."""
+    queryset = queryset.order_by().values_list('pk', 'current_high_bidder_id')
+    if connection.features.has_select_for_update_skip_locked:
+        queryset = queryset.select_for_update(skip_locked=True)
+    return list(queryset[:batch_size])
+
+
+def _still_active(listing_ids):
+    """
+    Which of `listing_ids` are still ACTIVE. Locked where the database can, and on SQLite the
+    transaction keeps other writers out, so the UPDATEs that follow change exactly these rows.
+    """
+    queryset = Listing.objects.filter(pk__in=listing_ids, status='ACTIVE').values_list('pk', flat=True)
+    if connection.features.has_select_for_update:
+        queryset = queryset.select_for_update()
+    return set(queryset)
+
+
+def close_due_listings(now=None, batch_size=500):
+    """
+    Close every ACTIVE listing whose time is up, in batches of batch_size:
+    auctions past auction_end_datetime (or, without one, past expires_on) become SOLD (if they have a
+    high bidder) or EXPIRED, other listings past expires_on become EXPIRED. Every UPDATE re-checks status='ACTIVE', so the
+    call is idempotent and several workers can run it at once (on PostgreSQL they also skip each
+    other's locked rows). Returns {'sold': n, 'expired': n}.
+    """
+    now = now or timezone.now()
+    closed = {'sold': 0, 'expired': 0}
+    due_auctions = Listing.objects.filter(
+        Q(auction_end_datetime__lte=now) | Q(auction_end_datetime__isnull=True, expires_on__lte=now),
+        status='ACTIVE', listing_type='AUCTION',
+    )
+    due_listings = Listing.objects.filter(status='ACTIVE', expires_on__lte=now).exclude(listing_type='AUCTION')
+
+    for due in (due_auctions, due_listings):
+        while True:
+            with transaction.atomic():
+                rows = _due_batch(due, batch_size)
+                if not rows:
+                    break
+                # Without skip_locked another worker (or a cancel) may have closed some of them since:
+                # only the rows that really change are announced
+                active = _still_active([pk for pk, _ in rows])
+                sold_ids = {pk for pk, high_bidder_id in rows if high_bidder_id and pk in active} if due is due_auctions else set()
+                expired_ids = active - sold_ids
+                if sold_ids:
+                    closed['sold'] += Listing.objects.filter(pk__in=sold_ids, status='ACTIVE').update(status='SOLD', last_modified=now)
+                    listing_sold.send(sender=Listing, listing_ids=sorted(sold_ids))
+                if expired_ids:
+                    closed['expired'] += Listing.objects.filter(pk__in=expired_ids, status='ACTIVE').update(status='EXPIRED', last_modified=now)
+                if active:
+                    listings_closed.send(sender=Listing, listing_ids=sorted(active))
+                for pk in sorted(active):
+                    publish_listing_event(pk, {'type': 'closed', 'status': 'SOLD' if pk in sold_ids else 'EXPIRED'})
+    return closed
@@ -0,0 +1,17 @@
+from django.dispatch import Signal
+
+# Sent with `listing_ids` once listings have become SOLD or TRADED, whether through Model.save()
+# or a bulk UPDATE (e.g. services.close_due_listings). Receivers run inside the same transaction.
+listing_sold = Signal()
+
+# Sent with `listing_ids` when a bulk UPDATE moves listings out of ACTIVE (sold or expired), since
+# those writes bypass post_save. Receivers run inside the same transaction.
+listings_closed = Signal()
+
+# Sent with `owner_id` and `card_ids` after Card rows were bulk-created for one owner (card_import),
+# which skips post_save. Receivers run inside the same transaction.
+cards_imported = Signal()
+
+# Sent with `owner_id` and `card_ids` after a bulk UPDATE of one owner's cards (collection.bulk_update_cards),
+# which skips post_save. Receivers run inside the same transaction.
+cards_updated = Signal()
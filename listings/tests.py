@@ -3,6 +3,7 @@ from django.urls import reverse, reverse_lazy
 from django.test import TestCase, Client # For web view tests
 from django.utils import timezone
 from datetime import timedelta
+import json
 from rest_framework.test import APITestCase, APIClient # For API tests
 from rest_framework import status
 
@@ -519,3 +520,794 @@ class UserCardCollectionViewTests(TestCase):
         self.assertTrue(Card.objects.filter(pk=self.card1_user.pk).exists())
         self.assertContains(response_post, f"Cannot delete &#x27;{self.card1_user.card_name}&#x27; as it is part of one or more active listings.")
         self.assertRedirects(response_post, self.detail_url_user_card1)
+
+
+# --- Full-text Search Tests ---
+class ListingSearchTests(APITestCase):
+    def setUp(self):
+        self.user = create_user("searcher", "searcher")
+        self.pokemon = Game.objects.create(name="Pokémon TCG")
+        self.sports = Game.objects.create(name="Baseball Cards")
+        self.charizard = Card.objects.create(owner=self.user, game=self.pokemon, card_name="Charizard", set_name="Base Set", attributes={"Edition": "1st"})
+        self.jeter = Card.objects.create(owner=self.user, game=self.sports, card_name="Derek Jeter", set_name="SP Foil")
+        self.charizard_listing = Listing.objects.create(lister=self.user, card_for_listing=self.charizard, listing_type='SALE', price=500)
+        self.jeter_listing = Listing.objects.create(lister=self.user, card_for_listing=self.jeter, listing_type='SALE', price=90, listing_description="Rookie card, sharp corners")
+
+    def test_search_document_kept_in_sync_on_save(self):
+        self.assertEqual(self.charizard_listing.search_document.title, "Charizard")
+        self.assertIn("Edition 1st", self.charizard_listing.search_document.body)
+        self.charizard.card_name = "Blastoise"
+        self.charizard.save()
+        self.charizard_listing.search_document.refresh_from_db()
+        self.assertEqual(self.charizard_listing.search_document.title, "Blastoise")
+        response = self.client.get(reverse('listings:listing-list'), {'q': 'blastoise'})
+        self.assertEqual(list(response.context['listings']), [self.charizard_listing])
+
+    def test_renaming_a_game_refreshes_its_listings(self):
+        self.pokemon.name = "Pocket Monsters"
+        self.pokemon.save()
+        search = lambda words: [row['id'] for row in self.client.get(reverse('listing-list'), {'search': words}).data['results']]
+        self.assertEqual(search('monsters'), [self.charizard_listing.pk])
+        self.assertEqual(search('pokemon'), [])
+
+    def test_api_search_uses_index(self):
+        response = self.client.get(reverse('listing-list'), {'search': 'pokemon'}) # Diacritics folded
+        ids = [row['id'] for row in (response.data['results'] if isinstance(response.data, dict) else response.data)]
+        self.assertEqual(ids, [self.charizard_listing.pk])
+
+        response = self.client.get(reverse('listing-list'), {'search': 'rook'}) # Prefix match on description
+        ids = [row['id'] for row in (response.data['results'] if isinstance(response.data, dict) else response.data)]
+        self.assertEqual(ids, [self.jeter_listing.pk])
+
+    def test_search_ranks_card_name_matches_first(self):
+        other = Card.objects.create(owner=self.user, game=self.pokemon, card_name="Pikachu")
+        mention = Listing.objects.create(lister=self.user, card_for_listing=other, listing_type='TRADE', listing_description="Looking for Charizard")
+        response = self.client.get(reverse('listings:listing-list'), {'q': 'charizard'})
+        self.assertEqual(list(response.context['listings']), [self.charizard_listing, mention])
+
+    def test_deleted_listing_leaves_index(self):
+        self.jeter_listing.delete()
+        response = self.client.get(reverse('listings:listing-list'), {'q': 'jeter'})
+        self.assertEqual(list(response.context['listings']), [])
+
+    def test_search_syntax_is_not_interpreted(self):
+        response = self.client.get(reverse('listing-list'), {'search': '"Charizard OR NEAR('})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+# --- Keyset Pagination Tests ---
+class ListingKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = create_user("pager", "pager")
+        self.card = Card.objects.create(owner=self.user, card_name="Paged Card")
+        # Mix of duplicate and NULL prices to exercise the (value, id) tie-breaks
+        prices = [5, 5, 5, None, 10, None, 1, 7, 7, None, 3]
+        self.listings = [
+            Listing.objects.create(lister=self.user, card_for_listing=self.card, listing_type='SALE' if price else 'TRADE', price=price)
+            for price in prices
+        ]
+        self.url = reverse('listing-list')
+
+    def walk(self, params, direction='next'):
+        seen, url = [], self.url
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data) # No COUNT(*) unless asked for
+            seen.extend(row['id'] for row in response.data['results'])
+            if not response.data[direction]:
+                return seen, response
+            response = self.client.get(response.data[direction])
+
+    def test_walks_default_ordering_without_gaps(self):
+        seen, _ = self.walk({'page_size': 3})
+        self.assertEqual(seen, [listing.pk for listing in sorted(self.listings, key=lambda l: (l.date_created, l.pk), reverse=True)])
+
+    def test_walks_nullable_ordering_field_forwards_and_back(self):
+        expected = [l.pk for l in sorted(self.listings, key=lambda l: (l.price is None, l.price or 0, l.pk))]
+        seen, last_page = self.walk({'page_size': 2, 'ordering': 'price'})
+        self.assertEqual(seen, expected)
+
+        backwards = list(reversed([row['id'] for row in last_page.data['results']]))
+        response = last_page
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'])
+            backwards.extend(reversed([row['id'] for row in response.data['results']]))
+        self.assertEqual(backwards, list(reversed(expected)))
+
+    def test_optional_totals(self):
+        response = self.client.get(self.url, {'count': 'exact', 'page_size': 2})
+        self.assertEqual(response.data['count'], len(self.listings))
+        self.assertFalse(response.data['count_is_estimate'])
+        response = self.client.get(self.url, {'count': 'approx'})
+        self.assertEqual(response.data['count'], len(self.listings))
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_html_list_uses_cursor_links(self):
+        response = self.client.get(reverse('listings:listing-list'))
+        self.assertEqual(len(response.context['listings']), 10)
+        self.assertTrue(response.context['page_obj'].has_next)
+        response = self.client.get(reverse('listings:listing-list'), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual([l.pk for l in response.context['listings']], [self.listings[0].pk])
+
+
+# --- Buffered View Counter Tests ---
+class ListingViewCounterTests(APITestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .view_counter import view_counts
+        cache.clear() # Start from an empty buffer
+        self.buffer = view_counts
+        self.user = create_user("viewcount", "viewcount")
+        self.card = Card.objects.create(owner=self.user, card_name="Popular Card")
+        self.listing = Listing.objects.create(lister=self.user, card_for_listing=self.card, listing_type='SALE', price=10)
+        self.other = Listing.objects.create(lister=self.user, card_for_listing=self.card, listing_type='TRADE')
+
+    def test_views_are_buffered_then_flushed_in_batches(self):
+        import time
+        with self.settings(LISTING_VIEW_FLUSH_INTERVAL=3600):
+            for _ in range(3):
+                self.client.get(reverse('listing-detail', kwargs={'pk': self.listing.pk}))
+            self.client.get(reverse('listings:listing-detail', kwargs={'pk': self.listing.pk}))
+            self.client.get(reverse('listings:listing-detail', kwargs={'pk': self.other.pk}))
+            self.listing.refresh_from_db()
+            self.assertEqual(self.listing.views_count, 0) # Nothing written on the request path
+            self.assertEqual(self.buffer.pending(self.listing.pk), 4)
+            self.assertEqual(self.buffer.flush(), 0) # The bucket is still open
+
+            later = time.time() + 2 * 3600
+            with self.assertNumQueries(4): # savepoint, one UPDATE per distinct increment, release
+                self.assertEqual(self.buffer.flush(now=later), 5)
+            self.assertEqual(self.buffer.pending(self.listing.pk, now=later), 0)
+        self.listing.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.listing.views_count, self.other.views_count), (4, 1))
+
+    def test_pending_views_outlive_the_worker_that_recorded_them(self):
+        import time
+        from .view_counter import ViewCountBuffer
+        ViewCountBuffer().record(self.listing.pk)
+        ViewCountBuffer().record(self.listing.pk) # Another worker, or the same one after a restart
+        restarted = ViewCountBuffer()
+        self.assertEqual(restarted.pending(self.listing.pk), 2)
+        self.assertEqual(restarted.flush(now=time.time() + 60), 2)
+        self.assertEqual(ViewCountBuffer().flush(now=time.time() + 60), 0) # Written once
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.views_count, 2)
+
+    def test_failed_flush_keeps_the_views_for_the_next_one(self):
+        import time
+        from unittest import mock
+        from django.db import DatabaseError
+        self.buffer.record(self.listing.pk)
+        later = time.time() + 60
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError):
+            self.assertEqual(self.buffer.flush(now=later), 0)
+        self.assertEqual(self.buffer.flush(now=later), 1)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.views_count, 1)
+
+    def test_worker_dying_mid_flush_never_counts_twice(self):
+        import time
+        from unittest import mock
+        self.buffer.record(self.listing.pk)
+        later = time.time() + 60
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=SystemExit), self.assertRaises(SystemExit):
+            self.buffer.flush(now=later) # Killed after claiming the bucket
+        self.assertEqual(self.buffer.flush(now=later + 120), 0) # The claimed bucket is gone: undercount, never double
+        self.assertEqual(self.buffer.pending(self.listing.pk, now=later), 0)
+
+    def test_flush_happens_after_request_once_due(self):
+        import time
+        from unittest import mock
+        with self.settings(LISTING_VIEW_FLUSH_INTERVAL=1):
+            self.client.get(reverse('listing-detail', kwargs={'pk': self.listing.pk}))
+            self.buffer._last_flush -= 1
+            with mock.patch('listings.view_counter.time.time', return_value=time.time() + 5):
+                self.client.get(reverse('listings:listing-detail', kwargs={'pk': self.other.pk})) # Finishing it flushes the closed bucket
+            self.assertEqual(self.buffer.pending(self.other.pk, now=time.time() + 5), 1) # Still open
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.views_count, 1)
+
+
+# --- Bid Service Tests ---
+class PlaceBidServiceTests(TestCase):
+    def setUp(self):
+        from .services import place_bid
+        self.place_bid = place_bid
+        self.lister = create_user("svc_lister", "svc_lister")
+        self.alice = create_user("svc_alice", "svc_alice")
+        self.bob = create_user("svc_bob", "svc_bob")
+        card = Card.objects.create(owner=self.lister, card_name="Contested Card")
+        self.auction = Listing.objects.create(
+            lister=self.lister, card_for_listing=card, listing_type='AUCTION',
+            auction_start_price=10, auction_bid_increment=1, auction_end_datetime=timezone.now() + timedelta(minutes=1)
+        )
+
+    def test_stale_lower_bid_cannot_overwrite_higher_bid(self):
+        from django.core.exceptions import ValidationError
+        stale_copy = Listing.objects.get(pk=self.auction.pk) # Both bidders loaded the page at the same time
+        self.place_bid(self.auction, self.alice, 20)
+        with self.assertRaisesMessage(ValidationError, "at least 21"):
+            self.place_bid(stale_copy, self.bob, 12)
+        self.auction.refresh_from_db()
+        self.assertEqual(self.auction.current_highest_bid, 20)
+        self.assertEqual(self.auction.current_high_bidder, self.alice)
+        self.assertEqual(Bid.objects.filter(listing=self.auction).count(), 1)
+
+    def test_rejects_below_start_own_auction_and_ended(self):
+        from django.core.exceptions import ValidationError
+        with self.assertRaisesMessage(ValidationError, "at least 10"):
+            self.place_bid(self.auction, self.alice, 9)
+        with self.assertRaisesMessage(ValidationError, "your own auction"):
+            self.place_bid(self.auction, self.lister, 50)
+        Listing.objects.filter(pk=self.auction.pk).update(auction_end_datetime=timezone.now() - timedelta(seconds=1))
+        with self.assertRaisesMessage(ValidationError, "has ended"):
+            self.place_bid(self.auction, self.alice, 50)
+
+    def test_winning_bid_is_single_conditional_update(self):
+        with self.assertNumQueries(4): # savepoint, CAS UPDATE, INSERT bid, release
+            bid = self.place_bid(self.auction, self.alice, 10)
+        self.assertEqual(bid.amount, 10)
+
+
+# --- Proxy Bidding Tests ---
+class ProxyBiddingTests(APITestCase):
+    def setUp(self):
+        from .services import place_bid
+        self.place_bid = place_bid
+        self.lister = create_user("proxy_lister", "proxy_lister")
+        self.alice = create_user("proxy_alice", "proxy_alice")
+        self.bob = create_user("proxy_bob", "proxy_bob")
+        card = Card.objects.create(owner=self.lister, card_name="Proxy Card")
+        self.auction = Listing.objects.create(
+            lister=self.lister, card_for_listing=card, listing_type='AUCTION',
+            auction_start_price=10, auction_bid_increment=1, auction_end_datetime=timezone.now() + timedelta(days=1)
+        )
+
+    def state(self):
+        self.auction.refresh_from_db()
+        return self.auction.current_highest_bid, self.auction.current_high_bidder, self.auction.current_high_bidder_max
+
+    def test_proxy_opens_at_start_price_and_defends_its_maximum(self):
+        self.place_bid(self.auction, self.alice, max_amount=50)
+        self.assertEqual(self.state(), (10, self.alice, 50))
+
+        bid = self.place_bid(self.auction, self.bob, amount=20) # Plain bid below Alice's hidden max
+        self.assertFalse(bid.is_leading)
+        self.assertEqual(self.state(), (21, self.alice, 50))
+        auto = Bid.objects.get(listing=self.auction, is_automatic=True)
+        self.assertEqual((auto.bidder, auto.amount), (self.alice, 21))
+
+    def test_higher_proxy_takes_lead_one_increment_above_second_max(self):
+        self.place_bid(self.auction, self.alice, max_amount=50)
+        bid = self.place_bid(self.auction, self.bob, max_amount=80)
+        self.assertTrue(bid.is_leading)
+        self.assertEqual(self.state(), (51, self.bob, 80))
+        # Alice's proxy fought up to her max before losing
+        self.assertTrue(Bid.objects.filter(bidder=self.alice, amount=50, is_automatic=True).exists())
+
+    def test_equal_maximum_goes_to_earlier_bidder(self):
+        self.place_bid(self.auction, self.alice, max_amount=50)
+        self.place_bid(self.auction, self.bob, max_amount=50)
+        self.assertEqual(self.state(), (50, self.alice, 50))
+
+    def test_plain_bid_above_proxy_max_takes_lead_at_its_amount(self):
+        self.place_bid(self.auction, self.alice, max_amount=30)
+        bid = self.place_bid(self.auction, self.bob, amount=35)
+        self.assertTrue(bid.is_leading)
+        self.assertEqual(self.state(), (35, self.bob, 35))
+
+    def test_api_hides_maximum(self):
+        self.client.force_authenticate(self.bob)
+        url = reverse('listing-place-bid', kwargs={'pk': self.auction.pk})
+        response = self.client.post(url, {'max_amount': '40.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertNotIn('max_amount', response.data)
+        self.assertTrue(response.data['is_leading'])
+        listing_data = self.client.get(reverse('listing-detail', kwargs={'pk': self.auction.pk})).data
+        self.assertNotIn('current_high_bidder_max', listing_data)
+        self.assertEqual(listing_data['current_highest_bid'], '10.00')
+
+
+# --- Expiry Scheduler Tests ---
+class CloseDueListingsTests(TestCase):
+    def setUp(self):
+        self.lister = create_user("expiry_lister", "expiry_lister")
+        self.bidder = create_user("expiry_bidder", "expiry_bidder")
+        self.card = Card.objects.create(owner=self.lister, card_name="Expiring Card")
+        past, future = timezone.now() - timedelta(minutes=5), timezone.now() + timedelta(days=1)
+        make = lambda **kw: Listing.objects.create(lister=self.lister, card_for_listing=self.card, **kw)
+        self.won = make(listing_type='AUCTION', auction_start_price=5, auction_end_datetime=past, current_highest_bid=9, current_high_bidder=self.bidder)
+        self.unsold = make(listing_type='AUCTION', auction_start_price=5, auction_end_datetime=past)
+        self.running = make(listing_type='AUCTION', auction_start_price=5, auction_end_datetime=future)
+        self.open_ended = make(listing_type='AUCTION', auction_start_price=5, expires_on=past, current_highest_bid=7, current_high_bidder=self.bidder)
+        self.stale_sale = make(listing_type='SALE', price=10, expires_on=past)
+        self.fresh_sale = make(listing_type='SALE', price=10, expires_on=future)
+        self.cancelled = make(listing_type='SALE', price=10, expires_on=past, status='CANCELLED')
+
+    def statuses(self):
+        return {l.pk: l.status for l in Listing.objects.all()}
+
+    def test_closes_due_listings_in_batches(self):
+        from .services import close_due_listings
+        closed = close_due_listings(batch_size=1)
+        self.assertEqual(closed, {'sold': 2, 'expired': 2})
+        self.assertEqual(self.statuses(), {
+            self.won.pk: 'SOLD', self.unsold.pk: 'EXPIRED', self.running.pk: 'ACTIVE', self.open_ended.pk: 'SOLD',
+            self.stale_sale.pk: 'EXPIRED', self.fresh_sale.pk: 'ACTIVE', self.cancelled.pk: 'CANCELLED',
+        })
+        self.won.refresh_from_db()
+        self.assertEqual(self.won.current_high_bidder, self.bidder) # Winner is kept on the listing
+
+    def test_only_listings_that_really_close_are_announced(self):
+        from unittest import mock
+        from . import services
+        from .signals import listing_sold, listings_closed
+        real_due_batch = services._due_batch
+
+        def due_batch_then_cancel(queryset, batch_size):
+            rows = real_due_batch(queryset, batch_size)
+            Listing.objects.filter(pk__in=[self.won.pk, self.stale_sale.pk]).update(status='CANCELLED') # Got there first
+            return rows
+
+        sold, closed = [], []
+        record_sold = lambda listing_ids, **kwargs: sold.extend(listing_ids)
+        record_closed = lambda listing_ids, **kwargs: closed.extend(listing_ids)
+        listing_sold.connect(record_sold)
+        listings_closed.connect(record_closed)
+        self.addCleanup(listing_sold.disconnect, record_sold)
+        self.addCleanup(listings_closed.disconnect, record_closed)
+        with mock.patch.object(services, '_due_batch', due_batch_then_cancel):
+            self.assertEqual(services.close_due_listings(), {'sold': 1, 'expired': 1})
+        self.assertEqual(sold, [self.open_ended.pk])
+        self.assertEqual(sorted(closed), sorted([self.open_ended.pk, self.unsold.pk]))
+        self.assertEqual(Listing.objects.get(pk=self.won.pk).status, 'CANCELLED')
+
+    def test_is_idempotent(self):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('close_expired_listings', verbosity=0, stdout=out)
+        self.assertEqual(out.getvalue(), '') # Quiet for cron at --verbosity 0
+        before = self.statuses()
+        from .services import close_due_listings
+        self.assertEqual(close_due_listings(), {'sold': 0, 'expired': 0})
+        self.assertEqual(self.statuses(), before)
+
+
+# --- Live Auction Event Tests ---
+class LiveAuctionEventTests(TestCase):
+    def setUp(self):
+        self.lister = create_user("live_lister", "live_lister")
+        self.bidder = create_user("live_bidder", "live_bidder")
+        card = Card.objects.create(owner=self.lister, card_name="Live Card")
+        self.auction = Listing.objects.create(
+            lister=self.lister, card_for_listing=card, listing_type='AUCTION',
+            auction_start_price=10, auction_bid_increment=1, auction_end_datetime=timezone.now() + timedelta(hours=1)
+        )
+
+    def test_bid_is_published_after_commit(self):
+        import asyncio
+        from .live import get_broker, listing_channel
+        from .services import place_bid
+
+        async def watch(): # Subscriptions belong to the event loop they were created on
+            return get_broker().subscribe(listing_channel(self.auction.pk))
+
+        loop = asyncio.new_event_loop()
+        subscription = loop.run_until_complete(watch())
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                place_bid(self.auction, self.bidder, amount=12)
+            event = loop.run_until_complete(subscription.get(timeout=1))
+        finally:
+            get_broker().unsubscribe(subscription)
+            loop.close()
+        self.assertEqual(event, {'listing': self.auction.pk, 'type': 'bid', 'current_highest_bid': '12', 'high_bidder': self.bidder.username})
+
+    async def test_event_stream_sends_snapshot_then_live_bids(self):
+        import asyncio
+        from .live import get_broker, listing_channel
+
+        response = await self.async_client.get(reverse('listings:listing-events', kwargs={'pk': self.auction.pk}))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        first = await anext(stream)
+        self.assertIn(b'event: snapshot', first)
+        self.assertEqual(get_broker().subscriber_count(listing_channel(self.auction.pk)), 1)
+
+        get_broker().publish(listing_channel(self.auction.pk), {'type': 'closed', 'status': 'SOLD', 'listing': self.auction.pk})
+        closed = await asyncio.wait_for(anext(stream), 1)
+        self.assertIn(b'event: closed', closed)
+        with self.assertRaises(StopAsyncIteration): # Stream ends once the auction has closed
+            await anext(stream)
+        self.assertEqual(get_broker().subscriber_count(listing_channel(self.auction.pk)), 0)
+
+class CardIdentityTests(TestCase):
+    def setUp(self):
+        self.owner = create_user("identity_owner", "identity_owner")
+        self.other = create_user("identity_other", "identity_other")
+        self.game = Game.objects.create(name="Pokémon TCG")
+
+    def test_copies_of_the_same_card_share_an_identity(self):
+        mine = Card.objects.create(owner=self.owner, game=self.game, card_name="Charizard", set_name="Base Set", year=1999, card_identifier_in_set="004/102")
+        theirs = Card.objects.create(owner=self.other, game=self.game, card_name=" charizard", set_name="BASE-SET", year=1999, card_identifier_in_set="4/102",
+                                     is_graded=True, grader='PSA', grade='9 Mint')
+        self.assertEqual(mine.identity_key, 'pokemon tcg|charizard|base set|1999|4 102')
+        self.assertEqual(theirs.identity_key, mine.identity_key)
+        self.assertEqual(theirs.grade_value, 9)
+        self.assertEqual(theirs.market_series, (mine.identity_key, 'PSA', 9))
+        self.assertEqual(mine.market_series, (mine.identity_key, '', None))
+
+    def test_partial_saves_keep_the_identity_current(self):
+        card = Card.objects.create(owner=self.owner, card_name="Pikachu")
+        card.card_name = "Raichu"
+        card.save(update_fields=['card_name'])
+        card.refresh_from_db()
+        self.assertEqual(card.identity_key, '|raichu|||')
+
+    def test_backfill_command_fills_rows_in_chunks(self):
+        from django.core.management import call_command
+        for name in ["Mew", "Mewtwo", "Eevee"]:
+            Card.objects.create(owner=self.owner, game=self.game, card_name=name, is_graded=True, grader='BGS', grade='9.5')
+        Card.objects.update(identity_key='', grade_value=None) # As if saved before the columns existed
+        call_command('backfill_card_identity', chunk_size=2, verbosity=0)
+        self.assertEqual(
+            set(Card.objects.values_list('identity_key', 'grade_value')),
+            {('pokemon tcg|eevee|||', 9.5), ('pokemon tcg|mew|||', 9.5), ('pokemon tcg|mewtwo|||', 9.5)},
+        )
+
+
+class CardImportTests(APITestCase):
+    def setUp(self):
+        self.user = create_user("importer", "importer")
+        self.client.force_authenticate(self.user)
+        self.game = Game.objects.create(name="Pokémon TCG")
+        self.url = reverse('usercard-bulk-import')
+
+    def _upload(self, name, content, query=''):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        response = self.client.post(self.url + query, {'file': SimpleUploadedFile(name, content.encode())}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_csv_import_reports_rejected_rows(self):
+        lines = self._upload('cards.csv', (
+            "game,card_name,set_name,year,condition,is_graded,grader,grade,purchase_price,attributes\n"
+            "pokemon tcg,Charizard,Base Set,1999,Near Mint,yes,psa,9,$1200.00,\"{\"\"Edition\"\": \"\"1st\"\"}\"\n"
+            "Pokémon TCG,Pikachu,Jungle,1999,LP,no,,,5,\n"
+            "Pokémon TCG,,Jungle,abc,XX,yes,,,,\n"
+            "Magic,Black Lotus,Alpha,1993,M,no,,,,\n"
+        ))
+        self.assertEqual(lines[-1], {'created': 2, 'rejected': 2, 'dry_run': False})
+        self.assertEqual(lines[0]['row'], 3)
+        self.assertEqual(set(lines[0]['errors']), {'card_name', 'year', 'condition', 'grader', 'grade'})
+        self.assertEqual(lines[1], {'row': 4, 'errors': {'game': "Unknown game 'Magic'."}})
+
+        charizard = Card.objects.get(card_name="Charizard")
+        self.assertEqual((charizard.owner, charizard.game, charizard.condition, charizard.grader), (self.user, self.game, 'NM', 'PSA'))
+        self.assertEqual(charizard.attributes, {'Edition': '1st'})
+        self.assertEqual(charizard.identity_key, 'pokemon tcg|charizard|base set|1999|')
+        self.assertEqual(charizard.grade_value, 9)
+        self.assertEqual(self.user.portfolio.card_count, 2) # Bulk inserts still reach the portfolio
+
+    def test_json_body_and_dry_run(self):
+        rows = [{'game': 'pokemon-tcg', 'card_name': "Mew"}, "not a card", {'card_name': "Eevee", 'attributes': [1]}]
+        response = self.client.post(self.url + '?dry_run=1', rows, format='json')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line.get('row') for line in lines], [2, 3, None])
+        self.assertEqual(lines[-1], {'created': 1, 'rejected': 2, 'dry_run': True})
+        self.assertFalse(Card.objects.exists())
+
+    def test_jsonl_import_and_unreadable_uploads(self):
+        lines = self._upload('cards.jsonl', '{"card_name": "Mew"}\n\n{broken\n{"card_name": "Eevee", "is_graded": true, "grader": "BGS", "grade": "9.5"}\n')
+        self.assertEqual(lines[-1], {'created': 2, 'rejected': 1, 'dry_run': False})
+        self.assertEqual(Card.objects.get(card_name="Eevee").grade_value, 9.5)
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        for name, content in [('cards.txt', b'x'), ('cards.json', b'{"card_name": "Mew"}')]:
+            response = self.client.post(self.url, {'file': SimpleUploadedFile(name, content)}, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_files_that_are_not_utf8_or_not_csv(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        latin1 = "card_name,set_name\nPokémon Promo,Étoile\n".encode('latin-1')
+        response = self.client.post(self.url, {'file': SimpleUploadedFile('cards.csv', latin1)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST) # Refused before the stream starts
+        self.assertIn("UTF-8", response.data['file'][0])
+
+        lines = self._upload('cards.csv', "card_name,notes\nMew,ok\nMewtwo,\"" + "x" * 200000 + "\"\n")
+        self.assertIn("Not a readable CSV file", lines[-1]['detail'])
+
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(reverse('listings:my-card-import'), {'file': SimpleUploadedFile('cards.csv', latin1)})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("UTF-8", response.context['form'].errors['file'][0])
+        self.assertFalse(Card.objects.filter(card_name__startswith="Pok").exists())
+
+    def test_web_upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('listings:my-card-import')
+        response = client.post(url, {'file': SimpleUploadedFile('cards.csv', b"card_name,game\nMew,Pokemon TCG\n")})
+        self.assertRedirects(response, reverse('listings:my-card-list'))
+        self.assertEqual(Card.objects.get().game, self.game)
+
+        response = client.post(url, {'file': SimpleUploadedFile('cards.csv', b"card_name,year\nMewtwo,1999\n,1999\n")})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['import_errors'], [[2, {'card_name': "This field is required."}]])
+        self.assertEqual(Card.objects.count(), 2)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = create_user("exporter", "exporter")
+        self.other = create_user("export_other", "export_other")
+        self.client.force_authenticate(self.user)
+        self.game = Game.objects.create(name="Pokémon TCG")
+        self.card = Card.objects.create(owner=self.user, game=self.game, card_name="Charizard", year=1999, purchase_price='120.50', attributes={'Edition': '1st'})
+        Card.objects.create(owner=self.user, card_name="Pikachu")
+        Card.objects.create(owner=self.other, card_name="Not mine")
+
+    def _lines(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_collection_csv_round_trips_through_the_import(self):
+        response = self.client.get(reverse('usercard-export'))
+        self.assertIn('attachment; filename="collection-', response['Content-Disposition'])
+        import csv
+        rows = list(csv.DictReader(self._lines(response)))
+        self.assertEqual(sorted(row['card_name'] for row in rows), ["Charizard", "Pikachu"])
+        charizard = next(row for row in rows if row['card_name'] == "Charizard")
+        self.assertEqual((charizard['game'], charizard['purchase_price'], charizard['attributes']), ("Pokémon TCG", '120.50', '{"Edition": "1st"}'))
+
+        from .card_import import import_cards
+        self.assertEqual(list(import_cards(self.other, rows))[-1], ('done', 2, 0))
+        self.assertEqual(Card.objects.get(owner=self.other, card_name="Charizard").attributes, {'Edition': '1st'})
+
+    def test_collection_jsonl_respects_filters(self):
+        lines = self._lines(self.client.get(reverse('usercard-export'), {'file_format': 'jsonl', 'search': 'chari'}))
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.card.pk])
+        self.assertEqual(self.client.get(reverse('usercard-export'), {'file_format': 'xml'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_listing_history_includes_every_status_but_only_own_listings(self):
+        Listing.objects.create(lister=self.user, card_for_listing=self.card, listing_type='SALE', price=100, status='SOLD')
+        Listing.objects.create(lister=self.user, card_for_listing=self.card, listing_type='SALE', price=150)
+        Listing.objects.create(lister=self.other, card_for_listing=Card.objects.get(card_name="Not mine"), listing_type='SALE', price=5)
+        lines = [json.loads(line) for line in self._lines(self.client.get(reverse('listing-export'), {'file_format': 'jsonl'}))]
+        self.assertEqual([(line['status'], line['price'], line['card_name']) for line in lines], [('ACTIVE', '150.00', "Charizard"), ('SOLD', '100.00', "Charizard")])
+        self.assertNotIn('current_high_bidder_max', lines[0])
+
+        lines = self._lines(self.client.get(reverse('listing-export'), {'status': 'SOLD'}))
+        self.assertEqual(len(lines), 2) # Header + the sold one
+        graded = Card.objects.create(owner=self.user, card_name="Blastoise", is_graded=True, grader='PSA', grade='9')
+        Listing.objects.create(lister=self.user, card_for_listing=graded, listing_type='SALE', price=300)
+        lines = [json.loads(line) for line in self._lines(self.client.get(reverse('listing-export'), {'file_format': 'jsonl', 'ordering': '-grade_value'}))]
+        self.assertEqual(lines[0]['card_name'], "Blastoise")
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get(reverse('listing-export')).status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+
+class BulkCardEditTests(APITestCase):
+    def setUp(self):
+        self.user = create_user("bulk_owner", "bulk_owner")
+        self.other = create_user("bulk_other", "bulk_other")
+        self.client.force_authenticate(self.user)
+        self.game = Game.objects.create(name="Pokémon TCG")
+        self.cards = [Card.objects.create(owner=self.user, card_name=name, purchase_price=10) for name in ["Mew", "Eevee", "Snorlax"]]
+        self.ids = [card.pk for card in self.cards]
+        self.url = reverse('usercard-bulk')
+
+    def test_bulk_patch_updates_every_card_and_refreshes_identity(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        changes = {'game': self.game.pk, 'condition': 'NM', 'is_graded': True, 'grader': 'PSA', 'grade': '10 Gem Mint'}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url, {'ids': self.ids, 'changes': changes}, format='json')
+        self.assertEqual(response.data, {'updated': 3})
+        self.assertLess(len(queries), 20) # Not one round trip per card
+        self.assertEqual(
+            set(Card.objects.values_list('identity_key', 'condition', 'grader', 'grade_value')),
+            {(f'pokemon tcg|{name}|||', 'NM', 'PSA', 10) for name in ["mew", "eevee", "snorlax"]},
+        )
+        self.assertEqual(self.user.portfolio.card_count, 3)
+
+    def test_bulk_patch_refreshes_listing_search_documents(self):
+        Listing.objects.create(lister=self.user, card_for_listing=self.cards[0], listing_type='SALE', price=50)
+        response = self.client.patch(self.url, {'ids': self.ids, 'changes': {'game': self.game.pk, 'set_name': "Alpha"}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(reverse('listing-list'), {'search': 'Alpha'})
+        self.assertEqual([listing['id'] for listing in response.data['results']], [self.cards[0].listed_as.get().pk])
+
+    def test_bulk_patch_is_all_or_nothing(self):
+        theirs = Card.objects.create(owner=self.other, card_name="Theirs")
+        response = self.client.patch(self.url, {'ids': self.ids + [theirs.pk], 'changes': {'condition': 'NM'}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(theirs.pk), response.data['ids'][0])
+
+        response = self.client.patch(self.url, {'ids': self.ids, 'changes': {'is_graded': True, 'grader': 'PSA'}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(self.url, {'ids': self.ids, 'changes': {'owner': self.other.pk}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Card.objects.exclude(condition='').exists())
+
+    def test_bulk_delete_guards_active_listings_in_one_go(self):
+        listing = Listing.objects.create(lister=self.user, card_for_listing=self.cards[0], listing_type='SALE', price=50)
+        response = self.client.delete(self.url, {'ids': self.ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(self.cards[0].pk), response.data['ids'][0])
+        self.assertEqual(Card.objects.count(), 3)
+
+        listing.status = 'CANCELLED'
+        listing.save()
+        response = self.client.delete(self.url, {'ids': self.ids[1:]}, format='json')
+        self.assertEqual(response.data, {'deleted': 2})
+        self.assertEqual(list(Card.objects.values_list('pk', flat=True)), self.ids[:1])
+        self.user.portfolio.refresh_from_db()
+        self.assertEqual((self.user.portfolio.card_count, self.user.portfolio.cost_basis), (1, 10))
+
+
+class GradeFilterTests(APITestCase):
+    def setUp(self):
+        self.user = create_user("grades", "grades")
+        self.client.force_authenticate(self.user)
+        specs = [("A", 'PSA', '10 Gem Mint'), ("B", 'PSA', '8 (OC)'), ("C", 'PSA', '9'), ("D", 'BGS', '9.5 Black Label'), ("E", None, None)]
+        self.cards = {
+            name: Card.objects.create(owner=self.user, card_name=name, is_graded=grader is not None, grader=grader, grade=grade)
+            for name, grader, grade in specs
+        }
+        for price, card in enumerate(self.cards.values(), start=1):
+            Listing.objects.create(lister=self.user, card_for_listing=card, listing_type='SALE', price=price)
+
+    def test_grades_are_parsed_on_save(self):
+        self.assertEqual(
+            [(card.grade_value, card.grade_label, card.grade_qualifier) for card in Card.objects.order_by('card_name')],
+            [(10, 'Gem Mint', ''), (8, '', 'OC'), (9, '', ''), (9.5, 'Black Label', ''), (None, '', '')],
+        )
+
+    def test_out_of_range_grades_have_no_numeric_value(self):
+        from decimal import Decimal
+        from .identity import parse_grade
+        self.assertEqual(parse_grade("1234")[0], None)
+        self.assertEqual(parse_grade("9.75")[0], Decimal('9.8'))
+        data = {'card_name': "Typo", 'is_graded': True, 'grader': 'PSA', 'grade': "1234"}
+        response = self.client.post(reverse('usercard-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(Card.objects.get(card_name="Typo").grade_value)
+
+        from .card_import import import_cards
+        self.assertEqual(list(import_cards(self.user, [{**data, 'card_name': "Imported"}]))[-1], ('done', 1, 0))
+        response = self.client.patch(reverse('usercard-bulk'), {'ids': [self.cards["E"].pk], 'changes': {'is_graded': True, 'grader': 'BGS', 'grade': "99999"}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Card.objects.filter(grade__in=["1234", "99999"]).values_list('grade_value', flat=True)), [None, None, None])
+
+    def test_card_and_listing_grade_filters_and_ordering(self):
+        response = self.client.get(reverse('usercard-list'), {'grader': 'PSA', 'grade__gte': 9, 'ordering': '-grade_value'})
+        results = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual([card['card_name'] for card in results], ["A", "C"])
+
+        response = self.client.get(reverse('listing-list'), {'grade__gte': '8.5', 'grade__lte': 9.5, 'ordering': 'grade_value'})
+        self.assertEqual([listing['card_for_listing'] for listing in response.data['results']], [self.cards["C"].pk, self.cards["D"].pk])
+        response = self.client.get(reverse('listing-list'), {'grader': 'PSA', 'ordering': '-grade_value'})
+        self.assertEqual([listing['card_for_listing'] for listing in response.data['results']], [self.cards[name].pk for name in "ACB"])
+
+
+class CertLookupTests(APITestCase):
+    def setUp(self):
+        self.owner = create_user("slab_owner", "slab_owner")
+        self.other = create_user("slab_other", "slab_other")
+        self.game = Game.objects.create(name="Pokémon TCG")
+        self.card = Card.objects.create(owner=self.owner, game=self.game, card_name="Charizard", is_graded=True,
+                                        grader='PSA', grade='9', certification_number=' 1234-5678 ', purchase_price=500)
+
+    def test_cert_numbers_are_unique_per_grader(self):
+        self.assertEqual(self.card.cert_key, '12345678')
+        self.client.force_authenticate(self.other)
+        data = {'card_name': "Charizard", 'is_graded': True, 'grader': 'PSA', 'grade': '9', 'certification_number': '12345678'}
+        response = self.client.post(reverse('usercard-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('certification_number', response.data)
+        response = self.client.post(reverse('usercard-list'), {**data, 'grader': 'BGS'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        from .card_import import import_cards
+        rows = [{**data, 'grader': 'SGC'}, {**data, 'grader': 'SGC'}, data]
+        results = list(import_cards(self.other, rows))
+        self.assertEqual([result[1] for result in results[:-1]], [2, 3]) # Repeated within the upload, then already registered
+        self.assertEqual(results[-1], ('done', 1, 2))
+
+    def test_slab_registered_between_check_and_save_is_a_field_error(self):
+        from unittest import mock
+        data = {'card_name': "Charizard", 'is_graded': True, 'grader': 'PSA', 'grade': '9', 'certification_number': '12345678'}
+        self.client.force_authenticate(self.other)
+        with mock.patch.object(Card, 'cert_in_use', side_effect=[False, True]): # The check passes, then the INSERT loses the race
+            response = self.client.post(reverse('usercard-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('certification_number', response.data)
+
+        mine = Card.objects.create(owner=self.other, card_name="Charizard", is_graded=True, grader='PSA', grade='9', certification_number='999')
+        with mock.patch.object(Card, 'cert_in_use', side_effect=[False, True]):
+            response = self.client.patch(reverse('usercard-detail', kwargs={'pk': mine.pk}), {'certification_number': '1234 5678'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        web = Client()
+        web.force_login(self.other)
+        form_data = {'card_name': "Charizard", 'condition': 'NM', 'is_graded': 'on', 'grader': 'PSA', 'grade': '9', 'certification_number': '12345678'}
+        with mock.patch.object(Card, 'cert_in_use', side_effect=[False, True]):
+            response = web.post(reverse('listings:my-card-create'), form_data)
+        self.assertEqual(response.status_code, 200) # The form again, not a 500
+        self.assertIn('certification_number', response.context['form'].errors)
+        self.assertEqual(Card.objects.filter(cert_key='12345678').count(), 1)
+
+    def test_lookup_returns_card_and_active_listing_in_one_query(self):
+        Listing.objects.create(lister=self.owner, card_for_listing=self.card, listing_type='SALE', price=900, status='EXPIRED')
+        listing = Listing.objects.create(lister=self.owner, card_for_listing=self.card, listing_type='SALE', price=750)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cert-lookup'), {'cert': '1234 5678'})
+        [result] = response.data['results']
+        self.assertEqual(result['card']['card_name'], "Charizard")
+        self.assertEqual(result['card']['game_name'], "Pokémon TCG")
+        self.assertNotIn('purchase_price', result['card'])
+        self.assertEqual([(entry['id'], entry['price'], entry['lister_username']) for entry in result['listings']], [(listing.pk, 750, self.owner.username)])
+
+        self.assertEqual(self.client.get(reverse('cert-lookup'), {'cert': '12345678', 'grader': 'bgs'}).data['results'], [])
+        self.assertEqual(self.client.get(reverse('cert-lookup')).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_duplicate_command_reports_legacy_duplicates(self):
+        from io import StringIO
+        from django.core.management import call_command
+        legacy = Card.objects.create(owner=self.other, card_name="Charizard", is_graded=True, grader='PSA', grade='9')
+        Card.objects.filter(pk=legacy.pk).update(certification_number='12345678') # As saved before the constraint
+        out = StringIO()
+        call_command('find_duplicate_certs', verbosity=0, stdout=out)
+        self.assertEqual(out.getvalue(), f"PSA 12345678: #{self.card.pk} ({self.owner.username}), #{legacy.pk} ({self.other.username})\n")
+
+
+class AttributeIndexTests(APITestCase):
+    def setUp(self):
+        self.user = create_user("attrs", "attrs")
+        self.client.force_authenticate(self.user)
+        self.first = Card.objects.create(owner=self.user, card_name="Charizard", attributes={'Edition': '1st', 'Holo': True, 'Tags': ['Shadowless', 'Error']})
+        self.unlimited = Card.objects.create(owner=self.user, card_name="Blastoise", attributes={'Edition': 'Unlimited', 'Holo': True})
+        self.plain = Card.objects.create(owner=self.user, card_name="Rattata")
+        for card in (self.first, self.unlimited, self.plain):
+            Listing.objects.create(lister=self.user, card_for_listing=card, listing_type='SALE', price=10)
+
+    def _names(self, url, params):
+        response = self.client.get(url, params)
+        results = response.data['results'] if 'results' in response.data else response.data
+        if url == reverse('listing-list'):
+            return sorted(Card.objects.get(pk=listing['card_for_listing']).card_name for listing in results)
+        return sorted(card['card_name'] for card in results)
+
+    def test_index_follows_saves(self):
+        self.assertEqual(
+            set(self.first.attribute_index.values_list('key', 'value')),
+            {('edition', '1st'), ('holo', 'true'), ('tags', 'shadowless'), ('tags', 'error')},
+        )
+        self.first.attributes = {'Edition': '1st'}
+        self.first.save()
+        self.assertEqual(list(self.first.attribute_index.values_list('key', 'value')), [('edition', '1st')])
+        self.first.card_name = "Charizard EX"
+        self.first.save(update_fields=['card_name']) # attributes untouched, index left alone
+        self.assertEqual(self.first.attribute_index.count(), 1)
+
+    def test_attribute_filters_on_cards_and_listings(self):
+        for url in (reverse('usercard-list'), reverse('listing-list')):
+            self.assertEqual(self._names(url, {'attr.Edition': '1st', 'attr.holo': 'TRUE'}), ["Charizard"])
+            self.assertEqual(self._names(url, {'attr.Holo': 'true'}), ["Blastoise", "Charizard"])
+            self.assertEqual(self._names(url, {'attr.Tags': 'shadowless'}), ["Charizard"])
+            self.assertEqual(self._names(url, {'attr.Edition': ['1st', 'unlimited']}), ["Blastoise", "Charizard"])
+            self.assertEqual(self._names(url, {'attr.Edition': '2nd'}), [])
+
+    def test_imported_cards_are_indexed(self):
+        from .card_import import import_cards
+        list(import_cards(self.user, [{'card_name': "Mew", 'attributes': {'Promo': 'Yes'}}]))
+        self.assertEqual(self._names(reverse('usercard-list'), {'attr.promo': 'yes'}), ["Mew"])
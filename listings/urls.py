@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import GameViewSet, UserCardViewSet, ListingViewSet
+from .views import GameViewSet, UserCardViewSet, ListingViewSet, CertLookupView
 
 router = DefaultRouter()
 router.register(r'games', GameViewSet, basename='game')
@@ -10,4 +10,5 @@ router.register(r'listings', ListingViewSet, basename='listing')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('cert-lookup/', CertLookupView.as_view(), name='cert-lookup'),
 ]
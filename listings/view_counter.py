@@ -0,0 +1,138 @@
+"""
+Write-behind counter for Listing.views_count, kept in Django's cache.
+
+A page view is one `cache.incr` on a per-listing key of the current time bucket (buckets are
+LISTING_VIEW_FLUSH_INTERVAL seconds wide); the first view of a listing in a bucket also appends its
+id to the bucket's list of ids. At most once per interval, after a request has finished (so never
+inside a response), a worker looks for closed buckets, takes each one's flush lock and writes it
+with one `UPDATE ... SET views_count = views_count + n WHERE id IN (...)` per distinct n. A bucket
+is closed one full interval after it ends, so slow writers still land in time.
+
+The counts live in the cache named by LISTING_VIEW_CACHE rather than in the worker: with a shared
+cache (Redis, Memcached) views survive worker restarts, OOM kills and crashes, and whichever worker
+flushes next writes them. The process-local default (LocMemCache) gives none of that and is only
+meant for development.
+
+A flush claims its bucket (reads the counts and deletes the keys) before the UPDATE, so a worker
+that dies between the two loses those views instead of writing them twice: counts only ever err
+low. A flush whose UPDATE fails puts the counts back into the current bucket.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import request_finished
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'listing-views'
+FLUSH_LOCK_SECONDS = 60 # Also keeps a just-flushed bucket from being picked up again straight away
+LOOKBACK_BUCKETS = 360 # Closed buckets are looked for this far back (an hour at the default interval)
+
+
+class ViewCountBuffer:
+    def __init__(self):
+        self._last_flush = time.monotonic()
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'LISTING_VIEW_CACHE', 'default')]
+
+    def _interval(self):
+        return max(1, int(getattr(settings, 'LISTING_VIEW_FLUSH_INTERVAL', 10)))
+
+    def _bucket(self, now=None):
+        return int((time.time() if now is None else now) // self._interval())
+
+    def _timeout(self):
+        return self._interval() * (LOOKBACK_BUCKETS + 2) # Unflushed counts expire once nobody looks for them
+
+    @staticmethod
+    def _key(bucket, suffix):
+        return f'{KEY_PREFIX}:{bucket}:{suffix}'
+
+    def record(self, listing_id, now=None, hits=1):
+        cache, bucket, timeout = self.cache, self._bucket(now), self._timeout()
+        key = self._key(bucket, listing_id)
+        for _ in range(2):
+            if cache.add(key, hits, timeout): # First view of this listing in the bucket: list its id
+                slot = 1 if cache.add(self._key(bucket, 'n'), 1, timeout) else cache.incr(self._key(bucket, 'n'))
+                cache.set(self._key(bucket, f'id{slot}'), listing_id, timeout)
+                return
+            try:
+                cache.incr(key, hits)
+                return
+            except ValueError: # Flushed or evicted between add() and incr(): start it again
+                continue
+
+    def pending(self, listing_id, now=None):
+        """Views of the listing recorded but not yet written to the database."""
+        current = self._bucket(now)
+        keys = [self._key(bucket, listing_id) for bucket in range(current - LOOKBACK_BUCKETS, current + 1)]
+        return sum(self.cache.get_many(keys).values())
+
+    def flush_due(self):
+        return time.monotonic() - self._last_flush >= self._interval()
+
+    def flush(self, now=None):
+        """Write every closed bucket to the database. Returns the number of views written."""
+        self._last_flush = time.monotonic()
+        current = self._bucket(now)
+        sizes = self.cache.get_many([self._key(bucket, 'n') for bucket in range(current - LOOKBACK_BUCKETS, current - 1)])
+        return sum(self._flush_bucket(int(key.split(':')[1]), size) for key, size in sizes.items())
+
+    def _flush_bucket(self, bucket, size):
+        from .models import Listing # Avoid importing models at module load
+
+        cache = self.cache
+        if not cache.add(self._key(bucket, 'lock'), 1, FLUSH_LOCK_SECONDS):
+            return 0 # Another worker is flushing it
+        slot_keys = [self._key(bucket, f'id{slot}') for slot in range(1, size + 1)]
+        count_keys = [self._key(bucket, listing_id) for listing_id in cache.get_many(slot_keys).values()]
+        pending = Counter({int(key.rsplit(':', 1)[1]): hits for key, hits in cache.get_many(count_keys).items() if hits})
+        cache.delete_many([self._key(bucket, 'n'), *slot_keys, *count_keys]) # Claimed; the lock expires on its own
+
+        # Group listings by increment so a flush is a handful of UPDATEs, not one per listing
+        by_increment = defaultdict(list)
+        for listing_id, hits in pending.items():
+            by_increment[hits].append(listing_id)
+        try:
+            with transaction.atomic():
+                for hits, listing_ids in by_increment.items():
+                    Listing.objects.filter(pk__in=listing_ids).update(views_count=F('views_count') + hits)
+        except DatabaseError:
+            logger.exception("Flushing %d buffered listing views failed; will retry", sum(pending.values()))
+            for listing_id, hits in pending.items(): # Nothing was written: put them back
+                self.record(listing_id, hits=hits)
+            cache.delete(self._key(bucket, 'lock')) # Which may be this same bucket
+            return 0
+        return sum(pending.values())
+
+
+view_counts = ViewCountBuffer()
+
+
+def record_view(listing):
+    view_counts.record(listing.pk)
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@receiver(request_finished)
+def flush_view_counts_after_request(sender, **kwargs):
+    # Async responses can finish on the event loop, where sync DB calls are not allowed;
+    # the next request that finishes in a thread picks the flush up instead.
+    if view_counts.flush_due() and not _in_event_loop():
+        view_counts.flush()
@@ -1,14 +1,29 @@
-from rest_framework import viewsets, permissions, status, generics
+import asyncio
+import json
+
+from rest_framework import viewsets, permissions, serializers, status, generics
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend # For filtering
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError as DjangoValidationError
+from django.db.models import F, FilteredRelation, Q
 
 
 from .models import Game, Card, Listing, Bid
-from .serializers import GameSerializer, CardSerializer, ListingSerializer, BidSerializer
+from .serializers import GameSerializer, CardSerializer, CardBulkSerializer, CardBulkChangesSerializer, ListingSerializer, BidSerializer
 from .permissions import IsOwnerOrReadOnly, IsBidderOrListingOwner
+from .search import ListingSearchFilter, search_listings
+from .filters import AttributeFilterBackend, CardFilter, ListingFilter
+from .identity import normalize_cert
+from .pagination import KeysetPagination, KeysetPaginator, InvalidCursor, estimate_count
+from .view_counter import record_view
+from .services import place_bid
+from .live import get_broker, listing_channel
+from .card_import import ImportFileError, import_cards, read_rows
+from .collection import bulk_delete_cards, bulk_update_cards, save_card
+from .export import CARD_COLUMNS, LISTING_COLUMNS, FORMATS as EXPORT_FORMATS, export_response
 
 class GameViewSet(viewsets.ReadOnlyModelViewSet):
     """API endpoint for viewing Games."""
@@ -21,45 +36,113 @@ class UserCardViewSet(viewsets.ModelViewSet):
     """API endpoint for the authenticated user's cards (their collection)."""
     serializer_class = CardSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['game', 'condition', 'is_graded', 'grader'] # Fields for filtering
+    filter_backends = [DjangoFilterBackend, AttributeFilterBackend, SearchFilter, OrderingFilter]
+    filterset_class = CardFilter # game, condition, is_graded, grader, grade__gte/grade__lte (numeric)
     search_fields = ['card_name', 'set_name', 'attributes'] # Fields for text search
-    ordering_fields = ['card_name', 'year', 'date_added_to_collection'] # Fields for ordering
+    ordering_fields = ['card_name', 'year', 'grade_value', 'date_added_to_collection'] # Fields for ordering
 
     def get_queryset(self):
         return Card.objects.filter(owner=self.request.user).order_by('-date_added_to_collection')
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        self._save(serializer, owner=self.request.user)
+
+    def perform_update(self, serializer):
+        self._save(serializer)
+
+    def _save(self, serializer, **kwargs):
+        current = lambda field: serializer.validated_data.get(field, getattr(serializer.instance, field, None))
+        try:
+            save_card(lambda: serializer.save(**kwargs), current('is_graded'), current('grader'), current('certification_number'), getattr(serializer.instance, 'pk', None))
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, JSONParser])
+    def bulk_import(self, request):
+        """
+        Import many cards: upload a `file` (.csv, .json or .jsonl) or POST a JSON array of cards.
+        ?dry_run=1 only validates. Streams NDJSON: one {"row", "errors"} line per rejected row as
+        the chunks are processed, then {"created", "rejected"}.
+        """
+        if 'file' in request.FILES:
+            try:
+                rows = read_rows(request.FILES['file'])
+            except ImportFileError as e:
+                return Response({'file': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            return Response({'detail': "Upload a file or send a JSON array of cards."}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = request.query_params.get('dry_run') in ('1', 'true')
+
+        def results():
+            try:
+                for kind, *result in import_cards(request.user, rows, dry_run=dry_run):
+                    if kind == 'error':
+                        yield json.dumps({'row': result[0], 'errors': result[1]}) + '\n'
+                    else:
+                        yield json.dumps({'created': result[0], 'rejected': result[1], 'dry_run': dry_run}) + '\n'
+            except ImportFileError as e: # e.g. a broken JSON array only noticed while reading
+                yield json.dumps({'detail': str(e)}) + '\n'
+
+        return StreamingHttpResponse(results(), content_type='application/x-ndjson')
+
+    @action(detail=False, methods=['patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        """
+        PATCH {"ids": [...], "changes": {"condition": "NM", ...}} applies the same changes to every card;
+        DELETE {"ids": [...]} deletes them, or none if any is in an active listing. All or nothing.
+        """
+        ids = CardBulkSerializer(data=request.data)
+        ids.is_valid(raise_exception=True)
+        card_ids = set(ids.validated_data['ids'])
+        try:
+            if request.method == 'DELETE':
+                return Response({'deleted': bulk_delete_cards(request.user, card_ids)})
+            changes = CardBulkChangesSerializer(data=request.data.get('changes'), partial=True)
+            if not changes.is_valid():
+                return Response({'changes': changes.errors}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({'updated': bulk_update_cards(request.user, card_ids, changes.validated_data)})
+        except DjangoValidationError as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Download the whole collection (after the usual filters) as ?file_format=csv (default) or jsonl, streamed."""
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({'file_format': [f"Choose one of: {', '.join(EXPORT_FORMATS)}."]}, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(self.filter_queryset(self.get_queryset()), CARD_COLUMNS, file_format, 'collection')
+
+def _with_grade_value(listings):
+    """Listings with their card's grade_value, which ListingViewSet allows ?ordering= by."""
+    return listings.annotate(grade_value=F('card_for_listing__grade_value'))
+
 
 class ListingViewSet(viewsets.ModelViewSet):
     """
     API endpoint for Listings.
-    Allows filtering by game (e.g., ?game__slug=pokemon-tcg), listing_type, status.
+    Allows filtering by game (e.g., ?game__slug=pokemon-tcg), listing_type, status, card attributes (?attr.Edition=1st).
     Allows searching by card_name, set_name in the related card.
     Allows ordering.
     """
-    queryset = Listing.objects.filter(status='ACTIVE').select_related('card_for_listing__game', 'lister').order_by('-date_created')
+    queryset = _with_grade_value(Listing.objects.filter(status='ACTIVE').select_related('card_for_listing__game', 'lister')).order_by('-date_created')
     serializer_class = ListingSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    # To filter on related model fields: 'card_for_listing__game__slug', 'card_for_listing__condition'
-    filterset_fields = {
-        'listing_type': ['exact'],
-        'status': ['exact'],
-        'card_for_listing__game__slug': ['exact'], # e.g. ?card_for_listing__game__slug=pokemon-tcg
-        'seller_location_country': ['exact'],
-        'seller_location_city': ['iexact'], # case-insensitive exact match
-        'allows_local_pickup': ['exact'],
-        'price': ['gte', 'lte'], # greater/less than or equal to
-    }
+    filter_backends = [DjangoFilterBackend, AttributeFilterBackend, ListingSearchFilter, OrderingFilter]
+    # Filters on related card fields too: ?card_for_listing__game__slug=, ?grader=PSA&grade__gte=9
+    filterset_class = ListingFilter
+    attribute_card_field = 'card_for_listing' # ?attr.Edition=1st (AttributeFilterBackend)
+    # ?search= is answered by the full-text index (listings/search.py), which covers these fields
+    # plus the game name. Kept here so the browsable API still renders the search box.
     search_fields = [
         'card_for_listing__card_name',
         'card_for_listing__set_name',
         'listing_description',
-        'card_for_listing__attributes' # Search within JSON attributes
+        'card_for_listing__attributes'
     ]
-    ordering_fields = ['price', 'date_created', 'auction_end_datetime', 'views_count']
+    ordering_fields = ['price', 'date_created', 'auction_end_datetime', 'views_count', 'grade_value']
+    pagination_class = KeysetPagination # ?cursor= paging on (ordering field, id); ?count=approx|exact for totals
 
 
     def get_serializer_context(self):
@@ -73,6 +156,18 @@ class ListingViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("You can only list cards you own.")
         serializer.save(lister=self.request.user)
 
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def export(self, request):
+        """
+        The user's own listing history in every status (filters apply, e.g. ?status=SOLD),
+        as ?file_format=csv (default) or jsonl, streamed.
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({'file_format': [f"Choose one of: {', '.join(EXPORT_FORMATS)}."]}, status=status.HTTP_400_BAD_REQUEST)
+        listings = _with_grade_value(Listing.objects.filter(lister=request.user)).order_by('-date_created', '-id')
+        return export_response(self.filter_queryset(listings), LISTING_COLUMNS, file_format, 'listings')
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def place_bid(self, request, pk=None):
         listing = self.get_object()
@@ -83,18 +178,19 @@ class ListingViewSet(viewsets.ModelViewSet):
              serializer.initial_data['listing'] = listing.pk
 
         if serializer.is_valid():
-            # Additional check: Ensure listing is an auction and active
-            if listing.listing_type != 'AUCTION' or listing.status != 'ACTIVE':
-                return Response({'error': 'Bids can only be placed on active auctions.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            bid = serializer.save(bidder=request.user, listing=listing)
-
-            # Update listing's current_highest_bid and high_bidder
-            listing.current_highest_bid = bid.amount
-            listing.current_high_bidder = request.user
-            listing.save()
-
-            return Response(BidSerializer(bid).data, status=status.HTTP_201_CREATED)
+            # The serializer check ran against a possibly stale listing; place_bid re-checks atomically
+            try:
+                bid = place_bid(
+                    listing, request.user,
+                    amount=serializer.validated_data.get('amount'),
+                    max_amount=serializer.validated_data.get('max_amount'),
+                )
+            except DjangoValidationError as e:
+                return Response({'non_field_errors': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+
+            data = BidSerializer(bid).data
+            data['is_leading'] = bid.is_leading # False if an existing proxy maximum outbid it immediately
+            return Response(data, status=status.HTTP_201_CREATED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -117,24 +213,57 @@ class ListingViewSet(viewsets.ModelViewSet):
         serializer = BidSerializer(queryset, many=True, context={'request': request})
         return Response(serializer.data)
 
-    # Increment view count - could be done more robustly to avoid race conditions / bot views
+    # Views are counted in the cache and flushed in batches (see view_counter.py), so no write here
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        instance.views_count += 1
-        instance.save(update_fields=['views_count']) # Only update this field
-        return super().retrieve(request, *args, **kwargs)
+        record_view(instance)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
 
 
-from django.views.generic import CreateView, ListView, DetailView, UpdateView, DeleteView
+class CertLookupView(generics.GenericAPIView):
+    """
+    GET /api/cert-lookup/?cert=<slab certification number>[&grader=PSA]: the graded card(s) registered
+    with that cert and their active listings, from one query on the unique cert index. Only public
+    card details are returned (no owner, price paid or notes).
+    """
+    permission_classes = [permissions.AllowAny]
+    card_fields = ['id', 'game__name', 'card_name', 'set_name', 'year', 'card_identifier_in_set', 'condition',
+                   'grader', 'grade', 'grade_value', 'grade_label', 'grade_qualifier', 'certification_number']
+    listing_fields = ['id', 'listing_type', 'price', 'current_highest_bid', 'auction_end_datetime', 'lister__username']
+
+    def get(self, request):
+        cert_key = normalize_cert(request.query_params.get('cert'))
+        if cert_key is None:
+            return Response({'cert': ["Give a certification number."]}, status=status.HTTP_400_BAD_REQUEST)
+        cards = Card.objects.filter(cert_key=cert_key).annotate(
+            active=FilteredRelation('listed_as', condition=Q(listed_as__status='ACTIVE')),
+        )
+        if request.query_params.get('grader'):
+            cards = cards.filter(grader=request.query_params['grader'].upper())
+        rows = cards.order_by('grader', 'pk').values(*self.card_fields, *(f'active__{field}' for field in self.listing_fields))
+
+        results = {}
+        for row in rows: # One row per (card, active listing); LEFT JOIN, so unlisted cards come back too
+            card_id = row['id']
+            if card_id not in results:
+                card = {field.replace('__name', '_name'): row[field] for field in self.card_fields}
+                results[card_id] = {'card': card, 'listings': []}
+            if row['active__id'] is not None:
+                listing = {field.replace('__username', '_username'): row[f'active__{field}'] for field in self.listing_fields}
+                results[card_id]['listings'].append(listing)
+        return Response({'results': list(results.values())})
+
+
+from django.views.generic import CreateView, ListView, DetailView, UpdateView, DeleteView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy, reverse
 from django.shortcuts import redirect, get_object_or_404
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, Http404, StreamingHttpResponse
 from django.contrib import messages
 from .forms import ListingCreateEditForm, BidForm
-from .forms import UserCardForm
+from .forms import UserCardForm, CardImportForm
 from .models import Listing # Already imported Game, Card, Bid
-from django.db.models import Q # For search
 from django.utils import timezone # For comparing dates in BidForm and ListingDetailView
 
 class CreateListingView(LoginRequiredMixin, CreateView):
@@ -217,16 +346,26 @@ class ListingsView(ListView):
         # Add search query
         search_query = self.request.GET.get('q')
         if search_query:
-            queryset = queryset.filter(
-                Q(card_for_listing__card_name__icontains=search_query) |
-                Q(card_for_listing__set_name__icontains=search_query) |
-                Q(listing_description__icontains=search_query) |
-                Q(card_for_listing__game__name__icontains=search_query)
-            )
+            queryset = search_listings(queryset, search_query) # Ranked full-text match
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        # Keyset pages (?cursor=) instead of ?page=N OFFSETs; no COUNT(*) unless ?count= asks for one.
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        return (paginator, page, page.object_list, page.has_other_pages())
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        count_mode = self.request.GET.get('count')
+        if count_mode == 'exact':
+            context['total_count'], context['total_is_estimate'] = self.object_list.count(), False
+        elif count_mode == 'approx':
+            total, exact = estimate_count(self.object_list)
+            context['total_count'], context['total_is_estimate'] = total, not exact
         context['games'] = Game.objects.all().order_by('name') # For filter dropdown
         context['current_game_filter'] = self.request.GET.get('game', '')
         context['search_query'] = self.request.GET.get('q', '')
@@ -240,15 +379,13 @@ class ListingDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        listing = self.get_object()
+        listing = self.object # Already fetched by DetailView.get()
 
-        # Increment view count (simple version)
-        listing.views_count += 1
-        listing.save(update_fields=['views_count'])
+        record_view(listing) # Buffered, flushed in batches by view_counter.py
 
         if listing.listing_type == 'AUCTION' and listing.status == 'ACTIVE':
             context['bid_form'] = BidForm(listing=listing, user=self.request.user if self.request.user.is_authenticated else None)
-            context['bids'] = listing.bids.all().order_by('-timestamp')[:10] # Show recent bids
+            context['bids'] = listing.bids.select_related('bidder').order_by('-timestamp', '-id')[:10] # Show recent bids
             context['timezone_now'] = timezone.now() # For template comparison
         return context
 
@@ -264,17 +401,20 @@ class ListingDetailView(DetailView):
 
         form = BidForm(request.POST, listing=self.object, user=request.user)
         if form.is_valid():
-            bid = form.save(commit=False)
-            bid.bidder = request.user
-            bid.listing = self.object
-            bid.save()
-
-            # Update listing's current_highest_bid and high_bidder
-            self.object.current_highest_bid = bid.amount
-            self.object.current_high_bidder = request.user
-            self.object.save()
-
-            messages.success(request, f"Bid of ${bid.amount} placed successfully!")
+            try:
+                bid = place_bid(
+                    self.object, request.user,
+                    amount=form.cleaned_data.get('amount'), max_amount=form.cleaned_data.get('max_amount'),
+                )
+            except DjangoValidationError as e:
+                for error in e.messages:
+                    messages.error(request, f"Amount: {error}")
+                return redirect(reverse('listings:listing-detail', kwargs={'pk': self.object.pk}))
+
+            if bid.is_leading:
+                messages.success(request, f"Bid of ${bid.amount} placed successfully!")
+            else:
+                messages.warning(request, f"Bid of ${bid.amount} placed, but another bidder's maximum bid is higher.")
         else:
             # Pass errors to template or display via messages framework
             for field, errors in form.errors.items():
@@ -305,15 +445,30 @@ class UserCardDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         card = self.get_object()
         return self.request.user == card.owner
 
-class UserCardCreateView(LoginRequiredMixin, CreateView):
+class CardSaveMixin:
+    """form_valid() for the card create / update views: a slab registered meanwhile is shown on the form."""
+    success_message = ''
+
+    def form_valid(self, form):
+        card, save = form.instance, super().form_valid
+        try:
+            response = save_card(lambda: save(form), card.is_graded, card.grader, card.certification_number, card.pk)
+        except DjangoValidationError as e:
+            form.add_error(None, e) # Carries its field, so this lands on certification_number
+            return self.form_invalid(form)
+        messages.success(self.request, self.success_message.format(card=card))
+        return response
+
+
+class UserCardCreateView(LoginRequiredMixin, CardSaveMixin, CreateView):
     model = Card
     form_class = UserCardForm
     template_name = 'listings/my_collection/my_card_form.html' # Will create
+    success_message = "Card '{card.card_name}' added to your collection!"
     # success_url = reverse_lazy('listings:my-card-list') # Define this URL name later
 
     def form_valid(self, form):
         form.instance.owner = self.request.user
-        messages.success(self.request, f"Card '{form.instance.card_name}' added to your collection!")
         return super().form_valid(form)
 
     def get_success_url(self):
@@ -321,20 +476,46 @@ class UserCardCreateView(LoginRequiredMixin, CreateView):
         return reverse('listings:my-card-detail', kwargs={'pk': self.object.pk})
 
 
-class UserCardUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class UserCardImportView(LoginRequiredMixin, FormView):
+    form_class = CardImportForm
+    template_name = 'listings/my_collection/my_card_import.html'
+    max_errors_shown = 100
+
+    def form_valid(self, form):
+        errors, created, rejected = [], 0, 0
+        try:
+            for kind, *result in import_cards(self.request.user, read_rows(form.cleaned_data['file']), dry_run=form.cleaned_data['dry_run']):
+                if kind == 'error':
+                    if len(errors) < self.max_errors_shown:
+                        errors.append(result)
+                else:
+                    created, rejected = result
+        except ImportFileError as e:
+            form.add_error('file', str(e))
+            return self.form_invalid(form)
+
+        if form.cleaned_data['dry_run']:
+            messages.info(self.request, f"Dry run: {created} cards would be imported, {rejected} rows have errors.")
+        elif created:
+            messages.success(self.request, f"Imported {created} cards into your collection.")
+        if rejected:
+            if not form.cleaned_data['dry_run']:
+                messages.warning(self.request, f"{rejected} rows were skipped because of errors.")
+            return self.render_to_response(self.get_context_data(form=form, import_errors=errors, rejected=rejected))
+        return redirect('listings:my-card-list')
+
+
+class UserCardUpdateView(LoginRequiredMixin, UserPassesTestMixin, CardSaveMixin, UpdateView):
     model = Card
     form_class = UserCardForm
     template_name = 'listings/my_collection/my_card_form.html' # Reuse form template
+    success_message = "Card '{card.card_name}' updated successfully!"
     # success_url = reverse_lazy('listings:my-card-list')
 
     def test_func(self):
         card = self.get_object()
         return self.request.user == card.owner
 
-    def form_valid(self, form):
-        messages.success(self.request, f"Card '{form.instance.card_name}' updated successfully!")
-        return super().form_valid(form)
-
     def get_success_url(self):
         return reverse('listings:my-card-detail', kwargs={'pk': self.object.pk})
 
@@ -372,3 +553,46 @@ class UserCardDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     #     self.object.delete()
     #     messages.success(request, f"Card '{self.object.card_name}' deleted.")
     #     return redirect(success_url)
+
+
+# --- Live auction updates (Server-Sent Events, served by the ASGI application) ---
+
+SSE_HEARTBEAT_SECONDS = 15
+
+async def listing_events(request, pk):
+    """
+    text/event-stream of a listing's live events: `bid` (new visible price and high bidder) and
+    `closed`. Fan-out comes from listings.live; the stream ends after the listing closes.
+    """
+    listing = await Listing.objects.filter(pk=pk).only('status', 'current_highest_bid').afirst()
+    if listing is None:
+        raise Http404("No listing found.")
+
+    async def stream():
+        broker = get_broker()
+        subscription = broker.subscribe(listing_channel(pk))
+        try:
+            # Snapshot first, so a watcher that connects between bids starts from the current price
+            yield sse_message('snapshot', {'listing': pk, 'status': listing.status, 'current_highest_bid': str(listing.current_highest_bid) if listing.current_highest_bid is not None else None})
+            if listing.status != 'ACTIVE':
+                return
+            while True:
+                try:
+                    event = await subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n' # Comment line; keeps proxies from closing the idle connection
+                    continue
+                yield sse_message(event['type'], event)
+                if event['type'] == 'closed':
+                    return
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Tell nginx not to buffer the stream
+    return response
+
+
+def sse_message(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
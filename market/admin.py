@@ -0,0 +1,38 @@
+from django.contrib import admin
+from .models import Sale, PriceCandle, MarketPrice, Portfolio, PortfolioSnapshot, SaleImport
+
+@admin.register(Sale)
+class SaleAdmin(admin.ModelAdmin):
+    list_display = ('identity_key', 'grader', 'grade', 'price', 'sold_at', 'source')
+    list_filter = ('source', 'grader')
+    search_fields = ('identity_key',)
+    raw_id_fields = ('listing',)
+    date_hierarchy = 'sold_at'
+
+@admin.register(PriceCandle)
+class PriceCandleAdmin(admin.ModelAdmin):
+    list_display = ('identity_key', 'grader', 'grade', 'resolution', 'bucket_start', 'open', 'high', 'low', 'close', 'volume')
+    list_filter = ('resolution', 'grader')
+    search_fields = ('identity_key',)
+
+@admin.register(MarketPrice)
+class MarketPriceAdmin(admin.ModelAdmin):
+    list_display = ('identity_key', 'grader', 'grade', 'price', 'as_of')
+    search_fields = ('identity_key',)
+
+@admin.register(Portfolio)
+class PortfolioAdmin(admin.ModelAdmin):
+    list_display = ('user', 'card_count', 'priced_count', 'cost_basis', 'market_value', 'updated_at')
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
+
+@admin.register(PortfolioSnapshot)
+class PortfolioSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'card_count', 'market_value')
+    raw_id_fields = ('user',)
+    date_hierarchy = 'date'
+
+@admin.register(SaleImport)
+class SaleImportAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'rows_read', 'sales_imported', 'rows_rejected', 'updated_at')
+    list_filter = ('status',)
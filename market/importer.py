@@ -0,0 +1,113 @@
+"""
+Parsing and validation for bulk sales imports (see the import_sales command).
+
+Rows are dicts (CSV header / JSONL keys). A row names its card either with `identity_key` or with
+`card_name` plus optional `game`, `set_name`, `year` and `number`; `grader`/`grade` pick the graded
+series, `price` and `sold_at` are required. Naive timestamps and plain dates are taken as UTC.
+"""
+import csv
+import gzip
+import json
+from datetime import datetime, time, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.utils.dateparse import parse_date, parse_datetime
+
+from listings.identity import identity_key, numeric_grade
+from .models import Sale
+
+MAX_PRICE = Decimal('9999999999.99') # Sale.price is max_digits=12, decimal_places=2
+_CENT = Decimal('0.01')
+
+
+def open_rows(path, fmt=None):
+    """Stream rows from a CSV or JSONL file (optionally .gz). Never loads the file into memory."""
+    opener = gzip.open if path.endswith('.gz') else open
+    fmt = fmt or ('jsonl' if path.removesuffix('.gz').endswith(('.jsonl', '.json')) else 'csv')
+    handle = opener(path, 'rt', encoding='utf-8', newline='')
+    try:
+        if fmt == 'csv':
+            yield from csv.DictReader(handle)
+        else:
+            for line in handle:
+                line = line.strip()
+                # A bad line is still a row, so checkpoints count input lines consistently
+                yield _json_row(line) if line else None
+    finally:
+        handle.close()
+
+
+def _json_row(line):
+    try:
+        row = json.loads(line)
+    except ValueError:
+        return {'__error__': "not valid JSON"}
+    return row if isinstance(row, dict) else {'__error__': "not a JSON object"}
+
+
+def _sold_at(value):
+    value = str(value or '').strip()
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"sold_at {value!r} is not an ISO 8601 date/time")
+        moment = datetime.combine(day, time())
+    return moment if moment.tzinfo else moment.replace(tzinfo=dt_timezone.utc)
+
+
+def _price(value):
+    try:
+        price = Decimal(str(value).strip().lstrip('$').replace(',', '')).quantize(_CENT)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"price {value!r} is not a number")
+    if not price.is_finite(): # NaN / Infinity parse and quantize fine but can't be compared
+        raise ValueError(f"price {value!r} is not a number")
+    if not 0 <= price <= MAX_PRICE:
+        raise ValueError(f"price {value} is out of range")
+    return price
+
+
+def _text(row, field):
+    """A cell as stripped text; JSON rows may carry numbers (or anything else) where text is expected."""
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def _series(row):
+    key = _text(row, 'identity_key')
+    if not key:
+        if not _text(row, 'card_name'):
+            raise ValueError("needs identity_key or card_name")
+        year = str(row.get('year') or '').strip()
+        if year and not year.isdigit():
+            raise ValueError(f"year {year!r} is not a number")
+        key = identity_key(row.get('game'), row.get('card_name'), row.get('set_name'), int(year) if year else None, row.get('number'))
+    if len(key) > Sale._meta.get_field('identity_key').max_length:
+        raise ValueError("card description is too long")
+    grader = _text(row, 'grader').upper()
+    if len(grader) > 10:
+        raise ValueError(f"grader {grader!r} is too long")
+    grade = numeric_grade(str(row.get('grade') or '')) if grader else None
+    if grade is not None and not 0 <= grade <= 100:
+        raise ValueError(f"grade {grade} is out of range")
+    return key, grader, grade
+
+
+def build_sales(rows, first_line=1):
+    """Validate a chunk of rows. Returns (unsaved Sale objects, [(line number, error)])."""
+    sales, errors = [], []
+    for line, row in enumerate(rows, start=first_line):
+        if row is None: # Blank JSONL line
+            continue
+        try:
+            if '__error__' in row:
+                raise ValueError(row['__error__'])
+            key, grader, grade = _series(row)
+            sales.append(Sale(
+                identity_key=key, grader=grader, grade=grade, price=_price(row.get('price')),
+                sold_at=_sold_at(row.get('sold_at')), source='IMPORT',
+            ))
+        except ValueError as error:
+            errors.append((line, str(error)))
+    return sales, errors
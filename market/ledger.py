@@ -0,0 +1,180 @@
+"""
+Sales ledger and OHLC candle maintenance.
+
+record_sales() appends a batch of Sale rows and folds them into PriceCandle rows at every
+resolution in one pass: the batch is aggregated per (series, resolution, bucket) in Python, the
+affected candles are read with one query, then merged with bulk_update/bulk_create. A graph of a
+year of daily prices is therefore ~365 candle rows however many sales there were. Each candle also
+carries a quantile sketch of its prices (market.sketch), so medians/percentiles over any window
+are a merge of candle sketches (market.stats).
+
+Buckets are UTC: hours and days are truncations, weeks start on Monday.
+"""
+from collections import namedtuple
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from listings.models import Listing
+from .models import Sale, PriceCandle, MarketPrice
+from .portfolio import apply_price_changes
+from .sketch import QuantileSketch
+from .utils import chunked
+
+RESOLUTIONS = [code for code, _ in PriceCandle.RESOLUTION_CHOICES]
+# Hourly candles are only kept for recent sales (graphs show at most a week of hours); older sales,
+# e.g. bulk-imported history, go into daily/weekly candles only instead of roughly one row per sale.
+HOURLY_RETENTION = timedelta(days=30)
+
+CandleKey = namedtuple('CandleKey', ['identity_key', 'grader', 'grade', 'resolution', 'bucket_start'])
+
+
+def bucket_start(moment, resolution):
+    moment = moment.astimezone(dt_timezone.utc)
+    if resolution == 'HOUR':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'DAY':
+        return day
+    if resolution == 'WEEK':
+        return day - timedelta(days=day.weekday())
+    raise ValueError(f"Unknown candle resolution {resolution!r}")
+
+
+def _aggregate(sales):
+    """Fold sales into unsaved PriceCandle objects, one per CandleKey."""
+    candles, sketches = {}, {}
+    hourly_since = timezone.now() - HOURLY_RETENTION
+    for sale in sorted(sales, key=lambda s: s.sold_at):
+        for resolution in RESOLUTIONS:
+            if resolution == 'HOUR' and sale.sold_at < hourly_since:
+                continue
+            key = CandleKey(sale.identity_key, sale.grader, sale.grade, resolution, bucket_start(sale.sold_at, resolution))
+            candle = candles.get(key)
+            if candle is None:
+                candles[key] = PriceCandle(
+                    **key._asdict(), open=sale.price, high=sale.price, low=sale.price, close=sale.price,
+                    volume=1, turnover=sale.price, first_sold_at=sale.sold_at, last_sold_at=sale.sold_at,
+                )
+                sketches[key] = QuantileSketch().add(sale.price)
+                continue
+            candle.high = max(candle.high, sale.price)
+            candle.low = min(candle.low, sale.price)
+            candle.close, candle.last_sold_at = sale.price, sale.sold_at # Sales are in time order
+            candle.volume += 1
+            candle.turnover += sale.price
+            sketches[key].add(sale.price)
+    for key, sketch in sketches.items():
+        candles[key].sketch = sketch.to_json()
+    return candles
+
+
+def _candle_key(candle):
+    return CandleKey(candle.identity_key, candle.grader, candle.grade, candle.resolution, candle.bucket_start)
+
+
+def _merge(existing, batch):
+    if batch.first_sold_at < existing.first_sold_at:
+        existing.open, existing.first_sold_at = batch.open, batch.first_sold_at
+    if batch.last_sold_at >= existing.last_sold_at:
+        existing.close, existing.last_sold_at = batch.close, batch.last_sold_at
+    existing.high = max(existing.high, batch.high)
+    existing.low = min(existing.low, batch.low)
+    existing.volume += batch.volume
+    existing.turnover += batch.turnover
+    existing.sketch = QuantileSketch.from_json(existing.sketch).merge(QuantileSketch.from_json(batch.sketch)).to_json()
+
+
+def _apply_to_candles(sales):
+    batch = _aggregate(sales)
+    to_update = []
+    # A bucket range rather than IN (...) keeps big imports under the parameter limit
+    first_bucket, last_bucket = min(key.bucket_start for key in batch), max(key.bucket_start for key in batch)
+    for identities in chunked({key.identity_key for key in batch}):
+        existing = PriceCandle.objects.filter(
+            identity_key__in=identities, bucket_start__range=(first_bucket, last_bucket),
+        ).select_for_update()
+        for candle in existing:
+            incoming = batch.pop(_candle_key(candle), None)
+            if incoming is not None:
+                _merge(candle, incoming)
+                to_update.append(candle)
+    PriceCandle.objects.bulk_update(
+        to_update, ['open', 'high', 'low', 'close', 'volume', 'turnover', 'first_sold_at', 'last_sold_at', 'sketch'], batch_size=500,
+    )
+    PriceCandle.objects.bulk_create(batch.values(), batch_size=500)
+
+
+def _update_market_prices(sales):
+    """Move each series' MarketPrice to its latest sale and re-value the portfolios holding it."""
+    latest = {}
+    for sale in sales:
+        series = (sale.identity_key, sale.grader, sale.grade)
+        if series not in latest or sale.sold_at >= latest[series].sold_at:
+            latest[series] = sale
+    current = {}
+    for identities in chunked({series[0] for series in latest}):
+        for row in MarketPrice.objects.filter(identity_key__in=identities).select_for_update():
+            current[(row.identity_key, row.grader, row.grade)] = row
+    changes, to_update, to_create = {}, [], []
+    for series, sale in latest.items():
+        row = current.get(series)
+        if row is None:
+            to_create.append(MarketPrice(identity_key=series[0], grader=series[1], grade=series[2], price=sale.price, as_of=sale.sold_at))
+            changes[series] = (None, sale.price)
+        elif sale.sold_at >= row.as_of: # Late (older) sales never override a newer price
+            if row.price != sale.price:
+                changes[series] = (row.price, sale.price)
+            row.price, row.as_of = sale.price, sale.sold_at
+            to_update.append(row)
+    MarketPrice.objects.bulk_update(to_update, ['price', 'as_of'], batch_size=500)
+    MarketPrice.objects.bulk_create(to_create, batch_size=500)
+    apply_price_changes(changes)
+
+
+def record_sales(sales):
+    """Append unsaved Sale objects to the ledger and fold them into the candles. Returns the saved sales."""
+    sales = list(sales)
+    if not sales:
+        return []
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                saved = Sale.objects.bulk_create(sales, batch_size=500)
+                _apply_to_candles(saved)
+                _update_market_prices(saved)
+            return saved
+        except IntegrityError:
+            # Another writer created one of our new candles first; re-read and merge into it
+            if attempt:
+                raise
+            for sale in sales:
+                sale.pk = None
+                sale._state.adding = True
+
+
+def sale_price(listing):
+    if listing.listing_type == 'AUCTION':
+        return listing.current_highest_bid
+    return listing.price
+
+
+def record_listing_sales(listing_ids):
+    """Ledger the sale of each listing (skipping ones already recorded or without a price)."""
+    listings = (
+        Listing.objects.filter(pk__in=listing_ids, status__in=Listing.SOLD_STATUSES, sale_record__isnull=True)
+        .select_related('card_for_listing')
+    )
+    now = timezone.now()
+    sales = []
+    for listing in listings:
+        price = sale_price(listing)
+        if price is None:
+            continue
+        identity, grader, grade = listing.card_for_listing.market_series
+        sales.append(Sale(
+            identity_key=identity, grader=grader, grade=grade, price=price, listing=listing,
+            sold_at=min(listing.auction_end_datetime or now, now) if listing.listing_type == 'AUCTION' else now,
+        ))
+    return record_sales(sales)
@@ -0,0 +1,78 @@
+"""
+Bulk-load historical sales from CSV or JSONL (optionally gzipped) into the sales ledger.
+
+The file is streamed and handled in chunks: each chunk is validated as a batch, written with
+record_sales() (bulk INSERT plus candle, market price and portfolio updates) and committed
+together with the import's checkpoint. If the run is interrupted, running the same command
+again skips what was already committed and carries on from the next chunk.
+
+    python manage.py import_sales sales-2019.csv.gz --chunk-size 5000
+    python manage.py import_sales sales.jsonl --name ebay-export --restart
+"""
+import itertools
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from market.importer import build_sales, open_rows
+from market.ledger import record_sales
+from market.models import SaleImport
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = "Stream historical sales from CSV/JSONL into the ledger in resumable, chunked transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--name', help="Checkpoint name; defaults to the file name.")
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint and start from the top.")
+        parser.add_argument('--max-errors', type=int, default=None, help="Abort once this many rows were rejected.")
+
+    def handle(self, *args, **options):
+        path, chunk_size = options['path'], options['chunk_size']
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        checkpoint, _ = SaleImport.objects.get_or_create(name=options['name'] or os.path.basename(path))
+        if options['restart']:
+            SaleImport.objects.filter(pk=checkpoint.pk).update(rows_read=0, sales_imported=0, rows_rejected=0, status='RUNNING')
+            checkpoint.refresh_from_db()
+        elif checkpoint.status == 'COMPLETED':
+            self.stdout.write(f"{checkpoint.name} was already imported ({checkpoint.sales_imported} sales); use --restart to load it again.")
+            return
+        elif checkpoint.rows_read:
+            self.stdout.write(f"Resuming {checkpoint.name} after {checkpoint.rows_read} rows.")
+
+        rows = itertools.islice(open_rows(path, options['format']), checkpoint.rows_read, None)
+        started, imported_now, reported = time.perf_counter(), 0, 0
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            sales, errors = build_sales(chunk, first_line=checkpoint.rows_read + 1)
+            with transaction.atomic():
+                record_sales(sales)
+                checkpoint.rows_read += len(chunk)
+                checkpoint.sales_imported += len(sales)
+                checkpoint.rows_rejected += len(errors)
+                checkpoint.save(update_fields=['rows_read', 'sales_imported', 'rows_rejected', 'updated_at'])
+            imported_now += len(sales)
+            for line, error in errors[:max(MAX_REPORTED_ERRORS - reported, 0)]:
+                self.stderr.write(f"  row {line}: {error}")
+            reported += len(errors)
+            elapsed = time.perf_counter() - started
+            if options['verbosity']:
+                self.stdout.write(f"{checkpoint.rows_read} rows read, {checkpoint.sales_imported} imported, {checkpoint.rows_rejected} rejected ({imported_now / elapsed:,.0f} sales/s)")
+            if options['max_errors'] is not None and checkpoint.rows_rejected > options['max_errors']:
+                raise CommandError(f"Too many rejected rows ({checkpoint.rows_rejected}); fix the input and rerun to resume.")
+
+        checkpoint.status = 'COMPLETED'
+        checkpoint.save(update_fields=['status', 'updated_at'])
+        if options['verbosity']:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {imported_now} sales in {elapsed:.1f}s ({imported_now / elapsed if elapsed else 0:,.0f} sales/s); "
+                f"{checkpoint.rows_rejected} rows rejected in total."
+            ))
@@ -0,0 +1,25 @@
+"""
+Value every portfolio from scratch. Portfolios are kept current incrementally by signals, so this
+is only needed after writes that bypass them (bulk imports, backfill_card_identity, raw SQL).
+
+    python manage.py rebuild_portfolios
+    python manage.py rebuild_portfolios --user 12 --user 40
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from market.portfolio import rebuild_portfolios
+
+
+class Command(BaseCommand):
+    help = "Recompute Portfolio totals from the cards and current market prices."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help="Only this user id (repeatable).")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_portfolios(options['users'], chunk_size=options['chunk_size'])
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} portfolios."))
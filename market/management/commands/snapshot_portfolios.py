@@ -0,0 +1,26 @@
+"""
+Record today's value of every portfolio for the history graphs. Run once a day from cron; running
+it again the same day overwrites that day's snapshot.
+
+    python manage.py snapshot_portfolios
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from market.portfolio import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Store a daily PortfolioSnapshot for every portfolio."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Snapshot date (YYYY-MM-DD), defaults to today.")
+
+    def handle(self, *args, **options):
+        date = parse_date(options['date']) if options['date'] else timezone.localdate()
+        if date is None:
+            raise CommandError("--date must look like YYYY-MM-DD.")
+        written = take_snapshots(date)
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(f"Stored {written} portfolio snapshots for {date}."))
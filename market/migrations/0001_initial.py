@@ -0,0 +1,159 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("listings", "0006_listing_expiry_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceCandle",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("identity_key", models.CharField(max_length=640)),
+                ("grader", models.CharField(blank=True, max_length=10)),
+                (
+                    "grade",
+                    models.DecimalField(
+                        blank=True, decimal_places=1, max_digits=4, null=True
+                    ),
+                ),
+                (
+                    "resolution",
+                    models.CharField(
+                        choices=[
+                            ("HOUR", "Hourly"),
+                            ("DAY", "Daily"),
+                            ("WEEK", "Weekly"),
+                        ],
+                        max_length=4,
+                    ),
+                ),
+                ("bucket_start", models.DateTimeField()),
+                ("open", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("high", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("low", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("close", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "volume",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Number of sales in the bucket."
+                    ),
+                ),
+                (
+                    "turnover",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Sum of sale prices in the bucket.",
+                        max_digits=16,
+                    ),
+                ),
+                ("first_sold_at", models.DateTimeField()),
+                ("last_sold_at", models.DateTimeField()),
+            ],
+            options={
+                "ordering": ["bucket_start"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("grade__isnull", False)),
+                        fields=(
+                            "identity_key",
+                            "grader",
+                            "grade",
+                            "resolution",
+                            "bucket_start",
+                        ),
+                        name="unique_graded_price_candle",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("grade__isnull", True)),
+                        fields=("identity_key", "grader", "resolution", "bucket_start"),
+                        name="unique_raw_price_candle",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="Sale",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "identity_key",
+                    models.CharField(
+                        help_text="listings.identity key of the card sold.",
+                        max_length=640,
+                    ),
+                ),
+                (
+                    "grader",
+                    models.CharField(
+                        blank=True,
+                        help_text="Blank for raw (ungraded) cards.",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "grade",
+                    models.DecimalField(
+                        blank=True, decimal_places=1, max_digits=4, null=True
+                    ),
+                ),
+                ("price", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("sold_at", models.DateTimeField()),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[
+                            ("LISTING", "CDEX listing"),
+                            ("IMPORT", "Imported history"),
+                        ],
+                        default="LISTING",
+                        max_length=10,
+                    ),
+                ),
+                ("recorded_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "listing",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="sale_record",
+                        to="listings.listing",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["identity_key", "grader", "grade", "sold_at"],
+                        name="sale_identity_time_idx",
+                    )
+                ],
+            },
+        ),
+    ]
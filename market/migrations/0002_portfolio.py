@@ -0,0 +1,167 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_market_prices(apps, schema_editor):
+    # Sales recorded before market prices existed: the latest sale of each series sets its price
+    Sale = apps.get_model("market", "Sale")
+    MarketPrice = apps.get_model("market", "MarketPrice")
+    latest = {}
+    for sale in Sale.objects.order_by("sold_at", "pk").iterator():
+        latest[(sale.identity_key, sale.grader, sale.grade)] = sale
+    MarketPrice.objects.bulk_create(
+        [
+            MarketPrice(
+                identity_key=key,
+                grader=grader,
+                grade=grade,
+                price=sale.price,
+                as_of=sale.sold_at,
+            )
+            for (key, grader, grade), sale in latest.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("market", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Portfolio",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="portfolio",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("card_count", models.PositiveIntegerField(default=0)),
+                (
+                    "priced_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Cards with a market price."
+                    ),
+                ),
+                (
+                    "cost_basis",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Sum of purchase prices.",
+                        max_digits=14,
+                    ),
+                ),
+                (
+                    "priced_cost_basis",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Purchase prices of cards with a market price.",
+                        max_digits=14,
+                    ),
+                ),
+                (
+                    "market_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="MarketPrice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("identity_key", models.CharField(max_length=640)),
+                ("grader", models.CharField(blank=True, max_length=10)),
+                (
+                    "grade",
+                    models.DecimalField(
+                        blank=True, decimal_places=1, max_digits=4, null=True
+                    ),
+                ),
+                ("price", models.DecimalField(decimal_places=2, max_digits=12)),
+                (
+                    "as_of",
+                    models.DateTimeField(
+                        help_text="When the sale that set this price happened."
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("grade__isnull", False)),
+                        fields=("identity_key", "grader", "grade"),
+                        name="unique_graded_market_price",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("grade__isnull", True)),
+                        fields=("identity_key", "grader"),
+                        name="unique_raw_market_price",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="PortfolioSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("card_count", models.PositiveIntegerField()),
+                ("cost_basis", models.DecimalField(decimal_places=2, max_digits=14)),
+                (
+                    "priced_cost_basis",
+                    models.DecimalField(decimal_places=2, max_digits=14),
+                ),
+                ("market_value", models.DecimalField(decimal_places=2, max_digits=14)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="portfolio_snapshots",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["date"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "date"),
+                        name="unique_portfolio_snapshot_per_day",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(seed_market_prices, migrations.RunPython.noop),
+    ]
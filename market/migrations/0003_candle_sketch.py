@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:23
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+from market.sketch import QuantileSketch
+
+BUCKET_LENGTHS = {
+    "HOUR": timedelta(hours=1),
+    "DAY": timedelta(days=1),
+    "WEEK": timedelta(days=7),
+}
+
+
+def backfill_sketches(apps, schema_editor):
+    # Candles written before sketches existed: rebuild each one's sketch from its sales
+    PriceCandle = apps.get_model("market", "PriceCandle")
+    Sale = apps.get_model("market", "Sale")
+    for candle in PriceCandle.objects.iterator():
+        prices = Sale.objects.filter(
+            identity_key=candle.identity_key,
+            grader=candle.grader,
+            grade=candle.grade,
+            sold_at__gte=candle.bucket_start,
+            sold_at__lt=candle.bucket_start + BUCKET_LENGTHS[candle.resolution],
+        ).values_list("price", flat=True)
+        sketch = QuantileSketch()
+        for price in prices:
+            sketch.add(price)
+        candle.sketch = sketch.to_json()
+        candle.save(update_fields=["sketch"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("market", "0002_portfolio"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pricecandle",
+            name="sketch",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="market.sketch.QuantileSketch of the bucket's prices.",
+            ),
+        ),
+        migrations.RunPython(backfill_sketches, migrations.RunPython.noop),
+    ]
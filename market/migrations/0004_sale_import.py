@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("market", "0003_candle_sketch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SaleImport",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        help_text="Defaults to the input file name.",
+                        max_length=255,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "rows_read",
+                    models.PositiveBigIntegerField(
+                        default=0,
+                        help_text="Input rows consumed, imported or rejected.",
+                    ),
+                ),
+                ("sales_imported", models.PositiveBigIntegerField(default=0)),
+                ("rows_rejected", models.PositiveBigIntegerField(default=0)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("RUNNING", "Running"), ("COMPLETED", "Completed")],
+                        default="RUNNING",
+                        max_length=10,
+                    ),
+                ),
+                ("started_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,225 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models
+
+# Value tracking. Sales go into an append-only ledger (Sale); every sale also folds into
+# pre-aggregated OHLC candles (PriceCandle) so graphs read a handful of rows instead of scanning
+# the ledger. Both are keyed by card identity (listings.identity) plus grader and numeric grade.
+
+class Sale(models.Model):
+    SOURCE_CHOICES = [('LISTING', 'CDEX listing'), ('IMPORT', 'Imported history')]
+
+    identity_key = models.CharField(max_length=640, help_text="listings.identity key of the card sold.")
+    grader = models.CharField(max_length=10, blank=True, help_text="Blank for raw (ungraded) cards.")
+    grade = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    sold_at = models.DateTimeField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default='LISTING')
+    listing = models.OneToOneField('listings.Listing', on_delete=models.SET_NULL, null=True, blank=True, related_name='sale_record')
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['identity_key', 'grader', 'grade', 'sold_at'], name='sale_identity_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.identity_key} {self.grader} {self.grade or ''} sold for {self.price} at {self.sold_at:%Y-%m-%d %H:%M}"
+
+
+class PriceCandle(models.Model):
+    RESOLUTION_CHOICES = [('HOUR', 'Hourly'), ('DAY', 'Daily'), ('WEEK', 'Weekly')]
+
+    identity_key = models.CharField(max_length=640)
+    grader = models.CharField(max_length=10, blank=True)
+    grade = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True)
+    resolution = models.CharField(max_length=4, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+
+    open = models.DecimalField(max_digits=12, decimal_places=2)
+    high = models.DecimalField(max_digits=12, decimal_places=2)
+    low = models.DecimalField(max_digits=12, decimal_places=2)
+    close = models.DecimalField(max_digits=12, decimal_places=2)
+    volume = models.PositiveIntegerField(default=0, help_text="Number of sales in the bucket.")
+    turnover = models.DecimalField(max_digits=16, decimal_places=2, default=0, help_text="Sum of sale prices in the bucket.")
+    # Needed to keep open/close right when older sales arrive late (e.g. imports)
+    first_sold_at = models.DateTimeField()
+    last_sold_at = models.DateTimeField()
+    sketch = models.JSONField(default=dict, blank=True, help_text="market.sketch.QuantileSketch of the bucket's prices.")
+
+    class Meta:
+        ordering = ['bucket_start']
+        # One candle per series and bucket; the unique index doubles as the lookup index for graphs.
+        # NULL grades (raw cards) never compare equal in SQL, so they get their own partial constraint.
+        constraints = [
+            models.UniqueConstraint(fields=['identity_key', 'grader', 'grade', 'resolution', 'bucket_start'], condition=models.Q(grade__isnull=False), name='unique_graded_price_candle'),
+            models.UniqueConstraint(fields=['identity_key', 'grader', 'resolution', 'bucket_start'], condition=models.Q(grade__isnull=True), name='unique_raw_price_candle'),
+        ]
+
+    @property
+    def vwap(self):
+        # Every sale is one card, so volume-weighting reduces to turnover / volume
+        return (self.turnover / self.volume).quantize(Decimal('0.01')) if self.volume else None
+
+    def __str__(self):
+        return f"{self.resolution} candle {self.identity_key} {self.grader} {self.grade or ''} @ {self.bucket_start:%Y-%m-%d %H:%M}"
+
+
+class MarketPrice(models.Model):
+    """Current market price of a series: the most recent sale. Portfolios value cards at this price."""
+    identity_key = models.CharField(max_length=640)
+    grader = models.CharField(max_length=10, blank=True)
+    grade = models.DecimalField(max_digits=4, decimal_places=1, null=True, blank=True)
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    as_of = models.DateTimeField(help_text="When the sale that set this price happened.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['identity_key', 'grader', 'grade'], condition=models.Q(grade__isnull=False), name='unique_graded_market_price'),
+            models.UniqueConstraint(fields=['identity_key', 'grader'], condition=models.Q(grade__isnull=True), name='unique_raw_market_price'),
+        ]
+
+    def __str__(self):
+        return f"{self.identity_key} {self.grader} {self.grade or ''}: {self.price}"
+
+
+class Portfolio(models.Model):
+    """
+    Running totals of a user's collection, adjusted by deltas (market.portfolio) whenever a card
+    or a market price changes, so a dashboard reads one row however many cards there are.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='portfolio')
+    card_count = models.PositiveIntegerField(default=0)
+    priced_count = models.PositiveIntegerField(default=0, help_text="Cards with a market price.")
+    cost_basis = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Sum of purchase prices.")
+    priced_cost_basis = models.DecimalField(max_digits=14, decimal_places=2, default=0, help_text="Purchase prices of cards with a market price.")
+    market_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def unrealized_gain(self):
+        # Only cards that have a market price can have a gain
+        return self.market_value - self.priced_cost_basis
+
+    def __str__(self):
+        return f"Portfolio of {self.user} ({self.card_count} cards, {self.market_value})"
+
+
+class PortfolioSnapshot(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='portfolio_snapshots')
+    date = models.DateField()
+    card_count = models.PositiveIntegerField()
+    cost_basis = models.DecimalField(max_digits=14, decimal_places=2)
+    priced_cost_basis = models.DecimalField(max_digits=14, decimal_places=2)
+    market_value = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_portfolio_snapshot_per_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} on {self.date}: {self.market_value}"
+
+
+class SaleImport(models.Model):
+    """Checkpoint of a bulk sales import (import_sales command), committed with every chunk so a rerun resumes."""
+    STATUS_CHOICES = [('RUNNING', 'Running'), ('COMPLETED', 'Completed')]
+
+    name = models.CharField(max_length=255, unique=True, help_text="Defaults to the input file name.")
+    rows_read = models.PositiveBigIntegerField(default=0, help_text="Input rows consumed, imported or rejected.")
+    sales_imported = models.PositiveBigIntegerField(default=0)
+    rows_rejected = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='RUNNING')
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Import {self.name}: {self.sales_imported} sales ({self.get_status_display()})"
+
+
+# Signals: sales feed the ledger, listing/offer/card changes keep the in-memory order books current
+import weakref
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from listings.signals import listing_sold, listings_closed, cards_imported, cards_updated
+
+_rebuilt_after_delete = weakref.WeakKeyDictionary() # deleting QuerySet -> owners already rebuilt
+
+@receiver(listing_sold)
+def record_sold_listings(sender, listing_ids, **kwargs):
+    from .ledger import record_listing_sales # ledger imports these models
+    record_listing_sales(listing_ids)
+
+@receiver(post_save, sender='listings.Listing')
+@receiver(post_delete, sender='listings.Listing')
+def sync_order_book_listing(sender, instance, raw=False, **kwargs):
+    from .orderbook import sync_listings_on_commit
+    if not raw:
+        sync_listings_on_commit([instance.pk])
+
+@receiver(listings_closed)
+def sync_order_book_closed_listings(sender, listing_ids, **kwargs):
+    from .orderbook import sync_listings_on_commit
+    sync_listings_on_commit(listing_ids)
+
+@receiver(post_save, sender='listings.Card')
+def sync_order_book_card(sender, instance, raw=False, **kwargs):
+    # A card edit can move its listings to another series (e.g. grade corrected)
+    from .orderbook import order_books, sync_listings_on_commit
+    if not raw and order_books.is_tracking:
+        sync_listings_on_commit(instance.listed_as.filter(status='ACTIVE').values_list('pk', flat=True))
+
+@receiver(post_save, sender='messaging.Offer')
+@receiver(post_delete, sender='messaging.Offer')
+def sync_order_book_offer(sender, instance, raw=False, **kwargs):
+    from .orderbook import sync_offer_on_commit
+    if not raw:
+        sync_offer_on_commit(instance.pk, instance.listing_id)
+
+@receiver(post_save, sender='listings.Card')
+def update_portfolio_for_card(sender, instance, created, raw=False, **kwargs):
+    from .portfolio import apply_card_change, rebuild_portfolios
+    if raw:
+        return
+    old_state, new_state = getattr(instance, '_loaded_valuation', None), instance.valuation_state()
+    if new_state is None or (old_state is None and not created):
+        rebuild_portfolios([instance.owner_id]) # Partially loaded card: the difference is unknown
+    else:
+        apply_card_change(None if created else old_state, new_state)
+    instance._loaded_valuation = new_state
+
+@receiver(post_delete, sender='listings.Card')
+def update_portfolio_for_deleted_card(sender, instance, origin=None, **kwargs):
+    from .portfolio import apply_card_change, rebuild_portfolios
+    if isinstance(origin, QuerySet) and origin.model is sender:
+        # A queryset delete (bulk endpoint, admin action): every row is already gone by the time
+        # post_delete is sent, so one rebuild per owner beats a delta per card
+        owners = _rebuilt_after_delete.setdefault(origin, set())
+        if instance.owner_id not in owners:
+            owners.add(instance.owner_id)
+            rebuild_portfolios([instance.owner_id])
+        return
+    old_state = getattr(instance, '_loaded_valuation', None) or instance.valuation_state()
+    if old_state:
+        apply_card_change(old_state, None)
+
+@receiver(cards_imported)
+def update_portfolio_for_imported_cards(sender, owner_id, card_ids, **kwargs):
+    from .portfolio import apply_new_cards
+    apply_new_cards(owner_id, card_ids) # Sent per import chunk: only that chunk's cards are read
+
+@receiver(cards_updated)
+def update_portfolio_for_bulk_cards(sender, owner_id, card_ids, **kwargs):
+    from .portfolio import rebuild_portfolios
+    rebuild_portfolios([owner_id]) # One pass over the owner's cards beats a delta per card
+
+@receiver(cards_updated)
+def sync_order_book_bulk_cards(sender, owner_id, card_ids, **kwargs):
+    from listings.models import Listing
+    from .orderbook import order_books, sync_listings_on_commit
+    if order_books.is_tracking:
+        sync_listings_on_commit(Listing.objects.filter(card_for_listing_id__in=card_ids, status='ACTIVE').values_list('pk', flat=True))
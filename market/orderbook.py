@@ -0,0 +1,265 @@
+"""
+In-memory order book per card series (identity_key, grader, grade).
+
+Asks are ACTIVE fixed-price SALE listings; bids are PENDING public offers on ACTIVE listings
+(private offer amounts are never exposed, not even in aggregate). Each side keeps its distinct
+prices in a sorted list, so the best price is O(1), finding a level is an O(log n) bisect and
+depth(n) reads n levels; no query touches the listing table. Adding an order at a new price, or
+removing the last one at a price, inserts or deletes a list entry: O(n) in the number of levels,
+but a memmove over the few hundred distinct prices a series has, which beats a tree at that size.
+
+The book is built by a background thread that the server entry points start (cdex_project.asgi /
+wsgi: order_books.start(), unless MARKET_ORDER_BOOK_ENABLED is off for that process) and kept current by the listing, offer and card receivers in
+market.models, applied once the writing transaction commits. The same thread rebuilds every
+MARKET_ORDER_BOOK_MAX_AGE seconds to pick up writes made by other processes. Reads are served from
+memory only and never build: until the first build has finished there is no book (is_built).
+
+A rebuild scans outside the lock, so syncs that land meanwhile are remembered and replayed on top
+of the new snapshot instead of being overwritten by it.
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from listings.identity import market_series
+from listings.models import Listing
+from messaging.models import Offer
+
+logger = logging.getLogger(__name__)
+
+_CARD_FIELDS = ['identity_key', 'is_graded', 'grader', 'grade_value']
+REBUILD_RETRY_SECONDS = 30
+
+
+class PriceLevels:
+    """One side of a book: price -> set of order ids, prices kept sorted ascending."""
+
+    def __init__(self, descending=False):
+        self.descending = descending
+        self._prices = []
+        self._orders = {}
+
+    def __len__(self):
+        return len(self._prices)
+
+    def add(self, order_id, price):
+        orders = self._orders.get(price)
+        if orders is None:
+            bisect.insort(self._prices, price)
+            orders = self._orders[price] = set()
+        orders.add(order_id)
+
+    def discard(self, order_id, price):
+        orders = self._orders.get(price)
+        if orders is None:
+            return
+        orders.discard(order_id)
+        if not orders:
+            del self._orders[price]
+            del self._prices[bisect.bisect_left(self._prices, price)]
+
+    def best(self):
+        if not self._prices:
+            return None
+        return self._prices[-1] if self.descending else self._prices[0]
+
+    def depth(self, levels):
+        if levels <= 0:
+            return []
+        prices = self._prices[:-levels - 1:-1] if self.descending else self._prices[:levels]
+        return [(price, len(self._orders[price])) for price in prices]
+
+
+class OrderBook:
+    def __init__(self):
+        self.bids = PriceLevels(descending=True)
+        self.asks = PriceLevels()
+
+    def __bool__(self):
+        return bool(self.bids) or bool(self.asks)
+
+    def snapshot(self, levels=10):
+        best_bid, best_ask = self.bids.best(), self.asks.best()
+        return {
+            'best_bid': best_bid,
+            'best_ask': best_ask,
+            'spread': best_ask - best_bid if best_bid is not None and best_ask is not None else None,
+            'bids': self.bids.depth(levels),
+            'asks': self.asks.depth(levels),
+        }
+
+
+class OrderBookEngine:
+    """All books of this process. Every method is thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock() # One scan at a time
+        self._refresher = None
+        self._pending = None # Listing ids synced while a rebuild is scanning; None when not rebuilding
+        self._reset()
+
+    def _reset(self):
+        self._books = defaultdict(OrderBook)
+        self._orders = {} # ('ask', listing_id) / ('bid', offer_id) -> (series, price)
+        self._offers_by_listing = defaultdict(set)
+        self._built_at = None
+
+    @property
+    def is_built(self):
+        return self._built_at is not None
+
+    @property
+    def is_tracking(self):
+        """Built or being built: receivers have changes worth syncing."""
+        return self._built_at is not None or self._pending is not None
+
+    def invalidate(self):
+        """Drop every book (tests); the refresher's next rebuild, or an explicit rebuild(), brings them back."""
+        with self._lock:
+            self._reset()
+
+    def start(self):
+        """Build in a background thread now, then rebuild every MARKET_ORDER_BOOK_MAX_AGE seconds. Once per process."""
+        with self._lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_forever, name='order-book-refresher', daemon=True)
+                self._refresher.start()
+
+    def _refresh_forever(self):
+        while True:
+            wait = getattr(settings, 'MARKET_ORDER_BOOK_MAX_AGE', 300)
+            try:
+                self.rebuild()
+            except Exception: # Keep serving the last good book and try again soon
+                logger.exception("Order book rebuild failed")
+                wait = min(wait, REBUILD_RETRY_SECONDS)
+            finally:
+                connections.close_all() # Don't hold a connection while sleeping
+            time.sleep(wait)
+
+    # Reads
+
+    def book(self, series, levels=10):
+        """Snapshot of one series from memory (empty if the series has no orders or nothing is built yet)."""
+        with self._lock:
+            book = self._books.get(series)
+            return book.snapshot(levels) if book else OrderBook().snapshot(levels)
+
+    # Writes
+
+    def _place(self, key, series, price):
+        self._remove(key)
+        side = self._books[series].asks if key[0] == 'ask' else self._books[series].bids
+        side.add(key[1], price)
+        self._orders[key] = (series, price)
+
+    def _remove(self, key):
+        placed = self._orders.pop(key, None)
+        if placed is None:
+            return
+        series, price = placed
+        book = self._books[series]
+        (book.asks if key[0] == 'ask' else book.bids).discard(key[1], price)
+        if not book:
+            del self._books[series]
+
+    def rebuild(self):
+        """Rebuild every book from the database. Syncs that arrive during the scan are replayed afterwards."""
+        with self._rebuild_lock:
+            with self._lock:
+                self._pending = set()
+            try:
+                asks, bids = self._scan()
+            except BaseException:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                self._reset()
+                for listing_id, price, *card in asks:
+                    self._place(('ask', listing_id), market_series(*card), price)
+                for offer_id, listing_id, amount, *card in bids:
+                    self._place(('bid', offer_id), market_series(*card), amount)
+                    self._offers_by_listing[listing_id].add(offer_id)
+                self._built_at = time.monotonic()
+                replay, self._pending = self._pending, None
+            if replay: # Committed after (or while) the scan read them: re-read them now
+                self.sync_listings(replay)
+
+    def _scan(self):
+        asks = Listing.objects.filter(status='ACTIVE', listing_type='SALE', price__isnull=False).values_list(
+            'pk', 'price', *(f'card_for_listing__{field}' for field in _CARD_FIELDS),
+        )
+        bids = Offer.objects.filter(status='PENDING', is_public=True, listing__status='ACTIVE').values_list(
+            'pk', 'listing_id', 'offer_amount', *(f'listing__card_for_listing__{field}' for field in _CARD_FIELDS),
+        )
+        return list(asks.iterator(chunk_size=2000)), list(bids.iterator(chunk_size=2000))
+
+    def _note_sync(self, listing_ids):
+        """Remember the listings for a rebuild in progress. Returns whether there are books to update now."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.update(listing_ids)
+            return self.is_built
+
+    def sync_listings(self, listing_ids):
+        """Re-read the given listings (and their offers) and move/remove their orders."""
+        listing_ids = list(listing_ids)
+        if not self._note_sync(listing_ids):
+            return # Nothing built yet; the build in progress replays these
+        rows = {
+            listing_id: (status, listing_type, price, market_series(*card))
+            for listing_id, status, listing_type, price, *card in Listing.objects.filter(pk__in=listing_ids).values_list(
+                'pk', 'status', 'listing_type', 'price', *(f'card_for_listing__{field}' for field in _CARD_FIELDS),
+            )
+        }
+        offers = Offer.objects.filter(listing_id__in=listing_ids, status='PENDING', is_public=True).values_list('pk', 'listing_id', 'offer_amount')
+        offers_by_listing = defaultdict(list)
+        for offer_id, listing_id, amount in offers:
+            offers_by_listing[listing_id].append((offer_id, amount))
+        with self._lock:
+            for listing_id in listing_ids:
+                status, listing_type, price, series = rows.get(listing_id, (None, None, None, None))
+                if status == 'ACTIVE' and listing_type == 'SALE' and price is not None:
+                    self._place(('ask', listing_id), series, price)
+                else:
+                    self._remove(('ask', listing_id))
+                for offer_id in self._offers_by_listing.pop(listing_id, ()):
+                    self._remove(('bid', offer_id))
+                if status == 'ACTIVE':
+                    for offer_id, amount in offers_by_listing[listing_id]:
+                        self._place(('bid', offer_id), series, amount)
+                        self._offers_by_listing[listing_id].add(offer_id)
+
+    def sync_offer(self, offer_id, listing_id):
+        if not self._note_sync([listing_id]): # Replaying the listing re-reads its offers too
+            return
+        row = Offer.objects.filter(
+            pk=offer_id, status='PENDING', is_public=True, listing__status='ACTIVE',
+        ).values_list('offer_amount', *(f'listing__card_for_listing__{field}' for field in _CARD_FIELDS)).first()
+        with self._lock:
+            if row is None:
+                self._remove(('bid', offer_id))
+                self._offers_by_listing[listing_id].discard(offer_id)
+            else:
+                amount, *card = row
+                self._place(('bid', offer_id), market_series(*card), amount)
+                self._offers_by_listing[listing_id].add(offer_id)
+
+
+order_books = OrderBookEngine()
+
+
+def sync_listings_on_commit(listing_ids):
+    listing_ids = list(listing_ids)
+    transaction.on_commit(lambda: order_books.sync_listings(listing_ids))
+
+
+def sync_offer_on_commit(offer_id, listing_id):
+    transaction.on_commit(lambda: order_books.sync_offer(offer_id, listing_id))
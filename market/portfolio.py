@@ -0,0 +1,177 @@
+"""
+Portfolio valuation, maintained incrementally.
+
+A card contributes to its owner's Portfolio: one card, its purchase price to the cost basis and,
+when its series has a MarketPrice, that price to the market value. Instead of re-valuing whole
+collections, every change applies only its difference with F() updates:
+
+* a card saved or deleted: remove its old contribution, add its new one (apply_card_change);
+* cards imported in bulk: add the contributions of just those cards (apply_new_cards);
+* market prices moving: grouped queries find the holders of those series and their cards are
+  re-valued by (new - old) per card (apply_price_changes).
+
+A user without a Portfolio row yet is valued from scratch once (rebuild_portfolios), which is also
+what the rebuild_portfolios command does after bulk writes that bypass signals.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+
+from listings.identity import market_series
+from listings.models import Card
+from .models import MarketPrice, Portfolio, PortfolioSnapshot
+from .utils import IN_BATCH_SIZE, chunked
+
+ZERO = Decimal('0')
+_CARD_VALUES = ['owner_id', 'identity_key', 'is_graded', 'grader', 'grade_value', 'purchase_price']
+
+
+def price_lookup(series_list):
+    """{series: price} for the series that have a market price."""
+    series_list = set(series_list)
+    prices = {}
+    for identities in chunked({identity for identity, _, _ in series_list}):
+        rows = MarketPrice.objects.filter(identity_key__in=identities).values_list('identity_key', 'grader', 'grade', 'price')
+        prices.update(((identity, grader, grade), price) for identity, grader, grade, price in rows if (identity, grader, grade) in series_list)
+    return prices
+
+
+def _contribution(purchase_price, market_price):
+    priced = market_price is not None
+    return {
+        'card_count': 1,
+        'priced_count': 1 if priced else 0,
+        'cost_basis': purchase_price or ZERO,
+        'priced_cost_basis': (purchase_price or ZERO) if priced else ZERO,
+        'market_value': market_price if priced else ZERO,
+    }
+
+
+def _adjust(user_id, deltas):
+    """Add `deltas` to the user's portfolio. Returns False if the user has no Portfolio row."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return Portfolio.objects.filter(pk=user_id).exists()
+    return bool(Portfolio.objects.filter(pk=user_id).update(**{field: F(field) + delta for field, delta in deltas.items()}))
+
+
+def apply_card_change(old_state, new_state):
+    """
+    Apply one card's change to portfolios. States are Card.valuation_state() tuples
+    (owner_id, series, purchase_price); None for "did not exist" (created / deleted).
+    """
+    if old_state == new_state:
+        return
+    prices = price_lookup(state[1] for state in (old_state, new_state) if state)
+    deltas = defaultdict(lambda: defaultdict(int))
+    if old_state:
+        for field, value in _contribution(old_state[2], prices.get(old_state[1])).items():
+            deltas[old_state[0]][field] -= value
+    if new_state:
+        for field, value in _contribution(new_state[2], prices.get(new_state[1])).items():
+            deltas[new_state[0]][field] += value
+    for user_id, user_deltas in deltas.items():
+        if not _adjust(user_id, user_deltas) and new_state and user_id == new_state[0]:
+            rebuild_portfolios([user_id]) # First card we see for this user: value everything once
+
+
+def apply_new_cards(owner_id, card_ids):
+    """
+    Add cards that were just created in bulk (an import chunk) to their owner's portfolio: one pass
+    over those cards only, so an import costs the same per chunk however big the collection is.
+    """
+    totals = defaultdict(int)
+    for batch in chunked(card_ids):
+        rows = list(Card.objects.filter(pk__in=batch).values_list(*_CARD_VALUES[1:]))
+        prices = price_lookup(market_series(*row[:4]) for row in rows)
+        for *series_fields, purchase_price in rows:
+            for field, value in _contribution(purchase_price, prices.get(market_series(*series_fields))).items():
+                totals[field] += value
+    if not _adjust(owner_id, totals):
+        rebuild_portfolios([owner_id]) # First cards we see for this user
+
+
+def apply_price_changes(changes):
+    """`changes` maps series -> (old price or None, new price). Re-values every holder's cards of those series."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for identities in chunked({identity for identity, _, _ in changes}):
+        # One grouped query per batch of identities (card_identity_idx) finds every holder
+        holdings = (
+            Card.objects.filter(identity_key__in=identities).order_by()
+            .values_list('owner_id', 'identity_key', 'is_graded', 'grader', 'grade_value')
+            .annotate(cards=Count('id'), purchases=Sum('purchase_price'))
+        )
+        for owner_id, *series_fields, cards, purchases in holdings:
+            change = changes.get(market_series(*series_fields))
+            if change is None:
+                continue
+            old_price, new_price = change
+            deltas[owner_id]['market_value'] += cards * (new_price - (old_price or ZERO))
+            if old_price is None:
+                deltas[owner_id]['priced_count'] += cards
+                deltas[owner_id]['priced_cost_basis'] += purchases or ZERO
+
+    # Holders with identical deltas share one UPDATE
+    groups = defaultdict(list)
+    for owner_id, owner_deltas in deltas.items():
+        groups[tuple(sorted((field, delta) for field, delta in owner_deltas.items() if delta))].append(owner_id)
+    missing = set()
+    for owner_deltas, user_ids in groups.items():
+        for batch in chunked(user_ids):
+            existing = set(Portfolio.objects.filter(pk__in=batch).values_list('pk', flat=True))
+            if owner_deltas:
+                Portfolio.objects.filter(pk__in=existing).update(**{field: F(field) + delta for field, delta in owner_deltas})
+            missing.update(set(batch) - existing)
+    if missing:
+        rebuild_portfolios(missing)
+
+
+def rebuild_portfolios(user_ids=None, chunk_size=2000):
+    """Value portfolios from scratch (all users if user_ids is None). Streams cards in chunks."""
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if len(user_ids) > IN_BATCH_SIZE:
+            return sum(rebuild_portfolios(batch, chunk_size) for batch in chunked(user_ids))
+    cards = Card.objects.order_by('owner_id', 'pk').values_list(*_CARD_VALUES)
+    if user_ids is not None:
+        cards = cards.filter(owner_id__in=user_ids)
+    else:
+        user_ids = list(Portfolio.objects.values_list('pk', flat=True)) # So emptied collections are reset too
+    totals = {}
+    chunk = []
+
+    def flush():
+        prices = price_lookup(market_series(*row[1:5]) for row in chunk)
+        for owner_id, *series_fields, purchase_price in chunk:
+            portfolio = totals.setdefault(owner_id, Portfolio(user_id=owner_id))
+            for field, value in _contribution(purchase_price, prices.get(market_series(*series_fields))).items():
+                setattr(portfolio, field, getattr(portfolio, field) + value)
+        chunk.clear()
+
+    for row in cards.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    for user_id in user_ids:
+        totals.setdefault(user_id, Portfolio(user_id=user_id)) # Users whose last card is gone
+    Portfolio.objects.bulk_create(
+        totals.values(), batch_size=500, update_conflicts=True, unique_fields=['user'],
+        update_fields=['card_count', 'priced_count', 'cost_basis', 'priced_cost_basis', 'market_value'],
+    )
+    return len(totals)
+
+
+def take_snapshots(date, chunk_size=2000):
+    """Copy every Portfolio into PortfolioSnapshot rows for `date` (re-running the same day overwrites)."""
+    fields = ['card_count', 'cost_basis', 'priced_cost_basis', 'market_value']
+    written, batch = 0, []
+    for row in Portfolio.objects.order_by('pk').values('user_id', *fields).iterator(chunk_size=chunk_size):
+        batch.append(PortfolioSnapshot(date=date, **row))
+        if len(batch) >= chunk_size:
+            written += len(PortfolioSnapshot.objects.bulk_create(batch, update_conflicts=True, unique_fields=['user', 'date'], update_fields=fields))
+            batch = []
+    if batch:
+        written += len(PortfolioSnapshot.objects.bulk_create(batch, update_conflicts=True, unique_fields=['user', 'date'], update_fields=fields))
+    return written
@@ -0,0 +1,48 @@
+from rest_framework import serializers
+from .models import Sale, PriceCandle, Portfolio, PortfolioSnapshot
+
+class PriceCandleSerializer(serializers.ModelSerializer):
+    vwap = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = PriceCandle
+        fields = ['bucket_start', 'open', 'high', 'low', 'close', 'volume', 'turnover', 'vwap']
+
+class SaleSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Sale
+        fields = ['id', 'identity_key', 'grader', 'grade', 'price', 'sold_at', 'source']
+
+class PriceLevelSerializer(serializers.Serializer):
+    price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    orders = serializers.IntegerField()
+
+    def to_representation(self, level):
+        price, orders = level
+        return super().to_representation({'price': price, 'orders': orders})
+
+class OrderBookSerializer(serializers.Serializer):
+    best_bid = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    best_ask = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    spread = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    bids = PriceLevelSerializer(many=True)
+    asks = PriceLevelSerializer(many=True)
+
+class PortfolioSnapshotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PortfolioSnapshot
+        fields = ['date', 'card_count', 'cost_basis', 'market_value']
+
+class PortfolioSerializer(serializers.ModelSerializer):
+    unrealized_gain = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = Portfolio
+        fields = ['card_count', 'priced_count', 'cost_basis', 'priced_cost_basis', 'market_value', 'unrealized_gain', 'updated_at']
+
+class PriceStatsSerializer(serializers.Serializer):
+    volume = serializers.IntegerField()
+    vwap = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    low = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    high = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+    quantiles = serializers.DictField(child=serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True))
@@ -0,0 +1,78 @@
+"""
+Mergeable quantile sketch for sale prices (the DDSketch scheme).
+
+Prices are counted in logarithmic bins, each bin covering values within RELATIVE_ACCURACY of
+each other, so any quantile comes back within 1% of the true sale price. The sketch only keeps
+bin -> count: a candle's worth of sales is a few dozen integers, and two sketches merge exactly by
+adding counts, so medians over a year or across grades are computed from stored candles
+without touching the raw sales. Serialises to a small JSON dict for PriceCandle.sketch.
+"""
+import math
+from decimal import Decimal
+
+RELATIVE_ACCURACY = 0.01
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+_CENT = Decimal('0.01')
+
+
+class QuantileSketch:
+    def __init__(self, bins=None, zeros=0, low=None, high=None):
+        self.bins = bins or {}
+        self.zeros = zeros # Free cards/trades at 0 have no logarithm
+        self.low, self.high = low, high
+
+    @property
+    def count(self):
+        return self.zeros + sum(self.bins.values())
+
+    def add(self, value, count=1):
+        value = float(value)
+        if value <= 0:
+            self.zeros += count
+        else:
+            index = math.ceil(math.log(value) / _LOG_GAMMA)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.low = value if self.low is None else min(self.low, value)
+        self.high = value if self.high is None else max(self.high, value)
+        return self
+
+    def merge(self, other):
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zeros += other.zeros
+        if other.low is not None:
+            self.low = other.low if self.low is None else min(self.low, other.low)
+            self.high = other.high if self.high is None else max(self.high, other.high)
+        return self
+
+    def quantile(self, q):
+        """Approximate q-quantile (0 <= q <= 1) as a Decimal in cents, or None if empty."""
+        total = self.count
+        if not total:
+            return None
+        if q <= 0 or q >= 1: # The extremes are tracked exactly
+            return Decimal(repr(self.low if q <= 0 else self.high)).quantize(_CENT)
+        rank = q * (total - 1)
+        seen = self.zeros
+        value = 0.0
+        if seen <= rank:
+            for index in sorted(self.bins):
+                seen += self.bins[index]
+                if seen > rank:
+                    value = 2 * _GAMMA ** index / (_GAMMA + 1) # Midpoint (in relative terms) of the bin
+                    break
+        value = min(max(value, self.low), self.high)
+        return Decimal(repr(value)).quantize(_CENT)
+
+    def to_json(self):
+        if not self.count:
+            return {}
+        # JSON object keys must be strings
+        return {'bins': {str(index): count for index, count in self.bins.items()}, 'zeros': self.zeros, 'low': self.low, 'high': self.high}
+
+    @classmethod
+    def from_json(cls, data):
+        if not data:
+            return cls()
+        return cls({int(index): count for index, count in data['bins'].items()}, data['zeros'], data['low'], data['high'])
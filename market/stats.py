@@ -0,0 +1,53 @@
+"""
+Price statistics (VWAP, min/max, quantiles) over a time window, rolled up from stored candles.
+
+Candles hold volume, turnover and a mergeable quantile sketch, so a year of a series is ~52
+weekly or ~365 daily rows whatever the number of sales, and rolling several grades together is
+the same merge over more rows.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PriceCandle
+from .sketch import QuantileSketch
+
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75, 0.9)
+# Daily candles are exact to the day; beyond this window weekly ones are merged instead (fewer rows)
+DAILY_WINDOW = timedelta(days=400)
+
+
+def price_stats(identity_key, grader=None, grade=None, since=None, quantiles=DEFAULT_QUANTILES, all_grades=False):
+    """
+    Statistics for one series, or for every grade of a grader (all_grades=True), or for every
+    grading of the card (grader=None). `since` of None means all history.
+    """
+    candles = PriceCandle.objects.filter(identity_key=identity_key)
+    if grader is not None:
+        candles = candles.filter(grader=grader)
+        if not all_grades:
+            candles = candles.filter(Q(grade__isnull=True) if grade is None else Q(grade=grade))
+    if since is not None and timezone.now() - since <= DAILY_WINDOW:
+        candles = candles.filter(resolution='DAY', bucket_start__gte=since)
+    else:
+        candles = candles.filter(resolution='WEEK')
+        if since is not None:
+            candles = candles.filter(bucket_start__gte=since)
+
+    sketch, volume, turnover, low, high = QuantileSketch(), 0, Decimal('0'), None, None
+    for row in candles.values_list('volume', 'turnover', 'low', 'high', 'sketch').iterator():
+        candle_volume, candle_turnover, candle_low, candle_high, candle_sketch = row
+        volume += candle_volume
+        turnover += candle_turnover
+        low = candle_low if low is None else min(low, candle_low)
+        high = candle_high if high is None else max(high, candle_high)
+        sketch.merge(QuantileSketch.from_json(candle_sketch))
+    return {
+        'volume': volume,
+        'vwap': (turnover / volume).quantize(Decimal('0.01')) if volume else None,
+        'low': low,
+        'high': high,
+        'quantiles': {str(q): sketch.quantile(q) for q in quantiles},
+    }
@@ -0,0 +1,436 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from listings.identity import identity_key
+from listings.models import Game, Card, Listing
+from listings.services import close_due_listings
+from messaging.models import Offer
+from .ledger import bucket_start, record_sales
+from .models import Sale, PriceCandle, Portfolio, PortfolioSnapshot, SaleImport
+from .orderbook import order_books
+from .portfolio import rebuild_portfolios
+from .sketch import QuantileSketch
+from .stats import price_stats
+
+User = get_user_model()
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+class CandleBucketTests(TestCase):
+    def test_buckets_truncate_in_utc(self):
+        moment = utc(2024, 5, 16, 13, 45, 10) # A Thursday
+        self.assertEqual(bucket_start(moment, 'HOUR'), utc(2024, 5, 16, 13))
+        self.assertEqual(bucket_start(moment, 'DAY'), utc(2024, 5, 16))
+        self.assertEqual(bucket_start(moment, 'WEEK'), utc(2024, 5, 13)) # Monday
+
+@mock.patch('market.ledger.HOURLY_RETENTION', timedelta(days=365 * 100)) # Fixed 2024 dates, keep hourly candles
+class RecordSalesTests(TestCase):
+    key = identity_key('MLB Baseball Cards', 'Derek Jeter', 'SP Foil', 1993, '279')
+
+    def sale(self, price, sold_at, grade=Decimal('9')):
+        return Sale(identity_key=self.key, grader='PSA', grade=grade, price=Decimal(price), sold_at=sold_at, source='IMPORT')
+
+    def candle(self, resolution, start, grade=Decimal('9')):
+        return PriceCandle.objects.get(identity_key=self.key, grader='PSA', grade=grade, resolution=resolution, bucket_start=start)
+
+    def test_batch_builds_ohlc_candles_at_every_resolution(self):
+        record_sales([
+            self.sale('100', utc(2024, 5, 16, 10, 5)),
+            self.sale('140', utc(2024, 5, 16, 10, 30)),
+            self.sale('90', utc(2024, 5, 16, 18, 0)),
+        ])
+        day = self.candle('DAY', utc(2024, 5, 16))
+        self.assertEqual((day.open, day.high, day.low, day.close), (100, 140, 90, 90))
+        self.assertEqual((day.volume, day.turnover), (3, 330))
+        self.assertEqual(self.candle('HOUR', utc(2024, 5, 16, 10)).volume, 2)
+        self.assertEqual(self.candle('WEEK', utc(2024, 5, 13)).volume, 3)
+        self.assertEqual(PriceCandle.objects.filter(resolution='HOUR').count(), 2)
+
+    def test_later_batches_merge_including_late_sales(self):
+        record_sales([self.sale('100', utc(2024, 5, 16, 12))])
+        record_sales([self.sale('120', utc(2024, 5, 16, 15)), self.sale('80', utc(2024, 5, 16, 9))])
+        day = self.candle('DAY', utc(2024, 5, 16))
+        # The 09:00 sale arrived last but is the earliest, so it becomes the open
+        self.assertEqual((day.open, day.high, day.low, day.close, day.volume), (80, 120, 80, 120, 3))
+        self.assertEqual(Sale.objects.count(), 3)
+
+    def test_old_sales_skip_hourly_candles(self):
+        with mock.patch('market.ledger.HOURLY_RETENTION', timedelta(days=30)):
+            record_sales([self.sale('100', timezone.now() - timedelta(days=60)), self.sale('110', timezone.now())])
+        self.assertEqual(PriceCandle.objects.filter(resolution='HOUR').count(), 1)
+        self.assertEqual(PriceCandle.objects.filter(resolution='DAY').count(), 2)
+
+    def test_grades_and_raw_cards_are_separate_series(self):
+        record_sales([
+            self.sale('100', utc(2024, 5, 16, 12)),
+            self.sale('300', utc(2024, 5, 16, 12), grade=Decimal('10')),
+            Sale(identity_key=self.key, price=Decimal('20'), sold_at=utc(2024, 5, 16, 12)),
+        ])
+        record_sales([Sale(identity_key=self.key, price=Decimal('30'), sold_at=utc(2024, 5, 16, 13))])
+        self.assertEqual(self.candle('DAY', utc(2024, 5, 16)).close, 100)
+        self.assertEqual(self.candle('DAY', utc(2024, 5, 16), grade=Decimal('10')).close, 300)
+        raw = PriceCandle.objects.get(identity_key=self.key, grader='', grade=None, resolution='DAY')
+        self.assertEqual((raw.open, raw.close, raw.volume), (20, 30, 2))
+
+class ListingSaleLedgerTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user(username='ledger_seller', email='ledger_seller@example.com', password='password123')
+        self.buyer = User.objects.create_user(username='ledger_buyer', email='ledger_buyer@example.com', password='password123')
+        game = Game.objects.create(name="MLB Baseball Cards")
+        self.card = Card.objects.create(
+            owner=self.seller, game=game, card_name="Derek Jeter", set_name="SP Foil", year=1993,
+            card_identifier_in_set="#279", is_graded=True, grader='PSA', grade='9 Mint',
+        )
+
+    def test_marking_a_listing_sold_records_one_sale(self):
+        listing = Listing.objects.create(lister=self.seller, card_for_listing=self.card, listing_type='SALE', price=250)
+        self.assertFalse(Sale.objects.exists())
+        listing = Listing.objects.get(pk=listing.pk)
+        listing.status = 'SOLD'
+        listing.save()
+        listing.save() # Saving again is not another sale
+        sale = Sale.objects.get()
+        self.assertEqual((sale.listing, sale.price, sale.grader, sale.grade), (listing, 250, 'PSA', Decimal('9')))
+        self.assertEqual(sale.identity_key, identity_key('MLB Baseball Cards', 'Derek Jeter', 'SP Foil', 1993, '279'))
+        self.assertEqual(PriceCandle.objects.count(), 3) # Hour, day and week
+
+    def test_closed_auctions_record_their_hammer_price(self):
+        ended = timezone.now() - timedelta(minutes=5)
+        Listing.objects.create(
+            lister=self.seller, card_for_listing=self.card, listing_type='AUCTION', auction_start_price=50,
+            auction_end_datetime=ended, current_highest_bid=180, current_high_bidder=self.buyer,
+        )
+        Listing.objects.create(lister=self.seller, card_for_listing=self.card, listing_type='AUCTION', auction_start_price=50, auction_end_datetime=ended)
+        close_due_listings()
+        sale = Sale.objects.get()
+        self.assertEqual((sale.price, sale.sold_at), (180, ended))
+
+class PriceCandleAPITests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='candle_owner', email='candle_owner@example.com', password='password123')
+        self.card = Card.objects.create(owner=owner, card_name="Charizard", set_name="Base Set", card_identifier_in_set="4/102", is_graded=True, grader='PSA', grade='10')
+        self.key = identity_key('', 'Charizard', 'Base Set', None, '4/102')
+        now = timezone.now()
+        record_sales([
+            Sale(identity_key=self.key, grader='PSA', grade=Decimal('10'), price=Decimal(price), sold_at=now - timedelta(days=days))
+            for price, days in [('5000', 30), ('5500', 2), ('5200', 400)]
+        ])
+        self.url = reverse('price-candles')
+
+    def test_candles_for_a_card_use_its_grade(self):
+        response = self.client.get(self.url, {'card': self.card.pk, 'resolution': 'day'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['close'] for c in response.data], ['5000.00', '5500.00']) # 400 days ago is outside the default window
+
+    def test_candles_by_identity_and_since(self):
+        since = (timezone.now() - timedelta(days=500)).isoformat()
+        response = self.client.get(self.url, {'identity': self.key, 'grader': 'PSA', 'grade': '10', 'resolution': 'WEEK', 'since': since})
+        self.assertEqual(len(response.data), 3)
+        response = self.client.get(self.url, {'identity': self.key}) # Raw series has no sales
+        self.assertEqual(response.data, [])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'identity': self.key, 'resolution': 'MINUTE'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'card': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('card', response.data)
+        response = self.client.get(self.url, {'identity': self.key, 'since': '2024-13-45T00:00'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', response.data)
+
+class OrderBookTests(TestCase):
+    def setUp(self):
+        self.book = order_books
+        self.addCleanup(order_books.invalidate)
+        self.seller = User.objects.create_user(username='book_seller', email='book_seller@example.com', password='password123')
+        self.buyer = User.objects.create_user(username='book_buyer', email='book_buyer@example.com', password='password123')
+        self.card = Card.objects.create(owner=self.seller, card_name="Black Lotus", set_name="Alpha", is_graded=True, grader='BGS', grade='9')
+        self.series = self.card.market_series
+        make = lambda price: Listing.objects.create(lister=self.seller, card_for_listing=self.card, listing_type='SALE', price=price)
+        self.cheap, self.dear, self.twin = make(100), make(150), make(100)
+        Listing.objects.create(lister=self.seller, card_for_listing=self.card, listing_type='AUCTION', auction_start_price=1)
+
+    def offer(self, amount, is_public=True, listing=None):
+        return Offer.objects.create(listing=listing or self.dear, buyer=self.buyer, offer_amount=amount, is_public=is_public)
+
+    def test_book_is_built_from_sale_listings_and_public_offers(self):
+        self.offer(90)
+        self.offer(95)
+        self.offer(500, is_public=False) # Private amounts stay private
+        self.book.rebuild()
+        with self.assertNumQueries(0): # Reads are served from memory
+            snapshot = self.book.book(self.series)
+        self.assertEqual((snapshot['best_bid'], snapshot['best_ask'], snapshot['spread']), (95, 100, 5))
+        self.assertEqual(snapshot['asks'], [(100, 2), (150, 1)])
+        self.assertEqual(snapshot['bids'], [(95, 1), (90, 1)])
+        self.assertEqual(self.book.book(self.series, levels=1)['asks'], [(100, 2)])
+
+    def test_saves_update_the_book_incrementally(self):
+        self.book.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = self.offer(120)
+            self.cheap.status = 'SOLD'
+            self.cheap.save()
+        self.assertEqual(self.book.book(self.series)['asks'], [(100, 1), (150, 1)])
+        self.assertEqual(self.book.book(self.series)['best_bid'], 120)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dear.status = 'CANCELLED' # Takes its offers with it
+            self.dear.save()
+        snapshot = self.book.book(self.series)
+        self.assertEqual((snapshot['asks'], snapshot['bids']), ([(100, 1)], []))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.card.grade = '10' # Corrected grade moves the remaining ask to another series
+            self.card.save()
+        self.assertIsNone(self.book.book(self.series)['best_ask'])
+        self.assertEqual(self.book.book(self.card.market_series)['best_ask'], 100)
+
+    def test_closing_expired_listings_removes_their_asks(self):
+        Listing.objects.filter(pk=self.twin.pk).update(expires_on=timezone.now() - timedelta(minutes=1))
+        self.book.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            close_due_listings()
+        self.assertEqual(self.book.book(self.series)['asks'], [(100, 1), (150, 1)])
+
+    def test_syncs_during_a_rebuild_are_replayed(self):
+        real_scan = self.book._scan
+
+        def scan_then_reprice(): # A sale listing repriced after the scan read it, before the snapshot is installed
+            rows = real_scan()
+            Listing.objects.filter(pk=self.cheap.pk).update(price=80)
+            self.book.sync_listings([self.cheap.pk])
+            return rows
+        with mock.patch.object(self.book, '_scan', scan_then_reprice):
+            self.book.rebuild()
+        self.assertEqual(self.book.book(self.series)['asks'], [(80, 1), (100, 1), (150, 1)])
+
+    def test_order_book_endpoint(self):
+        self.offer(95)
+        response = self.client.get(reverse('order-book'), {'card': self.card.pk, 'depth': 1})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE) # Never built inside a request
+        self.book.rebuild()
+        response = self.client.get(reverse('order-book'), {'card': self.card.pk, 'depth': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            'best_bid': '95.00', 'best_ask': '100.00', 'spread': '5.00',
+            'bids': [{'price': '95.00', 'orders': 1}], 'asks': [{'price': '100.00', 'orders': 2}],
+        })
+
+class PortfolioValuationTests(APITestCase):
+    def setUp(self):
+        self.collector = User.objects.create_user(username='pf_collector', email='pf_collector@example.com', password='password123')
+        self.other = User.objects.create_user(username='pf_other', email='pf_other@example.com', password='password123')
+        graded = dict(card_name="Derek Jeter", set_name="SP Foil", year=1993, is_graded=True, grader='PSA', grade='9')
+        self.jeter = Card.objects.create(owner=self.collector, purchase_price=100, **graded)
+        self.jeter_2 = Card.objects.create(owner=self.collector, purchase_price=80, **graded)
+        self.theirs = Card.objects.create(owner=self.other, purchase_price=50, **graded)
+        self.raw = Card.objects.create(owner=self.collector, card_name="Derek Jeter", set_name="SP Foil", year=1993, purchase_price=10)
+        self.series = self.jeter.market_series
+
+    def portfolio(self, user=None):
+        return Portfolio.objects.get(pk=(user or self.collector).pk)
+
+    def sell(self, price, series=None, when=None):
+        identity, grader, grade = series or self.series
+        record_sales([Sale(identity_key=identity, grader=grader, grade=grade, price=Decimal(price), sold_at=when or timezone.now())])
+
+    def assertMatchesRebuild(self):
+        # The incrementally maintained totals must equal a from-scratch valuation
+        expected = list(Portfolio.objects.order_by('pk').values_list('card_count', 'priced_count', 'cost_basis', 'priced_cost_basis', 'market_value'))
+        rebuild_portfolios()
+        self.assertEqual(list(Portfolio.objects.order_by('pk').values_list('card_count', 'priced_count', 'cost_basis', 'priced_cost_basis', 'market_value')), expected)
+
+    def test_cards_count_towards_cost_basis_before_any_sale(self):
+        portfolio = self.portfolio()
+        self.assertEqual((portfolio.card_count, portfolio.priced_count, portfolio.cost_basis, portfolio.market_value), (3, 0, 190, 0))
+
+    def test_market_price_changes_revalue_holders(self):
+        self.sell('150')
+        portfolio = self.portfolio()
+        self.assertEqual((portfolio.priced_count, portfolio.market_value, portfolio.unrealized_gain), (2, 300, 120))
+        self.sell('120')
+        self.assertEqual(self.portfolio().market_value, 240)
+        self.assertEqual(self.portfolio(self.other).market_value, 120)
+        self.sell('999', when=timezone.now() - timedelta(days=30)) # An old sale does not move the price
+        self.assertEqual(self.portfolio().market_value, 240)
+        self.sell('12', series=self.raw.market_series)
+        self.assertEqual(self.portfolio().market_value, 252)
+        self.assertMatchesRebuild()
+
+    def test_card_edits_and_deletes_apply_differences(self):
+        self.sell('150')
+        self.jeter.grade = '10' # No sales for PSA 10 yet: the card drops out of the priced set
+        self.jeter.save()
+        self.assertEqual((self.portfolio().priced_count, self.portfolio().market_value), (1, 150))
+        self.jeter_2.purchase_price = 90
+        self.jeter_2.save()
+        self.assertEqual(self.portfolio().cost_basis, 200)
+        self.raw.delete()
+        self.assertEqual((self.portfolio().card_count, self.portfolio().cost_basis), (2, 190))
+        Card.objects.only('card_name').get(pk=self.jeter_2.pk).save() # Partially loaded: falls back to a rebuild
+        self.assertMatchesRebuild()
+
+    def test_purchase_prices_assigned_as_strings(self):
+        # Forms and imports hand over text; the deltas must still be Decimal arithmetic
+        card = Card.objects.create(owner=self.collector, card_name="Ken Griffey Jr.", purchase_price='120.50')
+        self.assertEqual(self.portfolio().cost_basis, Decimal('310.50'))
+        card.purchase_price = '20.25'
+        card.save()
+        self.assertEqual(self.portfolio().cost_basis, Decimal('210.25'))
+        self.assertMatchesRebuild()
+
+    def test_imports_add_only_the_new_cards_per_chunk(self):
+        from listings.card_import import import_cards
+        self.sell('150')
+        rows = [{'card_name': "Derek Jeter", 'set_name': "SP Foil", 'year': 1993, 'is_graded': True, 'grader': 'PSA', 'grade': '9', 'purchase_price': '70'}] * 3
+        rows += [{'card_name': "Ken Griffey Jr.", 'purchase_price': '5'}] * 2
+        with mock.patch('market.portfolio.rebuild_portfolios') as rebuild: # No rescans of the whole collection
+            self.assertEqual(list(import_cards(self.collector, rows, chunk_size=2))[-1], ('done', 5, 0))
+        rebuild.assert_not_called()
+        portfolio = self.portfolio()
+        self.assertEqual((portfolio.card_count, portfolio.priced_count, portfolio.cost_basis, portfolio.market_value), (8, 5, 410, 750))
+        self.assertMatchesRebuild()
+
+    def test_snapshots_and_endpoint(self):
+        self.sell('150')
+        call_command('snapshot_portfolios', date='2024-01-01', verbosity=0)
+        call_command('snapshot_portfolios', verbosity=0)
+        call_command('snapshot_portfolios', verbosity=0) # Same day again overwrites
+        self.assertEqual(PortfolioSnapshot.objects.filter(user=self.collector).count(), 2)
+        self.client.force_authenticate(self.collector)
+        response = self.client.get(reverse('portfolio'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['market_value'], response.data['unrealized_gain']), ('300.00', '120.00'))
+        self.assertEqual(len(response.data['history']), 1) # 2024 is outside the default window
+        for days in ('1000000', '0', '-5'):
+            response = self.client.get(reverse('portfolio'), {'days': days})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('days', response.data)
+
+class QuantileSketchTests(TestCase):
+    def test_quantiles_are_within_relative_accuracy(self):
+        import random
+        rng = random.Random(3)
+        prices = sorted(Decimal(rng.lognormvariate(5, 1.2)).quantize(Decimal('0.01')) for _ in range(5000))
+        sketch = QuantileSketch()
+        for price in prices:
+            sketch.add(price)
+        for q in (0.1, 0.5, 0.9, 0.99):
+            exact = prices[int(q * (len(prices) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact), exact * Decimal('0.011'))
+        self.assertEqual((sketch.quantile(0), sketch.quantile(1)), (prices[0], prices[-1]))
+
+    def test_merged_sketches_equal_one_sketch_of_everything(self):
+        left, right, both = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for price in [0, 5, 10, 10, 250]:
+            left.add(price)
+            both.add(price)
+        for price in [7, 900, 12]:
+            right.add(price)
+            both.add(price)
+        merged = QuantileSketch.from_json(left.to_json()).merge(QuantileSketch.from_json(right.to_json()))
+        self.assertEqual(merged.to_json(), both.to_json())
+        self.assertEqual(merged.count, 8)
+        self.assertIsNone(QuantileSketch.from_json({}).quantile(0.5))
+
+class PriceStatsTests(APITestCase):
+    key = identity_key('', 'Wayne Gretzky', 'O-Pee-Chee', 1979, '18')
+
+    def setUp(self):
+        now = timezone.now()
+        sales = [('PSA', Decimal('8'), price, days) for price, days in [(100, 3), (110, 40), (130, 40), (400, 700)]]
+        sales += [('PSA', Decimal('9'), 1000, 5), ('BGS', Decimal('9'), 900, 5)]
+        record_sales(Sale(identity_key=self.key, grader=g, grade=grade, price=Decimal(price), sold_at=now - timedelta(days=days)) for g, grade, price, days in sales)
+
+    def test_window_vwap_and_quantiles(self):
+        stats = price_stats(self.key, 'PSA', Decimal('8'), since=timezone.now() - timedelta(days=90), quantiles=[0.5])
+        self.assertEqual((stats['volume'], stats['vwap'], stats['low'], stats['high']), (3, Decimal('113.33'), 100, 130))
+        self.assertAlmostEqual(stats['quantiles']['0.5'], Decimal('110'), delta=Decimal('1.1')) # Within 1%
+        self.assertEqual(price_stats(self.key, 'PSA', Decimal('8'))['volume'], 4) # All history, from weekly candles
+
+    def test_rollups_across_grades_and_graders(self):
+        self.assertEqual(price_stats(self.key, 'PSA', all_grades=True)['volume'], 5)
+        self.assertEqual(price_stats(self.key)['vwap'], Decimal('440.00'))
+        response = self.client.get(reverse('price-stats'), {'identity': self.key, 'grader': 'PSA', 'grade': '8', 'days': 90, 'quantiles': '0.5'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['vwap'], '113.33')
+        self.assertAlmostEqual(Decimal(response.data['quantiles']['0.5']), Decimal('110'), delta=Decimal('1.1'))
+        response = self.client.get(reverse('price-stats'), {'identity': self.key, 'quantiles': '2'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        for days in ('10000000000', '0'):
+            response = self.client.get(reverse('price-stats'), {'identity': self.key, 'days': days})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('days', response.data)
+
+class ImportSalesCommandTests(TestCase):
+    def write(self, name, text):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        with open(path, 'w') as handle:
+            handle.write(text)
+        return path
+
+    def run_import(self, path, **options):
+        call_command('import_sales', path, stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_imports_csv_and_rejects_bad_rows(self):
+        path = self.write('sales.csv', (
+            "game,card_name,set_name,year,number,grader,grade,price,sold_at\n"
+            "MLB Baseball Cards,Derek Jeter,SP Foil,1993,279,psa,9 Mint,$1250.00,2023-04-01T12:00:00\n"
+            "MLB Baseball Cards,Derek Jeter,SP Foil,1993,#279,PSA,9,1300,2023-04-02\n"
+            ",,,,,,,12,2023-04-02\n"
+            "MLB Baseball Cards,Derek Jeter,SP Foil,1993,279,,,ten,2023-04-02\n"
+        ))
+        self.run_import(path, chunk_size=2)
+        sales = Sale.objects.order_by('sold_at')
+        key = identity_key('MLB Baseball Cards', 'Derek Jeter', 'SP Foil', 1993, '279')
+        self.assertEqual([(s.identity_key, s.grader, s.grade, s.price, s.source) for s in sales], [
+            (key, 'PSA', 9, 1250, 'IMPORT'), (key, 'PSA', 9, 1300, 'IMPORT'),
+        ])
+        self.assertEqual(sales[1].sold_at, utc(2023, 4, 2))
+        self.assertEqual(PriceCandle.objects.get(resolution='WEEK').volume, 2) # Aggregates updated in the same pass
+        checkpoint = SaleImport.objects.get(name='sales.csv')
+        self.assertEqual((checkpoint.rows_read, checkpoint.sales_imported, checkpoint.rows_rejected, checkpoint.status), (4, 2, 2, 'COMPLETED'))
+        self.run_import(path) # Completed imports are not loaded twice
+        self.assertEqual(Sale.objects.count(), 2)
+
+    def test_non_finite_prices_and_numeric_cells_are_row_errors(self):
+        path = self.write('sales.jsonl', '\n'.join([
+            '{"identity_key": "card 1", "price": "NaN", "sold_at": "2023-01-01"}',
+            '{"identity_key": "card 2", "price": "Infinity", "sold_at": "2023-01-01"}',
+            '{"identity_key": "card 3", "price": "-inf", "sold_at": "2023-01-01"}',
+            '{"card_name": 123, "set_name": 456, "year": 1999, "grader": "PSA", "grade": 9, "price": 10, "sold_at": "2023-01-01"}',
+            '{"identity_key": 42, "price": 5, "sold_at": "2023-01-01"}',
+        ]) + '\n')
+        self.run_import(path)
+        self.assertEqual(
+            sorted(Sale.objects.values_list('identity_key', 'grader', 'grade', 'price')),
+            [('42', '', None, 5), (identity_key('', '123', '456', 1999), 'PSA', 9, 10)],
+        )
+        checkpoint = SaleImport.objects.get(name='sales.jsonl')
+        self.assertEqual((checkpoint.sales_imported, checkpoint.rows_rejected, checkpoint.status), (2, 3, 'COMPLETED'))
+
+    def test_resumes_after_the_last_committed_chunk(self):
+        lines = [f'{{"identity_key": "card {i}", "price": "{i}.50", "sold_at": "2023-01-0{i}T10:00:00Z"}}' for i in range(1, 6)]
+        path = self.write('sales.jsonl', '\n'.join(lines) + '\n')
+        SaleImport.objects.create(name='sales.jsonl', rows_read=2, sales_imported=2) # As if interrupted after chunk one
+        self.run_import(path, chunk_size=2)
+        self.assertEqual(sorted(Sale.objects.values_list('identity_key', flat=True)), ['card 3', 'card 4', 'card 5'])
+        self.assertEqual(SaleImport.objects.get().sales_imported, 5)
+        self.run_import(path, restart=True)
+        self.assertEqual(Sale.objects.count(), 8)
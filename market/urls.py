@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import PriceCandleListView, OrderBookView, PriceStatsView, PortfolioView
+
+urlpatterns = [
+    path('candles/', PriceCandleListView.as_view(), name='price-candles'),
+    path('order-book/', OrderBookView.as_view(), name='order-book'),
+    path('stats/', PriceStatsView.as_view(), name='price-stats'),
+    path('portfolio/', PortfolioView.as_view(), name='portfolio'),
+]
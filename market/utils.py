@@ -0,0 +1,11 @@
+from itertools import islice
+
+# Keeps `__in` lookups well under database parameter limits (SQLite's default is 999 on older builds)
+IN_BATCH_SIZE = 500
+
+
+def chunked(iterable, size=IN_BATCH_SIZE):
+    """Yield lists of up to `size` items from `iterable`."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
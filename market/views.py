@@ -0,0 +1,137 @@
+from datetime import timedelta
+
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import generics, permissions, status, views
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from listings.identity import numeric_grade
+from listings.models import Card
+from .models import PriceCandle, Portfolio
+from .orderbook import order_books
+from .portfolio import rebuild_portfolios
+from .stats import DEFAULT_QUANTILES, price_stats
+from .serializers import PriceCandleSerializer, OrderBookSerializer, PortfolioSerializer, PortfolioSnapshotSerializer, PriceStatsSerializer
+
+# How far back a graph looks when no ?since= is given
+DEFAULT_WINDOWS = {'HOUR': timedelta(days=7), 'DAY': timedelta(days=365), 'WEEK': timedelta(days=5 * 365)}
+MAX_ORDER_BOOK_DEPTH = 50
+PORTFOLIO_HISTORY_DAYS = 90
+MAX_STATS_DAYS = 36500
+
+class SeriesQueryMixin:
+    """
+    Picks the market series from the query string: ?card=<id> uses that card's identity and its own
+    grader/grade, ?identity=<key> a raw key; ?grader= and ?grade= override (blank grader means raw).
+    """
+    def get_series(self):
+        params = self.request.query_params
+        if 'card' in params:
+            try:
+                card_id = int(params['card'])
+            except ValueError:
+                raise ValidationError({'card': "Card must be a card id."})
+            identity, grader, grade = get_object_or_404(Card, pk=card_id).market_series
+        elif params.get('identity'):
+            identity, grader, grade = params['identity'], '', None
+        else:
+            raise ValidationError({'identity': "Pass ?identity=<key> or ?card=<id>."})
+        if 'grader' in params:
+            grader = params['grader']
+        if 'grade' in params:
+            grade = numeric_grade(params['grade'])
+            if params['grade'] and grade is None:
+                raise ValidationError({'grade': "Grade must be a number, e.g. 9 or 8.5."})
+        return identity, grader, grade
+
+class PriceCandleListView(SeriesQueryMixin, generics.ListAPIView):
+    """
+    OHLC candles for one card identity, oldest first, e.g.
+    /api/market/candles/?card=12&resolution=DAY or ?identity=<key>&grader=PSA&grade=9&resolution=WEEK.
+    """
+    serializer_class = PriceCandleSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None # A window of candles is already small and bounded
+
+    def get_queryset(self):
+        params = self.request.query_params
+        resolution = params.get('resolution', 'DAY').upper()
+        if resolution not in DEFAULT_WINDOWS:
+            raise ValidationError({'resolution': f"Choose one of {', '.join(DEFAULT_WINDOWS)}."})
+        since = timezone.now() - DEFAULT_WINDOWS[resolution]
+        if params.get('since'):
+            try:
+                since = parse_datetime(params['since'])
+            except ValueError: # Well-formed but out of range, e.g. month 13
+                since = None
+            if since is None:
+                raise ValidationError({'since': "Use an ISO 8601 datetime."})
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+        identity, grader, grade = self.get_series()
+        return PriceCandle.objects.filter(
+            identity_key=identity, grader=grader, grade=grade, resolution=resolution, bucket_start__gte=since,
+        )
+
+class OrderBookView(SeriesQueryMixin, views.APIView):
+    """Best bid/ask and aggregated depth for one card series, e.g. /api/market/order-book/?card=12&depth=5."""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        try:
+            depth = min(int(request.query_params.get('depth', 10)), MAX_ORDER_BOOK_DEPTH)
+        except ValueError:
+            raise ValidationError({'depth': "Depth must be a whole number."})
+        series = self.get_series()
+        if not order_books.is_built: # Built in the background at startup, never inside a request
+            return Response({'detail': "The order book is still being built; try again shortly."}, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '5'})
+        return Response(OrderBookSerializer(order_books.book(series, levels=depth)).data)
+
+class PriceStatsView(SeriesQueryMixin, views.APIView):
+    """
+    VWAP, low/high and quantiles of a series from its candles, e.g.
+    /api/market/stats/?card=12&days=90&quantiles=0.1,0.5,0.9. ?grades=all rolls up every grade of the
+    grader, ?graders=all every grading of the card; without ?days= all history is used.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            quantiles = [float(q) for q in params['quantiles'].split(',')] if params.get('quantiles') else DEFAULT_QUANTILES
+            days = int(params['days']) if params.get('days') else None
+        except ValueError:
+            raise ValidationError({'detail': "quantiles must be numbers between 0 and 1 and days a whole number."})
+        if not all(0 <= q <= 1 for q in quantiles):
+            raise ValidationError({'quantiles': "Quantiles must be between 0 and 1."})
+        if days is not None and not 1 <= days <= MAX_STATS_DAYS: # timedelta overflows long before int does
+            raise ValidationError({'days': f"Days must be between 1 and {MAX_STATS_DAYS}."})
+        since = timezone.now() - timedelta(days=days) if days else None
+        identity, grader, grade = self.get_series()
+        stats = price_stats(
+            identity, None if params.get('graders') == 'all' else grader, grade,
+            since=since, quantiles=quantiles, all_grades=params.get('grades') == 'all',
+        )
+        return Response(PriceStatsSerializer(stats).data)
+
+class PortfolioView(views.APIView):
+    """The user's collection value, cost basis and unrealized gain, plus ?days= of daily history (default 90)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', PORTFOLIO_HISTORY_DAYS))
+        except ValueError:
+            raise ValidationError({'days': "Days must be a whole number."})
+        if not 1 <= days <= MAX_STATS_DAYS: # timedelta overflows long before int does
+            raise ValidationError({'days': f"Days must be between 1 and {MAX_STATS_DAYS}."})
+        portfolio = Portfolio.objects.filter(pk=request.user.pk).first()
+        if portfolio is None: # Never valued yet (no cards saved since valuation was introduced)
+            rebuild_portfolios([request.user.pk])
+            portfolio = Portfolio.objects.get(pk=request.user.pk)
+        history = request.user.portfolio_snapshots.filter(date__gte=timezone.localdate() - timedelta(days=days))
+        data = PortfolioSerializer(portfolio).data
+        data['history'] = PortfolioSnapshotSerializer(history, many=True).data
+        return Response(data)
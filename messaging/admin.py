@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Offer, Conversation, Message
+from .search import matching_messages
 
 @admin.register(Offer)
 class OfferAdmin(admin.ModelAdmin):
@@ -25,6 +26,9 @@ class ConversationAdmin(admin.ModelAdmin):
     inlines = [MessageInline]
     raw_id_fields = ('related_listing', 'related_offer')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('participants') # One query for the whole changelist
+
     def get_participants_display(self, obj):
         return ", ".join([user.username for user in obj.participants.all()])
     get_participants_display.short_description = 'Participants'
@@ -46,10 +50,17 @@ class ConversationAdmin(admin.ModelAdmin):
 class MessageAdmin(admin.ModelAdmin):
     list_display = ('id', 'conversation_id_display', 'sender', 'timestamp_display', 'content_preview')
     list_filter = ('timestamp', 'sender')
-    search_fields = ('sender__username', 'content') # Searching encrypted content might not work as expected
+    search_fields = ('sender__username',) # Content is encrypted: words are matched through the blind index below
+    search_help_text = "Sender username, or whole words of the message."
     raw_id_fields = ('conversation', 'sender')
     readonly_fields = ('timestamp',)
 
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            results |= queryset.filter(pk__in=matching_messages(search_term).values('pk'))
+        return results, may_have_duplicates
+
     def conversation_id_display(self, obj):
         return obj.conversation.pk
     conversation_id_display.short_description = 'Conversation ID'
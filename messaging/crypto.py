@@ -0,0 +1,44 @@
+"""
+Batched access to encrypted message bodies.
+
+Message.content is an EncryptedTextField: every row loaded through the ORM is Fernet-decrypted
+on the way in, even if only its timestamp is needed. Views that list messages instead load rows
+with `content` deferred and its raw ciphertext alongside (with_ciphertext), pick the page, and
+only then decrypt exactly that page in one pass (decrypt_messages) with the process-wide
+MultiFernet that encrypted_model_fields builds from FIELD_ENCRYPTION_KEY.
+"""
+from cryptography.fernet import InvalidToken
+from django.db.models import TextField
+from django.db.models.functions import Cast
+from encrypted_model_fields.fields import CRYPTER
+
+CIPHERTEXT_ATTR = 'content_ciphertext'
+
+
+def encrypt_many(texts):
+    return [CRYPTER.encrypt(text.encode('utf-8')).decode('utf-8') for text in texts]
+
+
+def decrypt_many(tokens):
+    """Plaintexts for a batch of ciphertexts; rows written before encryption come back as they are."""
+    texts = []
+    for token in tokens:
+        try:
+            texts.append(CRYPTER.decrypt(token.encode('utf-8')).decode('utf-8'))
+        except InvalidToken:
+            texts.append(token) # Same fallback as the field itself
+    return texts
+
+
+def with_ciphertext(queryset):
+    """Message queryset that loads the ciphertext as a plain string (the Cast skips the field's decryption)."""
+    return queryset.defer('content').annotate(**{CIPHERTEXT_ATTR: Cast('content', TextField())})
+
+
+def decrypt_messages(messages):
+    """Fill `content` on messages loaded through with_ciphertext(), one batch, no extra query."""
+    messages = list(messages)
+    texts = decrypt_many(getattr(message, CIPHERTEXT_ATTR) for message in messages)
+    for message, text in zip(messages, texts):
+        message.content = text
+    return messages
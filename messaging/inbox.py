@@ -0,0 +1,75 @@
+"""
+The inbox: a user's conversations with counterparts, last message and unread count.
+
+Everything per conversation comes from correlated subqueries in the one conversation query (last
+message id / sender / ciphertext, the user's ReadMarker, the unread count), plus one prefetch for
+participants, so a page costs the same two queries however many conversations the user has.
+Last-message previews are decrypted for the page only, in one batch.
+"""
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery, TextField
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .crypto import decrypt_many
+from .models import Message, ReadMarker
+
+User = get_user_model()
+
+PREVIEW_LENGTH = 100
+MAX_MESSAGE_ID = 2 ** 63 - 1 # BigAutoField; larger ints overflow the query parameter
+
+
+def inbox(user):
+    latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp', '-id')
+    last_read = ReadMarker.objects.filter(conversation=OuterRef('pk'), user=user).values('last_read_message_id')[:1]
+    unread = (
+        Message.objects.filter(conversation=OuterRef('pk'), id__gt=OuterRef('last_read_message_id'))
+        .exclude(sender=user).order_by().values('conversation').annotate(count=Count('id')).values('count')
+    )
+    return (
+        user.conversations.prefetch_related(Prefetch('participants', queryset=User.objects.only('id', 'username')))
+        .annotate(
+            last_message_id=Subquery(latest.values('id')[:1]),
+            last_message_sender=Subquery(latest.values('sender__username')[:1]),
+            last_message_ciphertext=Subquery(latest.annotate(raw=Cast('content', TextField())).values('raw')[:1]),
+            last_read_message_id=Coalesce(Subquery(last_read), 0),
+        )
+        .annotate(unread_count=Coalesce(Subquery(unread, output_field=IntegerField()), 0))
+        .order_by('-last_message_timestamp', '-id')
+    )
+
+
+def add_previews(conversations):
+    """Decrypt the last-message previews of a page of inbox() rows in one batch."""
+    conversations = list(conversations)
+    with_message = [conversation for conversation in conversations if conversation.last_message_ciphertext is not None]
+    for conversation in conversations:
+        conversation.last_message_preview = None
+    for conversation, text in zip(with_message, decrypt_many(c.last_message_ciphertext for c in with_message)):
+        conversation.last_message_preview = text[:PREVIEW_LENGTH]
+    return conversations
+
+
+def mark_read(user, conversation, message_id=None):
+    """
+    Move the user's marker forward to `message_id` (default: the highest id, so every message counts
+    as read; ids, not timestamps, order the marker, and ingested history can be newer by id than
+    by time). Never moves it back.
+    Raises ValidationError unless `message_id` is a message of this conversation: a marker past the
+    last message would hide every later message from the unread count.
+    """
+    if message_id is not None and not (0 < message_id <= MAX_MESSAGE_ID and conversation.messages.filter(pk=message_id).exists()):
+        raise ValidationError({'message_id': ["Not a message of this conversation."]})
+    if message_id is None:
+        message_id = conversation.messages.order_by('-id').values_list('id', flat=True).first() or 0
+    if ReadMarker.objects.filter(conversation=conversation, user=user, last_read_message_id__lt=message_id).update(last_read_message_id=message_id, updated_at=timezone.now()):
+        return message_id
+    try:
+        with transaction.atomic():
+            ReadMarker.objects.create(conversation=conversation, user=user, last_read_message_id=message_id)
+    except IntegrityError: # Already there and at least this far (or another request just created it)
+        pass
+    return ReadMarker.objects.filter(conversation=conversation, user=user).values_list('last_read_message_id', flat=True).get()
@@ -0,0 +1,81 @@
+"""
+Bulk message ingest (imports, system notices): many messages inserted with bulk_create, and
+every affected conversation's last_message_timestamp moved forward with one UPDATE per batch
+(Conversation.bump_last_message) instead of a fetch and a save per message. Search tokens are
+written per batch too (messaging/search.py).
+
+Ingested messages get ids above every existing message, and unread counts go by id, so imported
+history would show up as unread for everyone. Imports pass mark_read=True to move every
+participant's ReadMarker past them; system notices leave it off and stay unread.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Conversation, Message, ReadMarker
+from .search import index_messages
+
+INGEST_BATCH_SIZE = 1000
+MAX_INGEST_MESSAGES = 5000
+
+
+def _participant_pairs(rows):
+    """The (conversation_id, user_id) pairs among `rows` where the sender takes part in the conversation, in one query."""
+    Participant = Conversation.participants.through
+    pairs = Participant.objects.filter(
+        conversation_id__in={row['conversation_id'] for row in rows},
+        user_id__in={row['sender_id'] for row in rows},
+    ).values_list('conversation_id', 'user_id')
+    return set(pairs)
+
+
+def _mark_batch_read(batch):
+    """Move every participant's marker in the batch's conversations up to its last message there, never back."""
+    last_ids = {}
+    for message in batch:
+        last_ids[message.conversation_id] = max(message.pk, last_ids.get(message.conversation_id, 0))
+    Participant = Conversation.participants.through
+    pairs = Participant.objects.filter(conversation_id__in=last_ids).values_list('conversation_id', 'user_id')
+    ReadMarker.objects.bulk_create([
+        ReadMarker(conversation_id=conversation_id, user_id=user_id, last_read_message_id=last_ids[conversation_id])
+        for conversation_id, user_id in pairs
+    ], ignore_conflicts=True) # Participants who had no marker yet
+    last_id = Case(*(When(conversation_id=pk, then=Value(last)) for pk, last in last_ids.items()))
+    ReadMarker.objects.filter(conversation_id__in=last_ids).update(
+        last_read_message_id=Greatest(F('last_read_message_id'), last_id), updated_at=timezone.now(),
+    )
+
+
+def ingest_messages(rows, batch_size=INGEST_BATCH_SIZE, mark_read=False):
+    """
+    Insert messages given as dicts of conversation_id, sender_id, content and optional timestamp
+    (default: now). All or nothing: a sender who is not a participant rejects the whole call.
+    With mark_read=True (history imports) the participants have read everything up to them.
+    Returns the created messages.
+    """
+    rows = list(rows)
+    allowed = _participant_pairs(rows)
+    errors = {
+        index: "The sender is not a participant of this conversation."
+        for index, row in enumerate(rows) if (row['conversation_id'], row['sender_id']) not in allowed
+    }
+    if errors:
+        raise ValidationError(errors)
+
+    now = timezone.now()
+    created = []
+    with transaction.atomic():
+        for start in range(0, len(rows), batch_size):
+            batch = [
+                Message(conversation_id=row['conversation_id'], sender_id=row['sender_id'], content=row['content'], timestamp=row.get('timestamp') or now)
+                for row in rows[start:start + batch_size]
+            ]
+            Message.objects.bulk_create(batch, batch_size=500)
+            Conversation.bump_last_message(batch)
+            index_messages(batch, replace=False)
+            if mark_read:
+                _mark_batch_read(batch)
+            created.extend(batch)
+    return created
@@ -0,0 +1,55 @@
+"""
+Live chat events (new messages, typing, read receipts) for the WebSocket endpoint in messaging/sockets.py.
+
+Events go through the same broker as live auction events (listings.live.get_broker), on one
+channel per conversation, so every connected participant's socket gets them from a single
+publish. Nothing here is the record: messages are saved before they are announced, and a
+participant who is offline (or whose socket dropped events while slow) catches up from the
+inbox and the keyset-paged messages API like any polling client.
+
+The `message` event carries the plaintext the sender just wrote, so sockets never decrypt
+anything. With the in-process broker it never leaves the process; a shared broker
+(LIVE_EVENTS_BROKER) would carry it too, so run that over a private, encrypted link.
+"""
+import logging
+
+from django.db import transaction
+from rest_framework import serializers
+
+from listings.live import get_broker
+
+logger = logging.getLogger(__name__)
+
+
+def conversation_channel(conversation_id):
+    return f'conversation:{conversation_id}'
+
+
+def publish_conversation_event(conversation_id, event, on_commit=True):
+    """
+    Broadcast `event` (a JSON-serialisable dict) to the conversation's sockets, after the surrounding
+    transaction commits unless on_commit=False (for callers that are not in a transaction).
+    """
+    event = {'conversation': conversation_id, **event}
+
+    def send():
+        try:
+            get_broker().publish(conversation_channel(conversation_id), event)
+        except Exception: # A broker outage must not break sending messages
+            logger.exception("Could not publish live event for conversation %s", conversation_id)
+
+    if on_commit:
+        transaction.on_commit(send)
+    else:
+        send()
+
+
+def message_event(message):
+    return {
+        'type': 'message',
+        'id': message.pk,
+        'sender': message.sender_id,
+        'sender_username': message.sender.username,
+        'content': message.content,
+        'timestamp': serializers.DateTimeField().to_representation(message.timestamp), # As the REST API renders it
+    }
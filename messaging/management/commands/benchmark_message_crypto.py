@@ -0,0 +1,39 @@
+"""
+Measure message encryption/decryption throughput with the configured FIELD_ENCRYPTION_KEY, per
+1,000 messages, so page sizes and key rotation (every extra key slows decryption of old rows)
+can be judged on real hardware. Works on generated text only; the database is not touched.
+
+    python manage.py benchmark_message_crypto --messages 5000 --length 280 --repeat 5
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from messaging.crypto import decrypt_many, encrypt_many
+
+
+class Command(BaseCommand):
+    help = "Benchmark encrypting and decrypting message bodies (milliseconds per 1k messages)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1000)
+        parser.add_argument('--length', type=int, default=200, help="Characters per message.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs to take the best of.")
+
+    def handle(self, *args, **options):
+        count, length = options['messages'], options['length']
+        if count < 1 or length < 0 or options['repeat'] < 1:
+            raise CommandError("--messages and --repeat must be at least 1.")
+        texts = [(f"message {i} " * length)[:length] for i in range(count)]
+        encrypt, decrypt = [], []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            tokens = encrypt_many(texts)
+            encrypt.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            decrypt_many(tokens)
+            decrypt.append(time.perf_counter() - started)
+
+        for label, timings in [('encrypt', encrypt), ('decrypt', decrypt)]:
+            best = min(timings)
+            self.stdout.write(f"{label}: {best * 1000 * 1000 / count:.1f} ms per 1k messages ({count / best:,.0f} messages/s)")
@@ -0,0 +1,24 @@
+"""
+Rebuild the blind index used for message search (messaging/search.py) from scratch. Messages keep
+their tokens current as they are saved, so this is only needed after changing MESSAGE_SEARCH_KEY
+(old tokens no longer match anything) or after writes that bypass save().
+
+    python manage.py rebuild_message_search_index
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from messaging.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Decrypt every message once and rewrite its search tokens under the current MESSAGE_SEARCH_KEY."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(): # Searches keep seeing the old index until the new one is complete
+            count = rebuild_index(chunk_size=options['chunk_size'])
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(f"Indexed {count} messages."))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["conversation", "-timestamp", "-id"],
+                name="message_conversation_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0003_read_marker"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="message",
+            name="timestamp",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, editable=False
+            ),
+        ),
+    ]
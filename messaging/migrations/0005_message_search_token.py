@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from messaging.search import MAX_TOKENS_PER_MESSAGE, blind_tokens
+
+
+def index_existing_messages(apps, schema_editor):
+    Message = apps.get_model("messaging", "Message")
+    MessageSearchToken = apps.get_model("messaging", "MessageSearchToken")
+    rows = []
+    messages = Message.objects.order_by("pk").only("conversation_id", "content")
+    for message in messages.iterator(
+        chunk_size=2000
+    ):  # content is decrypted on load, once
+        rows.extend(
+            MessageSearchToken(
+                message_id=message.pk,
+                conversation_id=message.conversation_id,
+                token=token,
+            )
+            for token in blind_tokens(message.content)[:MAX_TOKENS_PER_MESSAGE]
+        )
+        if len(rows) >= 2000:
+            MessageSearchToken.objects.bulk_create(rows, batch_size=1000)
+            rows = []
+    MessageSearchToken.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("messaging", "0004_message_timestamp_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MessageSearchToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=32)),
+                (
+                    "conversation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="messaging.conversation",
+                    ),
+                ),
+                (
+                    "message",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to="messaging.message",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["token", "conversation", "message"],
+                        name="message_search_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(index_existing_messages, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from encrypted_model_fields.fields import EncryptedTextField
 # Assuming Listing model is in 'listings' app. Adjust if different.
 # from listings.models import Listing # This will cause circular import if Offer is also in listings.
@@ -38,29 +39,88 @@ class Conversation(models.Model):
         return f"Conversation {self.pk} (last active: {self.last_message_timestamp})"
         # Better str: participant names, needs a method.
 
-    # Consider a method to update last_message_timestamp when a new message is added.
-    # Signals are a good way to do this (post_save on Message model).
+    @classmethod
+    def bump_last_message(cls, messages):
+        """
+        Move last_message_timestamp forward to the newest of `messages` in each of their conversations,
+        with one conditional UPDATE (rows that already have something newer are not written).
+        """
+        latest = {}
+        for message in messages:
+            if message.conversation_id not in latest or message.timestamp > latest[message.conversation_id]:
+                latest[message.conversation_id] = message.timestamp
+        if not latest:
+            return 0
+        newest = models.Case(*(models.When(pk=pk, then=models.Value(timestamp)) for pk, timestamp in latest.items()), output_field=models.DateTimeField())
+        return cls.objects.filter(pk__in=latest).filter(
+            models.Q(last_message_timestamp__isnull=True) | models.Q(last_message_timestamp__lt=newest)
+        ).update(last_message_timestamp=newest)
 
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_messages')
     content = EncryptedTextField() # Encrypted field for message body
-    timestamp = models.DateTimeField(auto_now_add=True)
-    # is_read = models.BooleanField(default=False) # Simplified for V1, or handle via UserConversationStatus in V2
+    timestamp = models.DateTimeField(default=timezone.now, editable=False) # Not auto_now_add, so ingested history keeps its times
+    # Read state is per participant: see ReadMarker
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Keyset pages of one conversation, newest first (messaging.views)
+            models.Index(fields=['conversation', '-timestamp', '-id'], name='message_conversation_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
 
+class ReadMarker(models.Model):
+    """How far a participant has read a conversation: messages with a higher id (sent by others) are unread."""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_markers')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='read_markers')
+    last_read_message_id = models.BigIntegerField(default=0) # Message ids only grow, so no FK to keep alive
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='read_marker_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} read conversation {self.conversation_id} up to message {self.last_read_message_id}"
+
+class MessageSearchToken(models.Model):
+    """One word of a message, as an HMAC under MESSAGE_SEARCH_KEY (blind index, see messaging/search.py)."""
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='search_tokens')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='+') # Copied from the message so lookups can stay in the index
+    token = models.CharField(max_length=32)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'conversation', 'message'], name='message_search_idx'),
+        ]
+
+    def __str__(self):
+        return f"Search token of message {self.message_id}"
+
 # Signals to update Conversation.last_message_timestamp
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from .live import message_event, publish_conversation_event
+
+@receiver(post_save, sender=Message)
+def update_conversation_last_message_timestamp(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Conversation.bump_last_message([instance]) # Bulk ingest (messaging/ingest.py) calls it per batch
+
+@receiver(post_save, sender=Message)
+def publish_new_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        publish_conversation_event(instance.conversation_id, message_event(instance)) # Bulk ingest is history, not announced
+
 @receiver(post_save, sender=Message)
-def update_conversation_last_message_timestamp(sender, instance, created, **kwargs):
-    if created:
-        conversation = instance.conversation
-        conversation.last_message_timestamp = instance.timestamp
-        conversation.save(update_fields=['last_message_timestamp'])
+def index_message_content(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or 'content' in instance.get_deferred_fields() or (update_fields is not None and 'content' not in update_fields):
+        return
+    from .search import index_messages
+    index_messages([instance], replace=not created) # Bulk ingest indexes per batch
@@ -0,0 +1,107 @@
+"""
+Keyword search over encrypted message bodies through a blind index.
+
+Message.content is encrypted, so the database cannot match words in it and the only alternative
+is decrypting every message. Instead each message's words are normalised (NFKC, case-folded) and
+stored as MessageSearchToken rows holding HMAC-SHA256(MESSAGE_SEARCH_KEY, word), when the message
+is saved. A search hashes its terms the same way and finds the messages holding all of them with
+one indexed lookup, limited to the conversations the user takes part in; only the page of matches
+is decrypted.
+
+The key is separate from FIELD_ENCRYPTION_KEY, so the index reveals nothing that helps decrypt
+content. Without the key the tokens are opaque, but equal words still share a token, so the index
+shows which messages share words (not what the words are). Matching is on whole words: no
+prefixes or fuzzy matches. After changing MESSAGE_SEARCH_KEY run rebuild_message_search_index.
+"""
+import hashlib
+import hmac
+import re
+import unicodedata
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Count
+
+from .crypto import decrypt_messages, with_ciphertext
+from .models import Message, MessageSearchToken
+
+WORD_PATTERN = re.compile(r'\w+')
+MIN_WORD_LENGTH = 2 # Shorter words would match half the table
+MAX_TOKENS_PER_MESSAGE = 500
+MAX_QUERY_TERMS = 10
+TOKEN_LENGTH = 32 # Hex digits kept of the HMAC: 128 bits
+
+
+def _search_key():
+    key = getattr(settings, 'MESSAGE_SEARCH_KEY', None)
+    if not key:
+        raise ImproperlyConfigured("MESSAGE_SEARCH_KEY must be set to index and search messages.")
+    if key == getattr(settings, 'FIELD_ENCRYPTION_KEY', None):
+        raise ImproperlyConfigured("MESSAGE_SEARCH_KEY must not be the same as FIELD_ENCRYPTION_KEY.")
+    return key.encode('utf-8')
+
+
+def words(text):
+    """The distinct searchable words of `text`, normalised, in order of first appearance."""
+    found = WORD_PATTERN.findall(unicodedata.normalize('NFKC', text or '').casefold())
+    return list(dict.fromkeys(word for word in found if len(word) >= MIN_WORD_LENGTH))
+
+
+def blind_tokens(text):
+    key = _search_key()
+    return [hmac.new(key, word.encode('utf-8'), hashlib.sha256).hexdigest()[:TOKEN_LENGTH] for word in words(text)]
+
+
+def index_messages(messages, replace=True):
+    """
+    Write the tokens of `messages`, whose `content` holds the plaintext: one bulk INSERT, after one
+    DELETE of their old tokens unless replace=False (messages that were just created).
+    """
+    messages = [message for message in messages if message.pk is not None]
+    if replace:
+        MessageSearchToken.objects.filter(message__in=messages).delete()
+    MessageSearchToken.objects.bulk_create([
+        MessageSearchToken(message_id=message.pk, conversation_id=message.conversation_id, token=token)
+        for message in messages
+        for token in blind_tokens(message.content)[:MAX_TOKENS_PER_MESSAGE]
+    ], batch_size=1000)
+
+
+def matching_messages(query, conversations=None):
+    """
+    Messages containing every word of `query`, as a Message queryset, optionally only in
+    `conversations` (a Conversation queryset). None match if the query has no searchable word.
+    """
+    tokens = blind_tokens(query)[:MAX_QUERY_TERMS]
+    if not tokens:
+        return Message.objects.none()
+    matches = MessageSearchToken.objects.filter(token__in=tokens)
+    if conversations is not None:
+        matches = matches.filter(conversation__in=conversations.values('pk'))
+    matches = (
+        matches.values('message_id').annotate(hits=Count('token')).filter(hits=len(tokens)) # Tokens are distinct per message
+        .values('message_id')
+    )
+    return Message.objects.filter(pk__in=matches)
+
+
+def search_messages(user, query, conversation_id=None):
+    """matching_messages() within the conversations `user` takes part in (or just `conversation_id` of them)."""
+    conversations = user.conversations.all()
+    if conversation_id is not None:
+        conversations = conversations.filter(pk=conversation_id)
+    return matching_messages(query, conversations)
+
+
+def rebuild_index(chunk_size=2000):
+    """Re-tokenise every message (after MESSAGE_SEARCH_KEY changes), decrypting in batches. Returns the number of messages."""
+    MessageSearchToken.objects.all().delete()
+    count, chunk = 0, []
+    messages = with_ciphertext(Message.objects.order_by('pk').only('conversation_id'))
+    for message in messages.iterator(chunk_size=chunk_size):
+        chunk.append(message)
+        if len(chunk) >= chunk_size:
+            index_messages(decrypt_messages(chunk), replace=False)
+            count, chunk = count + len(chunk), []
+    index_messages(decrypt_messages(chunk), replace=False)
+    return count + len(chunk)
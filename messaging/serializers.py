@@ -0,0 +1,56 @@
+from rest_framework import serializers
+
+from .models import Conversation, Message
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    participants = serializers.SlugRelatedField(many=True, read_only=True, slug_field='username')
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'participants', 'related_listing', 'related_offer', 'created_at', 'last_message_timestamp']
+        read_only_fields = fields
+
+
+class MessageSerializer(serializers.ModelSerializer):
+    sender_username = serializers.CharField(source='sender.username', read_only=True)
+
+    class Meta:
+        model = Message
+        fields = ['id', 'conversation', 'sender', 'sender_username', 'content', 'timestamp']
+        read_only_fields = ['conversation', 'sender', 'sender_username', 'timestamp']
+
+
+class MessageIngestSerializer(serializers.Serializer):
+    """One message of a bulk ingest; ids are checked in bulk by messaging.ingest."""
+    conversation = serializers.IntegerField(min_value=1, source='conversation_id')
+    sender = serializers.IntegerField(min_value=1, source='sender_id')
+    content = serializers.CharField()
+    timestamp = serializers.DateTimeField(required=False)
+
+
+class InboxConversationSerializer(serializers.ModelSerializer):
+    """A row of messaging.inbox.inbox(); needs `request` in the context to tell counterparts apart."""
+    counterparts = serializers.SerializerMethodField()
+    last_message = serializers.SerializerMethodField()
+    unread_count = serializers.IntegerField(read_only=True)
+    last_read_message_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'counterparts', 'related_listing', 'related_offer', 'last_message', 'unread_count', 'last_read_message_id']
+        read_only_fields = fields
+
+    def get_counterparts(self, conversation):
+        user_id = self.context['request'].user.pk
+        return [user.username for user in conversation.participants.all() if user.pk != user_id] # Prefetched
+
+    def get_last_message(self, conversation):
+        if conversation.last_message_id is None:
+            return None
+        return {
+            'id': conversation.last_message_id,
+            'timestamp': serializers.DateTimeField().to_representation(conversation.last_message_timestamp),
+            'sender_username': conversation.last_message_sender,
+            'preview': conversation.last_message_preview,
+        }
@@ -0,0 +1,155 @@
+"""
+WebSocket chat: ws(s)://<host>/ws/messaging/conversations/<id>/ (routed by cdex_project.asgi).
+
+A participant's socket receives the conversation's live events (messaging/live.py) as JSON text
+frames:
+
+    {"type": "message", "conversation", "id", "sender", "sender_username", "content", "timestamp"}
+    {"type": "typing", "conversation", "user", "username"}
+    {"type": "read", "conversation", "user", "last_read_message_id"}
+
+and may send {"type": "typing"} or {"type": "read", "message_id": n} (message_id optional, as for
+POST .../read/). Messages themselves are still sent with POST .../messages/, so they are validated,
+saved and encrypted in one place. Your own typing events are not echoed back.
+
+The handshake is authenticated from cookies, as the API is: the JWT access cookie (dj-rest-auth)
+or a Django session, and only participants are accepted. An idle socket costs one broker queue and
+one suspended coroutine; see the loadtest_message_sockets command.
+"""
+import asyncio
+import json
+import re
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aget_user, get_user_model
+from django.core.exceptions import ValidationError
+from django.http.cookie import parse_cookie
+from django.http.request import split_domain_port, validate_host
+
+from listings.live import get_broker
+from .inbox import mark_read
+from .live import conversation_channel, publish_conversation_event
+from .models import Conversation
+
+User = get_user_model()
+
+CONVERSATION_PATH = re.compile(r'^/ws/messaging/conversations/(?P<pk>\d+)/$')
+CLOSE_NOT_ALLOWED = 4403 # Application close codes live in 4000-4999
+CLOSE_NOT_FOUND = 4404
+
+
+def _headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+
+
+def _origin_allowed(headers):
+    """Browsers always send Origin; refuse other sites' pages from riding on the user's cookies."""
+    origin = headers.get('origin')
+    if not origin:
+        return True # Not a browser
+    host, _ = split_domain_port(urlsplit(origin).netloc)
+    allowed = settings.ALLOWED_HOSTS or (['localhost', '127.0.0.1', '[::1]'] if settings.DEBUG else [])
+    return bool(host) and validate_host(host, allowed)
+
+
+async def authenticate(headers):
+    """The user behind the handshake's cookies, or None."""
+    cookies = parse_cookie(headers.get('cookie', ''))
+    token = cookies.get(settings.REST_AUTH.get('JWT_AUTH_COOKIE') or '')
+    if token:
+        from rest_framework_simplejwt.exceptions import TokenError
+        from rest_framework_simplejwt.settings import api_settings
+        from rest_framework_simplejwt.tokens import AccessToken
+        try:
+            user_id = AccessToken(token)[api_settings.USER_ID_CLAIM]
+        except (TokenError, KeyError):
+            return None
+        return await User.objects.filter(**{api_settings.USER_ID_FIELD: user_id, 'is_active': True}).afirst()
+    session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        user = await aget_user(SimpleNamespace(session=session))
+        return user if user.is_authenticated else None
+    return None
+
+
+class ConversationSocket:
+    """One accepted socket: relays broker events out and the client's typing / read frames in."""
+
+    def __init__(self, conversation_id, user, send):
+        self.conversation_id = conversation_id
+        self.user = user
+        self.send = send
+
+    async def send_json(self, data):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    async def run(self, receive):
+        broker = get_broker()
+        subscription = broker.subscribe(conversation_channel(self.conversation_id))
+        client = asyncio.ensure_future(receive())
+        event = asyncio.ensure_future(subscription.get())
+        try:
+            while True:
+                await asyncio.wait([client, event], return_when=asyncio.FIRST_COMPLETED)
+                if event.done():
+                    data = event.result()
+                    if not (data['type'] == 'typing' and data['user'] == self.user.pk):
+                        await self.send_json(data)
+                    event = asyncio.ensure_future(subscription.get())
+                if client.done():
+                    frame = client.result()
+                    if frame['type'] == 'websocket.disconnect':
+                        return
+                    if frame['type'] == 'websocket.receive':
+                        await self.handle(frame)
+                    client = asyncio.ensure_future(receive())
+        finally:
+            for task in (client, event):
+                task.cancel()
+            broker.unsubscribe(subscription)
+
+    async def handle(self, frame):
+        try:
+            data = json.loads(frame.get('text') or frame.get('bytes') or '')
+            kind = data['type']
+        except (ValueError, TypeError, KeyError):
+            return await self.send_json({'type': 'error', 'detail': "Send JSON objects with a \"type\"."})
+        if kind == 'typing':
+            publish_conversation_event(self.conversation_id, {'type': 'typing', 'user': self.user.pk, 'username': self.user.username}, on_commit=False)
+        elif kind == 'read':
+            message_id = data.get('message_id')
+            if message_id is not None and (isinstance(message_id, bool) or not isinstance(message_id, int)):
+                return await self.send_json({'type': 'error', 'detail': "message_id must be an integer."})
+            try:
+                await sync_to_async(self.mark_read)(message_id)
+            except ValidationError as e:
+                await self.send_json({'type': 'error', 'detail': e.message_dict['message_id'][0]})
+        else:
+            await self.send_json({'type': 'error', 'detail': f"Unknown type {kind!r}."})
+
+    def mark_read(self, message_id):
+        conversation = Conversation(pk=self.conversation_id)
+        last_read = mark_read(self.user, conversation, message_id)
+        # Sockets run in autocommit, so the marker is already committed
+        publish_conversation_event(self.conversation_id, {'type': 'read', 'user': self.user.pk, 'last_read_message_id': last_read}, on_commit=False)
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI application for scope['type'] == 'websocket'."""
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    match = CONVERSATION_PATH.match(scope['path'])
+    if match is None:
+        return await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+    headers = _headers(scope)
+    user = await authenticate(headers) if _origin_allowed(headers) else None
+    conversation_id = int(match['pk'])
+    if user is None or not await Conversation.objects.filter(pk=conversation_id, participants=user).aexists():
+        return await send({'type': 'websocket.close', 'code': CLOSE_NOT_ALLOWED}) # Before accept: the handshake gets a 403
+    await send({'type': 'websocket.accept'})
+    await ConversationSocket(conversation_id, user, send).run(receive)
@@ -1,3 +1,343 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .crypto import decrypt_many, encrypt_many
+from .models import Conversation, Message
+
+User = get_user_model()
+
+
+class MessageCryptoTests(TestCase):
+    def test_batches_round_trip_and_legacy_plaintext_passes_through(self):
+        tokens = encrypt_many(["hello", "wörld"])
+        self.assertNotIn("hello", tokens[0])
+        self.assertEqual(decrypt_many(tokens + ["never encrypted"]), ["hello", "wörld", "never encrypted"])
+
+    def test_content_is_stored_encrypted(self):
+        alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        conversation = Conversation.objects.create()
+        message = Message.objects.create(conversation=conversation, sender=alice, content="secret")
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT content FROM messaging_message WHERE id = %s", [message.pk])
+            self.assertEqual(decrypt_many([cursor.fetchone()[0]]), ["secret"])
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_message_crypto', messages=50, repeat=1, stdout=out)
+        self.assertIn("ms per 1k messages", out.getvalue())
+
+
+class ConversationMessagesAPITests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.eve = User.objects.create_user(username='eve', email='eve@example.com', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+        start = timezone.now() - timedelta(hours=1)
+        for i in range(7):
+            message = Message.objects.create(conversation=self.conversation, sender=self.alice if i % 2 else self.bob, content=f"message {i}")
+            Message.objects.filter(pk=message.pk).update(timestamp=start + timedelta(minutes=i // 2)) # Ties on purpose
+        self.url = reverse('conversation-messages', args=[self.conversation.pk])
+        self.client.force_authenticate(self.alice)
+
+    def test_pages_walk_newest_first_and_decrypt_only_the_page(self):
+        from . import crypto
+        seen = []
+        url = self.url + '?page_size=3'
+        with mock.patch.object(crypto, 'CRYPTER', wraps=crypto.CRYPTER) as crypter:
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                seen.extend(message['content'] for message in response.data['results'])
+                url = response.data['next']
+        self.assertEqual(crypter.decrypt.call_count, 7) # Never the look-ahead row, never twice
+        expected = [m.content for m in Message.objects.order_by('-timestamp', '-id')]
+        self.assertEqual(seen, expected)
+
+    def test_post_and_participants_only(self):
+        response = self.client.post(self.url, {'content': "hi bob"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['sender_username'], 'alice')
+        self.assertEqual(self.client.get(self.url + '?page_size=1').data['results'][0]['content'], "hi bob")
+
+        self.client.force_authenticate(self.eve)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.post(self.url, {'content': "let me in"}, format='json').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class InboxTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.client.force_authenticate(self.alice)
+        self.url = reverse('conversation-list')
+
+    def _conversation(self, counterpart, *senders):
+        conversation = Conversation.objects.create()
+        conversation.participants.add(self.alice, counterpart)
+        for i, sender in enumerate(senders):
+            Message.objects.create(conversation=conversation, sender=sender, content=f"{sender.username} says {i}" + "!" * 200)
+        return conversation
+
+    def test_inbox_rows_and_constant_queries(self):
+        bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+        quiet = self._conversation(bob)
+        busy = self._conversation(bob, bob, self.alice, bob, bob)
+        with self.assertNumQueries(2): # Conversations with their annotations, then participants
+            self.client.get(self.url)
+        for i in range(5):
+            carol = User.objects.create_user(username=f'carol{i}', email=f'carol{i}@example.com', password='x')
+            self._conversation(carol, carol)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+
+        rows = {row['id']: row for row in response.data['results']}
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[busy.pk]['counterparts'], ['bob'])
+        self.assertEqual(rows[busy.pk]['unread_count'], 3) # Alice's own message never counts
+        self.assertEqual(rows[busy.pk]['last_message']['sender_username'], 'bob')
+        self.assertEqual(rows[busy.pk]['last_message']['preview'], "bob says 3" + "!" * 90)
+        self.assertIsNone(rows[quiet.pk]['last_message'])
+        self.assertEqual(response.data['results'][-1]['id'], quiet.pk) # Never-used conversations sort last
+
+    def test_read_markers(self):
+        bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+        conversation = self._conversation(bob, bob, bob, bob)
+        first = conversation.messages.order_by('id').first()
+        read_url = reverse('conversation-read', args=[conversation.pk])
+
+        self.assertEqual(self.client.post(read_url, {'message_id': first.pk}, format='json').data['last_read_message_id'], first.pk)
+        self.assertEqual(self.client.get(self.url).data['results'][0]['unread_count'], 2)
+        latest = self.client.post(read_url).data['last_read_message_id']
+        self.assertEqual(self.client.post(read_url, {'message_id': first.pk}, format='json').data['last_read_message_id'], latest) # Never back
+        self.assertEqual(self.client.get(self.url).data['results'][0]['unread_count'], 0)
+
+        self.client.force_authenticate(bob)
+        self.client.post(reverse('conversation-messages', args=[conversation.pk]), {'content': "still there?"}, format='json')
+        self.assertEqual(self.client.get(self.url).data['results'][0]['unread_count'], 0) # Sending marks read
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get(self.url).data['results'][0]['unread_count'], 1)
+
+    def test_read_marker_must_point_at_a_message_of_the_conversation(self):
+        bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+        elsewhere = self._conversation(bob, bob).messages.get()
+        conversation = self._conversation(bob, bob) # Most recent: first in the inbox
+        read_url = reverse('conversation-read', args=[conversation.pk])
+        for message_id in [10 ** 30, 10 ** 12, elsewhere.pk, 0]:
+            response = self.client.post(read_url, {'message_id': message_id}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, message_id)
+        self.assertEqual(self.client.get(self.url).data['results'][0]['unread_count'], 1)
+
+
+class MessageIngestTests(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', password='x', is_staff=True)
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.first, self.second = Conversation.objects.create(), Conversation.objects.create()
+        self.first.participants.add(self.alice, self.bob)
+        self.second.participants.add(self.alice)
+        self.url = reverse('message-ingest')
+        self.client.force_authenticate(self.staff)
+
+    def test_single_message_bumps_with_one_conditional_update(self):
+        old = Message.objects.create(conversation=self.first, sender=self.alice, content="late import", timestamp=timezone.now() - timedelta(days=3))
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.last_message_timestamp, old.timestamp)
+        with self.assertNumQueries(3): # INSERT + UPDATE + search tokens, no conversation fetch
+            new = Message.objects.create(conversation=self.first, sender=self.bob, content="hi")
+        Message.objects.create(conversation=self.first, sender=self.alice, content="older", timestamp=new.timestamp - timedelta(hours=1))
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.last_message_timestamp, new.timestamp) # Never moves back
+
+    def test_bulk_ingest_keeps_history_and_updates_each_conversation_once(self):
+        base = timezone.now() - timedelta(days=1)
+        rows = [
+            {'conversation': self.first.pk, 'sender': self.alice.pk, 'content': "one", 'timestamp': (base + timedelta(minutes=5)).isoformat()},
+            {'conversation': self.first.pk, 'sender': self.bob.pk, 'content': "two", 'timestamp': base.isoformat()},
+            {'conversation': self.second.pk, 'sender': self.alice.pk, 'content': "note to self"},
+        ]
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "messaging_conversation"')]
+        self.assertEqual(len(updates), 1)
+
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.last_message_timestamp, base + timedelta(minutes=5))
+        self.assertEqual(Message.objects.filter(sender=self.bob).get().timestamp, base) # content is encrypted, can't filter on it
+        self.assertIsNotNone(Conversation.objects.get(pk=self.second.pk).last_message_timestamp)
+
+    def test_imported_history_is_read_but_notices_are_not(self):
+        from .inbox import inbox, mark_read
+        from .models import ReadMarker
+        current = Message.objects.create(conversation=self.first, sender=self.bob, content="current")
+        mark_read(self.alice, self.first, current.pk)
+        old = (timezone.now() - timedelta(days=400)).isoformat()
+        history = [{'conversation': self.first.pk, 'sender': sender.pk, 'content': "old thread", 'timestamp': old} for sender in (self.alice, self.bob)]
+        response = self.client.post(f'{self.url}?mark_read=1', history + [{'conversation': self.second.pk, 'sender': self.alice.pk, 'content': "old note", 'timestamp': old}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        unread = lambda user: {conversation.pk: conversation.unread_count for conversation in inbox(user)}
+        self.assertEqual(unread(self.alice), {self.first.pk: 0, self.second.pk: 0})
+        self.assertEqual(unread(self.bob), {self.first.pk: 0}) # Bob had no marker yet
+        self.assertEqual(ReadMarker.objects.get(conversation=self.first, user=self.bob).last_read_message_id, response.data['ids'][1])
+
+        self.client.post(self.url, [{'conversation': self.first.pk, 'sender': self.bob.pk, 'content': "Maintenance tonight"}], format='json')
+        self.assertEqual(unread(self.alice)[self.first.pk], 1)
+        self.assertEqual(mark_read(self.alice, self.first), Message.objects.order_by('-pk').values_list('pk', flat=True)[0])
+
+    def test_ingest_rejects_outsiders_and_non_staff(self):
+        rows = [{'conversation': self.second.pk, 'sender': self.bob.pk, 'content': "not mine"}]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Message.objects.exists())
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.post(self.url, rows, format='json').status_code, status.HTTP_403_FORBIDDEN)
+
+
+class LiveChatSocketTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.eve = User.objects.create_user(username='eve', email='eve@example.com', password='x')
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+        self.path = f'/ws/messaging/conversations/{self.conversation.pk}/'
+
+    def socket(self, user, path=None):
+        from asgiref.testing import ApplicationCommunicator
+        from django.conf import settings
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .sockets import websocket_application
+        cookie = f"{settings.REST_AUTH['JWT_AUTH_COOKIE']}={AccessToken.for_user(user)}"
+        return ApplicationCommunicator(websocket_application, {'type': 'websocket', 'path': path or self.path, 'headers': [(b'cookie', cookie.encode())]})
+
+    async def connect(self, user, path=None):
+        socket = self.socket(user, path)
+        await socket.send_input({'type': 'websocket.connect'})
+        return socket, await socket.receive_output(timeout=1)
+
+    async def receive_json(self, socket):
+        import json
+        return json.loads((await socket.receive_output(timeout=1))['text'])
+
+    async def test_only_participants_are_accepted(self):
+        _, refused = await self.connect(self.eve)
+        self.assertEqual(refused, {'type': 'websocket.close', 'code': 4403})
+        _, missing = await self.connect(self.alice, '/ws/elsewhere/')
+        self.assertEqual(missing['code'], 4404)
+        socket, accepted = await self.connect(self.alice)
+        self.assertEqual(accepted, {'type': 'websocket.accept'})
+        await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await socket.wait(timeout=1)
+
+    async def test_messages_typing_and_read_events_fan_out(self):
+        from asgiref.sync import sync_to_async
+        from listings.live import get_broker
+        from .live import conversation_channel
+        from .models import ReadMarker
+
+        alice, _ = await self.connect(self.alice)
+        bob, _ = await self.connect(self.bob)
+        self.assertEqual(get_broker().subscriber_count(conversation_channel(self.conversation.pk)), 2)
+
+        def send_message():
+            with self.captureOnCommitCallbacks(execute=True):
+                return Message.objects.create(conversation=self.conversation, sender=self.alice, content="still available?")
+        message = await sync_to_async(send_message)()
+        for socket in (alice, bob):
+            event = await self.receive_json(socket)
+            self.assertEqual((event['type'], event['id'], event['content'], event['sender_username']), ('message', message.pk, "still available?", 'alice'))
+
+        await bob.send_input({'type': 'websocket.receive', 'text': '{"type": "typing"}'})
+        self.assertEqual(await self.receive_json(alice), {'conversation': self.conversation.pk, 'type': 'typing', 'user': self.bob.pk, 'username': 'bob'})
+        self.assertTrue(await bob.receive_nothing()) # Not echoed to the typist
+
+        await bob.send_input({'type': 'websocket.receive', 'text': '{"type": "read", "message_id": 1000000000000000000000000000000}'})
+        self.assertEqual((await self.receive_json(bob))['type'], 'error') # The socket survives a bad id
+        await bob.send_input({'type': 'websocket.receive', 'text': '{"type": "read"}'})
+        self.assertEqual((await self.receive_json(alice))['last_read_message_id'], message.pk)
+        marker = await ReadMarker.objects.aget(conversation=self.conversation, user=self.bob)
+        self.assertEqual(marker.last_read_message_id, message.pk)
+
+        for socket in (alice, bob):
+            await socket.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await socket.wait(timeout=1)
+        self.assertEqual(get_broker().subscriber_count(conversation_channel(self.conversation.pk)), 0)
+
+
+class MessageSearchTests(APITestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='x')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+        self.eve = User.objects.create_user(username='eve', email='eve@example.com', password='x')
+        self.deal, self.other, self.private = Conversation.objects.create(), Conversation.objects.create(), Conversation.objects.create()
+        self.deal.participants.add(self.alice, self.bob)
+        self.other.participants.add(self.alice, self.bob)
+        self.private.participants.add(self.eve)
+        self.charizard = Message.objects.create(conversation=self.deal, sender=self.bob, content="Is the Charizard PSA 10 still available?")
+        self.pikachu = Message.objects.create(conversation=self.deal, sender=self.alice, content="Only the Pikachu, sorry.")
+        self.later = Message.objects.create(conversation=self.other, sender=self.alice, content="Another CHARIZARD came in, PSA 9.")
+        Message.objects.create(conversation=self.private, sender=self.eve, content="charizard psa")
+        self.url = reverse('message-search')
+        self.client.force_authenticate(self.bob)
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [message['id'] for message in response.data['results']]
+
+    def test_index_holds_hmacs_not_words(self):
+        from .models import MessageSearchToken
+        from .search import blind_tokens
+        tokens = set(MessageSearchToken.objects.filter(message=self.pikachu).values_list('token', flat=True))
+        self.assertEqual(tokens, set(blind_tokens("only the pikachu sorry")))
+        self.assertNotIn('pikachu', tokens)
+
+    def test_finds_every_word_within_the_users_conversations_only(self):
+        from . import crypto
+        decrypted = []
+        real_decrypt_many = crypto.decrypt_many
+        with mock.patch.object(crypto, 'decrypt_many', lambda tokens: decrypted.extend(tokens) or real_decrypt_many(decrypted)):
+            self.assertEqual(self.search(q="charizard PSA"), [self.later.pk, self.charizard.pk]) # Not eve's
+        self.assertEqual(len(decrypted), 2) # Only the matches were decrypted
+        self.assertEqual(self.search(q="charizard", conversation=self.deal.pk), [self.charizard.pk])
+        self.assertEqual(self.search(q="charizard pikachu"), [])
+        self.assertEqual(self.client.get(self.url, {'q': ' '}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_edits_and_ingest_keep_the_index_current(self):
+        from .ingest import ingest_messages
+        self.pikachu.content = "Only the Blastoise now"
+        self.pikachu.save()
+        self.assertEqual(self.search(q="pikachu"), [])
+        self.assertEqual(self.search(q="blastoise"), [self.pikachu.pk])
+        [imported] = ingest_messages([{'conversation_id': self.other.pk, 'sender_id': self.bob.pk, 'content': "Old Venusaur thread"}])
+        self.assertEqual(self.search(q="venusaur"), [imported.pk])
+
+    def test_admin_search_matches_words(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', email='admin@example.com', password='x'))
+        response = self.client.get(reverse('admin:messaging_message_changelist'), {'q': 'pikachu'})
+        self.assertEqual([message.pk for message in response.context['cl'].result_list], [self.pikachu.pk])
 
-# Create your tests here.
+    def test_rebuild_after_key_change(self):
+        from django.core.exceptions import ImproperlyConfigured
+        from django.test import override_settings
+        with override_settings(MESSAGE_SEARCH_KEY='rotated-search-key'):
+            self.assertEqual(self.search(q="pikachu"), []) # Old tokens no longer match
+            call_command('rebuild_message_search_index', verbosity=0)
+            self.assertEqual(self.search(q="pikachu"), [self.pikachu.pk])
+        with override_settings(MESSAGE_SEARCH_KEY=None), self.assertRaises(ImproperlyConfigured):
+            self.search(q="pikachu")
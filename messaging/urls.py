@@ -0,0 +1,12 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import ConversationViewSet, MessageIngestView, MessageSearchView
+
+router = DefaultRouter()
+router.register(r'conversations', ConversationViewSet, basename='conversation')
+
+urlpatterns = [
+    path('', include(router.urls)),
+    path('messages/ingest/', MessageIngestView.as_view(), name='message-ingest'),
+    path('messages/search/', MessageSearchView.as_view(), name='message-search'),
+]
@@ -1,3 +1,120 @@
-from django.shortcuts import render
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import generics, viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 
-# Create your views here.
+from listings.pagination import KeysetPagination
+from .crypto import decrypt_messages, with_ciphertext
+from .inbox import add_previews, inbox, mark_read
+from .ingest import MAX_INGEST_MESSAGES, ingest_messages
+from .models import Conversation, Message
+from .search import search_messages
+from .serializers import ConversationSerializer, InboxConversationSerializer, MessageIngestSerializer, MessageSerializer
+
+
+class MessagePagination(KeysetPagination):
+    page_size = 50
+    max_page_size = 200
+
+
+class ConversationViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for the authenticated user's conversations and their messages. The list is the
+    inbox: counterparts, last message and unread count per conversation, keyset-paged, most
+    recently active first, in a constant number of queries (messaging/inbox.py).
+    """
+    serializer_class = ConversationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        if self.action == 'list':
+            return inbox(self.request.user)
+        return self.request.user.conversations.prefetch_related('participants')
+
+    def list(self, request, *args, **kwargs):
+        page = add_previews(self.paginate_queryset(self.get_queryset()))
+        return self.get_paginated_response(InboxConversationSerializer(page, many=True, context={'request': request}).data)
+
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        """Mark the conversation read up to {"message_id": n} (default: everything so far)."""
+        conversation = self.get_object()
+        message_id = request.data.get('message_id')
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                return Response({'message_id': ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response({'last_read_message_id': mark_read(request.user, conversation, message_id)})
+        except DjangoValidationError as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=['get', 'post'], pagination_class=MessagePagination)
+    def messages(self, request, pk=None):
+        """
+        GET: messages newest first, keyset-paged on (timestamp, id) via ?cursor=. Rows are read with
+        the body deferred; only the chosen page is decrypted, in one batch.
+        POST {"content": "..."}: send a message to this conversation.
+        """
+        conversation = self.get_object()
+        if request.method == 'POST':
+            serializer = MessageSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            message = serializer.save(conversation=conversation, sender=request.user)
+            mark_read(request.user, conversation, message.pk) # Your own message is as far as you've read
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        messages = with_ciphertext(conversation.messages.select_related('sender')).order_by('-timestamp')
+        page = decrypt_messages(self.paginate_queryset(messages))
+        return self.get_paginated_response(MessageSerializer(page, many=True).data)
+
+
+class MessageIngestView(generics.GenericAPIView):
+    """
+    Staff only. POST a JSON array of {"conversation", "sender", "content", "timestamp"?} to insert
+    up to MAX_INGEST_MESSAGES messages at once (imports, system notices). All or nothing.
+    ?mark_read=1 (history imports) marks them read for every participant instead of unread.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = MessageIngestSerializer
+
+    def post(self, request):
+        if not isinstance(request.data, list) or not 0 < len(request.data) <= MAX_INGEST_MESSAGES:
+            return Response({'detail': f"Send a JSON array of 1 to {MAX_INGEST_MESSAGES} messages."}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        try:
+            messages = ingest_messages(serializer.validated_data, mark_read=request.query_params.get('mark_read') in ('1', 'true'))
+        except DjangoValidationError as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'created': len(messages), 'ids': [message.pk for message in messages]}, status=status.HTTP_201_CREATED)
+
+
+class MessageSearchView(generics.ListAPIView):
+    """
+    GET ?q=<words>[&conversation=<id>]: the user's messages containing every word of `q`, newest
+    first, keyset-paged. Matched through the blind index (messaging/search.py); only the returned
+    page is decrypted.
+    """
+    serializer_class = MessageSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessagePagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': ["Enter words to search for."]})
+        conversation_id = self.request.query_params.get('conversation')
+        if conversation_id is not None:
+            try:
+                conversation_id = int(conversation_id)
+            except ValueError:
+                raise ValidationError({'conversation': ["A valid integer is required."]})
+        return with_ciphertext(search_messages(self.request.user, query, conversation_id).select_related('sender')).order_by('-timestamp')
+
+    def list(self, request, *args, **kwargs):
+        page = decrypt_messages(self.paginate_queryset(self.get_queryset()))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)